@@ -665,9 +665,9 @@ class Genetic_Programming:
                 p2.evalue = r [0]
         c1, c2 = p1.crossover (p2, self.random)
         if c1.format () == p1.format () or c1.format () == p2.format ():
-            c1 = self.mutate (c1)
+            c1 = self.mutate (c1, copy = False)
         if c2.format () == p1.format () or c2.format () == p2.format ():
-            c2 = self.mutate (c2)
+            c2 = self.mutate (c2, copy = False)
         self.set_gene (c1_i, cpop, c1)
         self.set_gene (c2_i, cpop, c2)
     # end def crossover
@@ -679,12 +679,15 @@ class Genetic_Programming:
         self.set_gene (p, pop, self.randpop.pop ())
     # end def initstring
 
-    def mutate (self, tree):
+    def mutate (self, tree, copy = True):
         """ We mutate by grafting a random tree into the to-be-mutated
             individual or vice-versa.
+            The tree is modified in place if copy is False.
         """
         random = self.random
-        g = deepcopy (tree)
+        g = tree
+        if copy:
+            g = deepcopy (tree)
         t = self.random_tree (self.random_tree_depth, fulldepth = False)
         if g.depth + t.depth > g.max_depth:
             p = g.get_by_maxdepth (g.max_depth - t.depth, random)
@@ -729,8 +732,9 @@ class Genetic_Programming:
             population.
         """
         if self.random.random () < pm:
-            g = self.get_gene (p, pop)
-            t = self.mutate (g)
+            # The gene may still be shared with the old population
+            g = self.get_gene_mut (p, pop)
+            t = self.mutate (g, copy = False)
             self.set_gene (p, pop, t)
             return 1
         return 0
@@ -121,10 +121,7 @@ class Magic_Square (pga.PGA):
     # end def eval_from_pheno
 
     def get_ind (self, p, pop):
-        a = []
-        for i in range (len (self)):
-            a.append (self.get_allele (p, pop, i))
-        return tuple (a)
+        return tuple (self.get_alleles (p, pop))
     # end def get_ind
 
     def hillclimb_ (self, p, pop):
@@ -525,6 +522,9 @@ class Magic_Square_PGA (Magic_Square, pga.PGA):
             )
         if args.mutation_rate:
             p ['mutation_prob'] = args.mutation_rate
+        if args.symmetric_duplicates:
+            p ['no_duplicates'] = True
+            p ['symmetry']      = pga.PGA_SYMMETRY_SQUARE
         if self.args.output_file:
             p ['output_file'] = args.output_file
         self.cache = {}
@@ -557,10 +557,10 @@ class Magic_Square_PGA (Magic_Square, pga.PGA):
     # end def evaluate
 
     def pheno (self, p, pop):
+        a = self.get_alleles (p, pop)
         for i in self.nr:
             for j in self.nr:
-                a = self.get_allele (p, pop, i * self.n + j) + 1
-                self.square [i, j] = a
+                self.square [i, j] = a [i * self.n + j] + 1
         assert len (set (self.square.flatten ())) == self.n ** 2
         self.dirty = False
     # end def pheno
@@ -660,6 +660,12 @@ def main (argv):
         , help    = "Avoid duplicates"
         , action  = 'store_true'
         )
+    cmd.add_argument \
+        ( "--symmetric-duplicates"
+        , help    = "Avoid duplicates, rotated or reflected squares are"
+                    " duplicates"
+        , action  = 'store_true'
+        )
     cmd.add_argument \
         ( "--normalize"
         , help    = "Use normalization on each newly created individual"
@@ -221,27 +221,25 @@ class Neural_Net_Generic (pga.PGA):
         return v
     # end def get_float
 
+    def get_floats (self, p, pop, n):
+        if self.bit_gene:
+            return np.array ([self.get_float (p, pop, i) for i in range (n)])
+        return np.array (self.get_alleles (p, pop) [:n])
+    # end def get_floats
+
     def build_pheno (self, p, pop):
-        offset = 0
-        cf1 = np.array \
-            ([self.get_float (p, pop, i + offset)
-              for i in range (self.n_input * self.n_hidden)
-            ]).reshape (self.n_input, self.n_hidden)
-        offset = self.n_input * self.n_hidden
-        b1  = np.array \
-            ([self.get_float (p, pop, i + offset)
-              for i in range (self.n_hidden)
-            ])
+        n_cf1  = self.n_input * self.n_hidden
+        n_cf2  = self.n_hidden * self.n_output
+        floats = self.get_floats \
+            (p, pop, n_cf1 + self.n_hidden + n_cf2 + self.n_output)
+        cf1 = floats [:n_cf1].reshape (self.n_input, self.n_hidden)
+        offset = n_cf1
+        b1  = floats [offset:offset + self.n_hidden]
         offset += self.n_hidden
-        cf2 = np.array \
-            ([self.get_float (p, pop, i + offset)
-              for i in range (self.n_hidden * self.n_output)
-            ]).reshape (self.n_hidden, self.n_output)
-        offset += self.n_hidden * self.n_output
-        b2  = np.array \
-            ([self.get_float (p, pop, i + offset)
-              for i in range (self.n_output)
-            ])
+        cf2 = floats [offset:offset + n_cf2].reshape \
+            (self.n_hidden, self.n_output)
+        offset += n_cf2
+        b2  = floats [offset:offset + self.n_output]
         self.set_coefficients (cf1, cf2, b1, b2)
     # end def build_pheno
 
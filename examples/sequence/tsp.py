@@ -485,6 +485,15 @@ class TSP (pga.PGA) :
             )
         if self.args.output_file:
             d ['output_file'] = args.output_file
+        if self.args.symmetric_duplicates :
+            # Compare normalized tours in C instead of check_duplicate
+            d ['symmetry'] = pga.PGA_SYMMETRY_TOUR
+            self.check_duplicate = None
+        # Local search either in hillclimb or in endofgen
+        if self.args.hillclimb :
+            self.endofgen  = None
+        else :
+            self.hillclimb = None
         self.fixed_edges = set ()
         if self.tsp.fixed_edges :
             fe = np.array (self.tsp.fixed_edges) - 1
@@ -615,9 +624,8 @@ class TSP (pga.PGA) :
     # end def plot
 
     def check_duplicate (self, p1, pop1, p2, pop2) :
-        l = len (self)
-        a1 = [self.get_allele (p1, pop1, i) for i in range (l)]
-        a2 = [self.get_allele (p2, pop2, i) for i in range (l)]
+        a1 = self.get_alleles (p1, pop1)
+        a2 = self.get_alleles (p2, pop2)
         return self.normalize_allele (a1) == self.normalize_allele (a2)
     # end def check_duplicate
 
@@ -629,9 +637,8 @@ class TSP (pga.PGA) :
                 return True
         # Stop if all alleles up to fixed_idx cannot be improved by lk_op
         if self.args.fixed_idx :
-            l = len (self)
             for p in range (self.args.fixed_idx + 1) :
-                allele = [self.get_allele (p, pop, i) for i in range (l)]
+                allele = self.get_alleles (p, pop)
                 if not self.in_checkout (allele) :
                     break
             else :
@@ -683,7 +690,7 @@ class TSP (pga.PGA) :
                 )
         print ("", file = file)
         l      = len (self)
-        allele = [self.get_allele (p, pop, i) for i in range (l)]
+        allele = self.get_alleles (p, pop)
         fe = 0
         # Find first fixed edge if any
         if self.fixed_edges :
@@ -949,7 +956,7 @@ class TSP (pga.PGA) :
         """
         l = len (self)
         shuffle = [i for i in range (l)]
-        allele = [self.get_allele (p, pop, i) for i in range (l)]
+        allele = self.get_alleles (p, pop)
         #print (allele)
         if self.args.debug :
             print ("Eval: %s" % self.evaluate (p, pop))
@@ -965,8 +972,7 @@ class TSP (pga.PGA) :
                     self.lk_op_success += 1
                     gain, n_allele = r
                     #print ("gain: %s" % gain)
-                    for i in range (l) :
-                        self.set_allele (p, pop, i, n_allele [i])
+                    self.set_alleles (p, pop, n_allele)
                     allele = n_allele
                     #print (allele)
                     #print ("Eval: %s" % self.evaluate (p, pop))
@@ -1028,8 +1034,10 @@ class TSP (pga.PGA) :
     def update_eval (self, p, pop, gain) :
         ev = self.get_evaluation (p, pop)
         self.set_evaluation (p, pop, ev - gain)
-        if self.evaluate (p, pop) != self.get_evaluation (p, pop) :
-            import pdb; pdb.set_trace ()
+        # Full evaluation only for checking the delta
+        if self.args.debug :
+            if self.evaluate (p, pop) != self.get_evaluation (p, pop) :
+                import pdb; pdb.set_trace ()
     # end def update_eval
 
     def try_or_op_two_op (self, allele, force = False) :
@@ -1101,9 +1109,8 @@ class TSP (pga.PGA) :
     # end def try_or_op_two_op
 
     def try_lk_op_only (self, pop) :
-        l = len (self)
         for p in range (self.args.fixed_idx, -1, -1) :
-            allele = [self.get_allele (p, pop, i) for i in range (l)]
+            allele = self.get_alleles (p, pop)
             if self.in_checkout (allele) :
                 self.lk_op_fail += 1
                 continue
@@ -1114,8 +1121,7 @@ class TSP (pga.PGA) :
                 if r :
                     gain, n_allele = r
                     self.lk_op_success += 1
-                    for i, a in enumerate (n_allele) :
-                        self.set_allele (p, pop, i, a)
+                    self.set_alleles (p, pop, n_allele)
                     self.update_eval (p, pop, gain)
                     return gain
             self.lk_op_fail += 1
@@ -1220,7 +1226,7 @@ class TSP (pga.PGA) :
             return
         for p in range (self.pop_size) :
             assert self.get_evaluation_up_to_date (p, pop)
-            allele_a = [self.get_allele (p, pop, i) for i in range (l)]
+            allele_a = self.get_alleles (p, pop)
             # allele_b is later updated in-place
             allele_b = copy (allele_a)
             force = \
@@ -1232,8 +1238,7 @@ class TSP (pga.PGA) :
             else :
                 eval = self.try_or_op_two_op (allele_b, force = force)
             if eval :
-                for i, v in enumerate (allele_b) :
-                    self.set_allele (p, pop, i, v)
+                self.set_alleles (p, pop, allele_b)
                 self.update_eval (p, pop, eval)
                 if self.fixed_edges :
                     for i in range (l) :
@@ -1251,6 +1256,25 @@ class TSP (pga.PGA) :
             self.fitness (pop)
     # end def endofgen
 
+    def hillclimb (self, p, pop) :
+        """ Apply the local search operators (two_op, or_op, lk_op) to
+            a new individual before it is evaluated. The evaluation is
+            the length of the tour minus the gain of the operators, we
+            return it so that the individual is not evaluated again.
+        """
+        ev     = self.evaluate (p, pop)
+        allele = self.get_alleles (p, pop)
+        gain   = self.try_or_op_two_op (allele)
+        if gain :
+            self.set_alleles (p, pop, allele)
+            ev -= gain
+            if self.args.debug :
+                assert self.evaluate (p, pop) == ev
+        else :
+            self.normal_fail += 1
+        return float (ev)
+    # end def hillclimb
+
     def gene_difference (self, p1, pop1, p2, pop2) :
         """ Used when RTR population replacement is used
             We count the number of common edges.
@@ -1314,6 +1338,12 @@ def main (argv):
         , help    = 'Decide Or-op vs. Two-op vs. ... once per gene'
         , action  = 'store_true'
         )
+    cmd.add_argument \
+        ( '-H', '--hillclimb'
+        , help    = 'Apply local search to new individuals in hillclimb '
+                    'instead of in endofgen'
+        , action  = 'store_true'
+        )
     cmd.add_argument \
         ( '-k', '--lk-probability'
         , help    = 'Probability of LK-Op during GA search, default=%(default)s'
@@ -1381,6 +1411,11 @@ def main (argv):
         , help    = 'Fixed index to mutate'
         , type    = int
         )
+    cmd.add_argument \
+        ( '-S', '--symmetric-duplicates'
+        , help    = 'Detect rotated or reversed tours as duplicates in C'
+        , action  = 'store_true'
+        )
     args    = cmd.parse_args (argv)
     tsp     = TSP (args)
     if args.lin_kernighan :
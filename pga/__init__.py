@@ -50,7 +50,10 @@ try:
 except ImportError:
     if not called_from_pip_or_build ():
         raise
-from .random import PGA_Random
+from .random   import PGA_Random
+from .parallel import PGA_Process_Pool, PGA_Async_Executor, PGA_Loopback
+from .parallel import run_many
+from .cache    import PGA_Evaluation_Cache, PGA_Evaluation_Store
 
 try:
     from .Version import VERSION as __version__
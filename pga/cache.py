@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+# Copyright (C) 2025 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+import os
+import pickle
+import sqlite3
+import struct
+from collections import OrderedDict
+
+class PGA_Evaluation_Cache:
+    """ Cache of evaluations used with the eval_cache parameter of PGA.
+        The key is the chromosome of an individual (a bytes object for
+        builtin datatypes, the gene for user defined datatypes), the
+        value is a tuple of the evaluation and auxiliary evaluations.
+        At most maxsize entries are kept, the least recently used entry
+        is evicted when the cache is full. A maxsize of 0 means the
+        cache is unbounded. If a filename is given, the cache is loaded
+        from this file if it exists and save will write to it.
+    """
+
+    def __init__ (self, maxsize = 100000, filename = None):
+        self.maxsize   = maxsize
+        self.filename  = filename
+        self.cache     = OrderedDict ()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        if filename is not None and os.path.exists (filename):
+            self.load ()
+    # end def __init__
+
+    def __len__ (self):
+        return len (self.cache)
+    # end def __len__
+
+    def clear (self):
+        self.cache.clear ()
+        self.hits = self.misses = self.evictions = 0
+    # end def clear
+
+    def load (self, filename = None):
+        """ Load cache entries, existing entries are kept
+        """
+        with open (filename or self.filename, 'rb') as f:
+            for key, value in pickle.load (f):
+                self.store (key, value)
+    # end def load
+
+    def lookup (self, key):
+        """ Return the cached evaluation for key or None
+        """
+        try:
+            value = self.cache [key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.cache.move_to_end (key)
+        self.hits += 1
+        return value
+    # end def lookup
+
+    def save (self, filename = None):
+        with open (filename or self.filename, 'wb') as f:
+            pickle.dump \
+                (list (self.cache.items ()), f, pickle.HIGHEST_PROTOCOL)
+    # end def save
+
+    def store (self, key, value):
+        self.cache [key] = value
+        self.cache.move_to_end (key)
+        while self.maxsize and len (self.cache) > self.maxsize:
+            self.cache.popitem (last = False)
+            self.evictions += 1
+    # end def store
+
+# end class PGA_Evaluation_Cache
+
+class PGA_Evaluation_Store:
+    """ Persistent store of evaluations in an sqlite database, used
+        with the eval_cache parameter of PGA like PGA_Evaluation_Cache.
+        The fingerprint identifies the problem (e.g. a version string
+        or the relevant parameters of the evaluation function), only
+        evaluations stored with the same fingerprint are found. New
+        evaluations are collected and written to the database when
+        flush is called, this happens at the end of each generation
+        and at the end of the run.
+    """
+
+    def __init__ (self, filename, fingerprint = ''):
+        self.filename    = filename
+        self.fingerprint = str (fingerprint)
+        self.pending     = {}
+        self.hits        = 0
+        self.misses      = 0
+        self.db          = sqlite3.connect (filename)
+        self.db.execute \
+            ( 'create table if not exists evaluation'
+              ' ( fingerprint text not null'
+              ' , key         blob not null'
+              ' , value       blob not null'
+              ' , primary key (fingerprint, key)'
+              ' )'
+            )
+        self.db.commit ()
+    # end def __init__
+
+    def __len__ (self):
+        self.flush ()
+        cursor = self.db.execute \
+            ( 'select count (*) from evaluation where fingerprint = ?'
+            , (self.fingerprint,)
+            )
+        return cursor.fetchone () [0]
+    # end def __len__
+
+    def close (self):
+        self.flush ()
+        self.db.close ()
+    # end def close
+
+    def flush (self):
+        """ Write pending evaluations to the database
+        """
+        if not self.pending:
+            return
+        self.db.executemany \
+            ( 'insert or replace into evaluation (fingerprint, key, value)'
+              ' values (?, ?, ?)'
+            , ( (self.fingerprint, k, v)
+                for k, v in self.pending.items ()
+              )
+            )
+        self.db.commit ()
+        self.pending = {}
+    # end def flush
+
+    def key (self, key):
+        """ Chromosomes of builtin datatypes are bytes, genes of user
+            defined datatypes are pickled.
+        """
+        if isinstance (key, bytes):
+            return key
+        return pickle.dumps (key, pickle.HIGHEST_PROTOCOL)
+    # end def key
+
+    def lookup (self, key):
+        """ Return the stored evaluation for key or None
+        """
+        key   = self.key (key)
+        value = self.pending.get (key)
+        if value is None:
+            cursor = self.db.execute \
+                ( 'select value from evaluation'
+                  ' where fingerprint = ? and key = ?'
+                , (self.fingerprint, key)
+                )
+            row = cursor.fetchone ()
+            if row is None:
+                self.misses += 1
+                return None
+            value = row [0]
+        self.hits += 1
+        return struct.unpack ('%dd' % (len (value) // 8), value)
+    # end def lookup
+
+    def store (self, key, value):
+        value = struct.pack ('%dd' % len (value), *value)
+        self.pending [self.key (key)] = value
+    # end def store
+
+# end class PGA_Evaluation_Store
@@ -0,0 +1,395 @@
+#!/usr/bin/python3
+# Copyright (C) 2025 Dr. Ralf Schlatterbeck Open Source Consulting.
+# Reichergasse 131, A-3411 Weidling.
+# Web: http://www.runtux.com Email: office@runtux.com
+# ****************************************************************************
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+# PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+# ****************************************************************************
+
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import weakref
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+
+def _evaluate (key, p, pop, chrom):
+    """ Called in the worker process: The worker is forked from the
+        parent and therefore has a copy of the PGA object which we
+        find in the contexts of the C module. We store the chromosome
+        received from the parent into the individual and evaluate it.
+    """
+    from .pga import contexts
+    pga_instance = contexts [key]
+    pga_instance._set_chromosome (p, pop, chrom)
+    return pga_instance.evaluate (p, pop)
+# end def _evaluate
+
+def _evaluate_shared (key, row):
+    """ Called in the worker process for a shared population: The
+        chromosome is read in place from shared memory, the evaluation
+        is written to the shared results array.
+    """
+    from .pga import contexts
+    pga_instance = contexts [key]
+    p, pop = pga_instance._storage_individual (row)
+    pga_instance._set_shared_evaluation (row, pga_instance.evaluate (p, pop))
+# end def _evaluate_shared
+
+def _loopback_worker (key, rank, n_ranks, conn):
+    """ Loop of an emulated MPI rank of the loopback transport: Like a
+        PGApack slave process this receives chromosomes, evaluates them
+        and sends back the evaluation until it receives None.
+        Exceptions are sent back to the master (rank 0).
+    """
+    from .pga import contexts
+    pga_instance = contexts [key]
+    pga_instance._set_loopback_rank (rank, n_ranks)
+    while True:
+        msg = conn.recv ()
+        if msg is None:
+            break
+        i, p, pop, chrom = msg
+        try:
+            pga_instance._set_chromosome (p, pop, chrom)
+            conn.send ((i, True, pga_instance.evaluate (p, pop)))
+        except Exception as err:
+            try:
+                conn.send ((i, False, err))
+            except Exception:
+                conn.send ((i, False, RuntimeError (repr (err))))
+    conn.close ()
+# end def _loopback_worker
+
+def _best (pga_instance):
+    """ Evaluation and gene of the best individual after a run, the
+        gene is a list of alleles for the builtin datatypes.
+    """
+    from .pga import PGA_OLDPOP
+    p = pga_instance.get_best_index (PGA_OLDPOP)
+    try:
+        gene = pga_instance.get_gene (p, PGA_OLDPOP)
+    except ValueError:
+        gene = \
+            [ pga_instance.get_allele (p, PGA_OLDPOP, i)
+              for i in range (len (pga_instance))
+            ]
+    return pga_instance.get_evaluation (p, PGA_OLDPOP), gene
+# end def _best
+
+def _run_best (pga_instance):
+    pga_instance.run ()
+    return _best (pga_instance)
+# end def _run_best
+
+def _run_forked (key):
+    """ Called in a forked process: Run our copy of the PGA object
+    """
+    from .pga import contexts
+    return _run_best (contexts [key])
+# end def _run_forked
+
+class PGA_Process_Pool:
+    """ Evaluate individuals in worker processes.
+        This implements the map method of the executor interface used
+        for evaluation, the function passed to map is ignored: The
+        worker calls the evaluate method of its copy of the PGA object.
+        Worker processes are forked when the first generation is
+        evaluated, they see the state of the PGA object at that time.
+        Chromosomes are transferred in their binary representation, for
+        user defined datatypes the gene is serialized (see the
+        serialize_gene method). With a shared
+        population only the row of the individual in shared memory is
+        transferred and the results are returned in shared memory.
+        For the asynchronous steady-state mode the pool keeps
+        evaluations running across generations, see steady_state.
+    """
+
+    def __init__ (self, pga_instance, num_processes):
+        self.pga_instance  = weakref.ref (pga_instance)
+        self.num_processes = num_processes
+        self.pool = ProcessPoolExecutor \
+            ( max_workers = num_processes
+            , mp_context  = multiprocessing.get_context ('fork')
+            )
+        self.pending = []
+    # end def __init__
+
+    def backlog (self):
+        """ Number of additional chromosomes wanted by steady_state:
+            We keep num_processes evaluations in addition to the new
+            individuals of a generation in flight, so a worker
+            becoming free immediately finds the next evaluation.
+        """
+        return max (0, self.num_processes - len (self.pending))
+    # end def backlog
+
+    def map (self, fn, indeces, pops):
+        pga_instance = self.pga_instance ()
+        chunksize = max (1, len (indeces) // (4 * self.num_processes))
+        if pga_instance.shared_population:
+            rows = \
+                [ pga_instance._storage_row (p, pop)
+                  for p, pop in zip (indeces, pops)
+                ]
+            return self.pool.map \
+                ( _evaluate_shared
+                , repeat (pga_instance.context)
+                , rows
+                , chunksize = chunksize
+                )
+        chroms = \
+            [ pga_instance._get_chromosome (p, pop)
+              for p, pop in zip (indeces, pops)
+            ]
+        return self.pool.map \
+            ( _evaluate
+            , repeat (pga_instance.context)
+            , indeces
+            , pops
+            , chroms
+            , chunksize = chunksize
+            )
+    # end def map
+
+    def steady_state (self, chroms, n, pop):
+        """ Submit evaluation of the given chromosomes and wait until n
+            evaluations (of these or of earlier calls) are finished.
+            Return n tuples of chromosome and evaluation in the order
+            of submission, evaluations not yet finished are returned
+            by a later call.
+        """
+        key = self.pga_instance ().context
+        for chrom in chroms:
+            future = self.pool.submit (_evaluate, key, 0, pop, chrom)
+            self.pending.append ((future, chrom))
+        result = []
+        while len (result) < n:
+            futures = [f for f, c in self.pending]
+            wait (futures, return_when = FIRST_COMPLETED)
+            pending = []
+            for future, chrom in self.pending:
+                if len (result) < n and future.done ():
+                    result.append ((chrom, future.result ()))
+                else:
+                    pending.append ((future, chrom))
+            self.pending = pending
+        return result
+    # end def steady_state
+
+    def discard (self):
+        """ Forget evaluations still running at the end of a run
+        """
+        for future, chrom in self.pending:
+            future.cancel ()
+        self.pending = []
+    # end def discard
+
+    def shutdown (self, wait = True):
+        self.pool.shutdown (wait = wait)
+    # end def shutdown
+
+# end class PGA_Process_Pool
+
+class PGA_Async_Executor:
+    """ Evaluate individuals with the evaluate_async coroutine of the
+        PGA object. This implements the map method of the executor
+        interface used for evaluation, all individuals passed to map
+        are evaluated concurrently on an event loop. The loop is kept
+        for the lifetime of the executor, so objects bound to the loop
+        (e.g. connections) can be reused across generations. A
+        concurrency of 0 means no limit, otherwise at most concurrency
+        evaluations run at the same time.
+    """
+
+    def __init__ (self, pga_instance, concurrency = 0):
+        self.pga_instance = weakref.ref (pga_instance)
+        self.concurrency  = concurrency
+        self.loop         = asyncio.new_event_loop ()
+    # end def __init__
+
+    async def evaluate (self, indeces, pops):
+        pga_instance = self.pga_instance ()
+        if not self.concurrency:
+            return await asyncio.gather \
+                (*( pga_instance.evaluate_async (p, pop)
+                    for p, pop in zip (indeces, pops)
+                  )
+                )
+        semaphore = asyncio.Semaphore (self.concurrency)
+        async def evaluate_one (p, pop):
+            async with semaphore:
+                return await pga_instance.evaluate_async (p, pop)
+        return await asyncio.gather \
+            (*(evaluate_one (p, pop) for p, pop in zip (indeces, pops)))
+    # end def evaluate
+
+    def map (self, fn, indeces, pops):
+        return self.loop.run_until_complete (self.evaluate (indeces, pops))
+    # end def map
+
+    def shutdown (self, wait = True):
+        self.loop.close ()
+    # end def shutdown
+
+# end class PGA_Async_Executor
+
+class PGA_Loopback:
+    """ Loopback transport emulating MPI ranks on one host: Rank 0 is
+        the calling process, ranks 1 to n_ranks - 1 are forked worker
+        processes connected with pipes. Like the master/slave
+        evaluation of PGApack, the master sends a chromosome to each
+        idle rank and sends the next one as soon as a rank returns its
+        evaluation. Chromosomes are transferred with the serialization
+        used for MPI (see serialize_gene for user defined datatypes).
+        In the worker processes the mpi_rank and mpi_n_proc properties
+        return the emulated rank and number of ranks, the calling
+        process is unchanged. If a rank terminates (e.g. by calling
+        MPI_Abort) a RuntimeError is raised in the master. The ranks
+        are started when the first generation is evaluated. This
+        implements the map method of the executor interface used for
+        evaluation.
+    """
+
+    def __init__ (self, pga_instance, n_ranks):
+        self.pga_instance = weakref.ref (pga_instance)
+        self.n_ranks      = n_ranks
+        self.ranks        = None
+    # end def __init__
+
+    def start (self):
+        pga_instance = self.pga_instance ()
+        mp_context   = multiprocessing.get_context ('fork')
+        self.ranks   = []
+        for rank in range (1, self.n_ranks):
+            conn, child_conn = mp_context.Pipe ()
+            process = mp_context.Process \
+                ( target = _loopback_worker
+                , args   = \
+                    (pga_instance.context, rank, self.n_ranks, child_conn)
+                , daemon = True
+                )
+            process.start ()
+            child_conn.close ()
+            self.ranks.append ((process, conn))
+    # end def start
+
+    def map (self, fn, indeces, pops):
+        if self.ranks is None:
+            self.start ()
+        pga_instance = self.pga_instance ()
+        jobs    = iter (enumerate (zip (indeces, pops)))
+        results = [None] * len (indeces)
+        rank_of = dict \
+            ((conn, r) for r, (process, conn) in enumerate (self.ranks, 1))
+        idle    = list (rank_of)
+        busy    = []
+        error   = None
+        while True:
+            while idle and error is None:
+                job = next (jobs, None)
+                if job is None:
+                    break
+                i, (p, pop) = job
+                conn = idle.pop (0)
+                conn.send ((i, p, pop, pga_instance._get_chromosome (p, pop)))
+                busy.append (conn)
+            if not busy:
+                break
+            for conn in multiprocessing.connection.wait (busy):
+                busy.remove (conn)
+                try:
+                    i, ok, value = conn.recv ()
+                except EOFError:
+                    process = self.ranks [rank_of [conn] - 1][0]
+                    process.join ()
+                    self.shutdown ()
+                    raise RuntimeError \
+                        ( "Loopback rank %d terminated with exit code %s"
+                        % (rank_of [conn], process.exitcode)
+                        )
+                idle.append (conn)
+                if ok:
+                    results [i] = value
+                elif error is None:
+                    error = value
+        if error is not None:
+            raise error
+        return results
+    # end def map
+
+    def shutdown (self, wait = True):
+        if self.ranks is None:
+            return
+        for process, conn in self.ranks:
+            try:
+                conn.send (None)
+            except OSError:
+                pass
+            conn.close ()
+        if wait:
+            for process, conn in self.ranks:
+                process.join ()
+        self.ranks = None
+    # end def shutdown
+
+# end class PGA_Loopback
+
+def run_many (instances, num_threads = 0, num_processes = 0):
+    """ Run several independent PGA objects concurrently, e.g. for
+        restarts with different random seeds or for a parameter sweep.
+        Return a list with the evaluation and the gene of the best
+        individual of each run, in the order of the instances. For the
+        builtin datatypes the gene is a list of alleles. By default
+        each object runs in its own thread, num_threads limits the
+        number of threads. With num_processes the objects run in that
+        many forked processes, the objects in the calling process are
+        not modified and results must be picklable. An exception
+        raised in one of the runs is raised here. MPI is initialized
+        without thread support, so threads cannot be used with more
+        than one MPI rank.
+    """
+    instances = list (instances)
+    if num_threads < 0 or num_processes < 0:
+        raise ValueError ("Number of threads or processes must not be < 0")
+    if num_threads and num_processes:
+        raise ValueError ("Only one of num_threads and num_processes allowed")
+    if not num_processes and any (i.mpi_n_proc > 1 for i in instances):
+        raise ValueError ("run_many with threads needs a single MPI rank")
+    if num_processes:
+        pool = ProcessPoolExecutor \
+            ( max_workers = num_processes
+            , mp_context  = multiprocessing.get_context ('fork')
+            )
+        keys = [pga_instance.context for pga_instance in instances]
+        with pool:
+            return list (pool.map (_run_forked, keys))
+    num_threads = num_threads or max (1, len (instances))
+    with ThreadPoolExecutor (max_workers = num_threads) as pool:
+        return list (pool.map (_run_best, instances))
+# end def run_many
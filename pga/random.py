@@ -34,23 +34,47 @@ import weakref
 from random import Random
 
 class PGA_Random (Random) :
+    """ Python random number generator using the random number
+        generator of PGApack: Random numbers are reproduceable with the
+        random_seed of the PGA object. With batch > 0 the random
+        numbers are fetched from PGApack in batches of that size with
+        a single call. This is faster but changes the sequence of
+        random numbers relative to the random numbers used by PGApack.
+    """
 
-    def __init__ (self, pga_instance) :
+    def __init__ (self, pga_instance, batch = 0) :
         self.pga_instance = weakref.ref (pga_instance)
+        self.batch        = batch
+        self.buffer       = []
         super ().__init__ (1)
     # end def __init__
 
-    def getstate (self, *args, **kw) :
-        raise NotImplementedError ("Getting the state is not possible")
+    def getstate (self) :
+        """ The state includes the state of the PGApack generator
+        """
+        return \
+            ( self.pga_instance ().get_random_state ()
+            , tuple (self.buffer)
+            , self.gauss_next
+            )
     # end def getstate
 
-    def setstate (self, *args, **kw) :
-        raise NotImplementedError ("Setting the state is not possible")
+    def setstate (self, state) :
+        rstate, buffer, self.gauss_next = state
+        self.pga_instance ().set_random_state (rstate)
+        self.buffer = list (buffer)
     # end def setstate
 
     def random (self) :
-        return self.pga_instance ().random01 ()
+        buffer = self.buffer
+        if buffer :
+            return buffer.pop ()
+        if not self.batch :
+            return self.pga_instance ().random01 ()
+        values = self.pga_instance ().random01_array (self.batch).tolist ()
+        values.reverse ()
+        buffer.extend (values)
+        return buffer.pop ()
     # end def random
 
 # end class PGA_Random
-
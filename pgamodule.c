@@ -32,7 +32,16 @@
 #include <stdio.h>
 #undef NDEBUG
 #include <stddef.h>
+#include <stdarg.h>
 #include <assert.h>
+#ifdef _MSC_VER
+#include <windows.h>
+#include <process.h>
+#define getpid _getpid
+#else
+#include <time.h>
+#include <unistd.h>
+#endif
 #include <Version.h>
 
 #define IS_PY3 (PY_VERSION_HEX >= 0x3000000)
@@ -59,10 +68,178 @@ static char **parse_argv (PyObject *argv, int *argcp);
  */
 /* This is a dictionary for retrieving Python PGA objects by PGA ctx */
 static PyObject *contexts       = NULL;
+/* Number of PGA objects running (with the GIL released) */
+static int n_running            = 0;
+/* Set while a PGA object runs that calls into MPI */
+static int mpi_running          = 0;
+
+/* User methods called from PGApack callbacks, see method_names */
+enum
+    { M_CHECK_DUPLICATE
+    , M_COPY_GENE
+    , M_CROSSOVER
+    , M_DESERIALIZE_GENE
+    , M_ENDOFGEN
+    , M_EVALUATE
+    , M_EVALUATE_ASYNC
+    , M_EVALUATE_BATCH
+    , M_GENE_DISTANCE
+    , M_HASH
+    , M_HILLCLIMB
+    , M_INITSTRING
+    , M_MUTATION
+    , M_PRE_EVAL
+    , M_PRINT_STRING
+    , M_SERIALIZE_GENE
+    , M_STOP_COND
+    , M_COUNT
+    };
+static const char *method_names [M_COUNT] =
+    { "check_duplicate"
+    , "copy_gene"
+    , "crossover"
+    , "deserialize_gene"
+    , "endofgen"
+    , "evaluate"
+    , "evaluate_async"
+    , "evaluate_batch"
+    , "gene_distance"
+    , "hash"
+    , "hillclimb"
+    , "initstring"
+    , "mutation"
+    , "pre_eval"
+    , "print_string"
+    , "serialize_gene"
+    , "stop_cond"
+    };
+
+/* Timed callbacks and phases of a run, see the timing parameter */
+enum
+    { T_CHECK_DUPLICATE
+    , T_CHROM_FREE
+    , T_COPY_GENE
+    , T_CREATESTRING
+    , T_CROSSOVER
+    , T_DESERIALIZE_GENE
+    , T_ENDOFGEN
+    , T_EVALUATE
+    , T_GENE_DISTANCE
+    , T_HASH
+    , T_HILLCLIMB
+    , T_INITSTRING
+    , T_MUTATION
+    , T_PRE_EVAL
+    , T_PRINT_STRING
+    , T_SERIALIZE_GENE
+    , T_STOP_COND
+    , T_PHASE_BREED
+    , T_PHASE_EVALUATION
+    , T_PHASE_UPDATE
+    , T_PHASE_ENDOFGEN
+    , T_PHASE_REPORT
+    , T_PHASE_STOP_CHECK
+    , T_COUNT
+    };
+#define T_PHASE_FIRST T_PHASE_BREED
+static const char *timing_names [T_COUNT] =
+    { "check_duplicate"
+    , "chrom_free"
+    , "copy_gene"
+    , "createstring"
+    , "crossover"
+    , "deserialize_gene"
+    , "endofgen"
+    , "evaluate"
+    , "gene_distance"
+    , "hash"
+    , "hillclimb"
+    , "initstring"
+    , "mutation"
+    , "pre_eval"
+    , "print_string"
+    , "serialize_gene"
+    , "stop_cond"
+    , "breed"
+    , "evaluation"
+    , "update"
+    , "endofgen"
+    , "report"
+    , "stop_check"
+    };
+
+/* How a cached method is called */
+#define CALL_PLAIN  0 /* Call as-is, e.g. a function stored in instance */
+#define CALL_BOUND  1 /* Function from the class, self is prepended */
+#define CALL_LOOKUP 2 /* Stored name, look up attribute on each call */
+
+/*
+ * Per-context data stored in CustomData of the PGApack ctx
+ * The PGA object is a borrowed reference: The ctx is destroyed in the
+ * destructor of the object. We do not store bound methods of the
+ * object, these would keep the object alive.
+ */
+typedef struct {
+    int       error;              /* Set if an error occurred in a callback */
+    void     *chrom_storage;      /* Contiguous storage for chromosomes */
+    PyObject *self;               /* The PGA object, borrowed */
+    PyObject *method [M_COUNT];   /* Cached user methods or NULL */
+    char      calltype [M_COUNT]; /* One of the CALL_ constants above */
+    PyObject *executor;           /* Executor for evaluations or NULL */
+    int       own_executor;       /* Executor created by us, shut down */
+    long      pid;                /* Process that created the context */
+    PyObject *shared;             /* mmap for shared population or NULL */
+    Py_buffer shared_view;        /* Buffer of shared mmap */
+    double   *results;            /* Shared evaluation results or NULL */
+    PyObject *cache;              /* Evaluation cache or NULL */
+    int       cache_flush;        /* Cache has a flush method */
+    int       symmetry;           /* One of the PGA_SYMMETRY constants */
+    int       square_side;        /* Side length for PGA_SYMMETRY_SQUARE */
+    PGAInteger *canonical;        /* Two canonical forms for symmetry */
+    double   *known_eval;         /* Evaluations returned by mutation */
+    char     *is_known;           /* Flag per individual of PGA_NEWPOP */
+    int       migration_interval; /* Generations between migrations or 0 */
+    int       migration_size;     /* Number of migrants per neighbor */
+    int       topology;           /* One of the PGA_TOPOLOGY constants */
+    int       island;             /* Our island: The rank in MPI_COMM_WORLD */
+    int       num_islands;        /* Number of islands, one per rank */
+    int       torus_cols;         /* Columns of the PGA_TOPOLOGY_TORUS grid */
+    int       generation;         /* Generations (incl. restarts) of run */
+    int      *migrants;           /* Population sorted by evaluation */
+    int       steady_state;       /* Asynchronous steady-state evaluation */
+    int       loopback_rank;      /* Emulated MPI rank in loopback worker */
+    int       loopback_size;      /* Emulated number of MPI ranks or 0 */
+    int       running;            /* PGARun in progress (GIL released) */
+    FILE     *report_fp;          /* Stream of report_file */
+    int       report_fd;          /* File descriptor of report_fp */
+    PyObject *report_file;        /* Python file object for report_fp */
+    FILE     *log_fp;             /* Generation log or NULL */
+    int       log_genome;         /* Log the best genome */
+    int       log_iter;           /* Last iteration written to log */
+    int       in_endofgen;        /* Inside endofgen: Current pop is NEWPOP */
+    int       timing;             /* Time callbacks and phases of run */
+    long      timing_count [T_COUNT]; /* Calls of callback or phase */
+    double    timing_time  [T_COUNT]; /* Seconds spent in callback or phase */
+    int       phase;              /* Current phase of run or -1 */
+    double    phase_start;        /* Start time of current phase */
+    double    eval_end;           /* End of last evaluation in phase */
+    void     *ser_buf;            /* Reusable serialization buffer or NULL */
+    int       ser_outstanding;    /* Serializations not yet freed */
+} PGACustomData;
+#define CUSTOM(ctx) ((PGACustomData *)(ctx)->ga.CustomData)
+#define HAS_METHOD(ctx,m) (CUSTOM(ctx)->method [m] != NULL)
+
+#if PY_VERSION_HEX >= 0x03090000
+#define VECTORCALL(f,a,n) PyObject_Vectorcall ((f), (a), (n), NULL)
+#elif PY_VERSION_HEX >= 0x03080000
+#define VECTORCALL(f,a,n) _PyObject_Vectorcall ((f), (a), (n), NULL)
+#else
+#define VECTORCALL(f,a,n) _PyObject_FastCall ((f), (a), (n))
+#endif
 
 /* Error handling macros */
-#define SET_ERR(ctx) (*((int *)ctx->ga.CustomData) = 1)
-#define HAS_ERR(ctx) (*((int *)(ctx)->ga.CustomData))
+#define SET_ERR(ctx) (CUSTOM(ctx)->error = 1)
+#define HAS_ERR(ctx) (CUSTOM(ctx)->error)
 #define ERR_CHECK(ctx,x,r) do {             \
     if (!(x)) {                             \
         SET_ERR(ctx);                       \
@@ -99,6 +276,13 @@ static PyObject *contexts       = NULL;
     }                                       \
 } while (0)
 
+/* Execute stmt with the GIL held, whether or not it is held already */
+#define WITH_GIL(stmt) do {                         \
+    PyGILState_STATE gil = PyGILState_Ensure ();    \
+    stmt;                                           \
+    PyGILState_Release (gil);                       \
+} while (0)
+
 #define ERR_CHECK_RET(x) do {  \
     if (!(x)) {                \
         goto errout;           \
@@ -328,6 +512,19 @@ typedef struct
     int   cd_value;
 } constdef_t;
 
+/* Symmetries for built-in duplicate detection, not part of PGApack */
+#define PGA_SYMMETRY_NONE   0
+#define PGA_SYMMETRY_SQUARE 1
+#define PGA_SYMMETRY_TOUR   2
+
+/* Migration topologies for the island model, not part of PGApack */
+#define PGA_TOPOLOGY_COMPLETE 0
+#define PGA_TOPOLOGY_RING     1
+#define PGA_TOPOLOGY_TORUS    2
+
+/* loopback_ranks is taken from the environment, not part of PGApack */
+#define PGA_LOOPBACK_ENV -1
+
 /* These need to be kept sorted */
 static constdef_t constdef [] =
     { {"PGA_CINIT_LOWER",           PGA_CINIT_LOWER           }
@@ -361,6 +558,7 @@ static constdef_t constdef [] =
     , {"PGA_FITNESS_NORMAL",        PGA_FITNESS_NORMAL        }
     , {"PGA_FITNESS_RANKING",       PGA_FITNESS_RANKING       }
     , {"PGA_FITNESS_RAW",           PGA_FITNESS_RAW           }
+    , {"PGA_LOOPBACK_ENV",          PGA_LOOPBACK_ENV          }
     , {"PGA_MIX_MUTATE_AND_CROSS",  PGA_MIX_MUTATE_AND_CROSS  }
     , {"PGA_MIX_MUTATE_ONLY",       PGA_MIX_MUTATE_ONLY       }
     , {"PGA_MIX_MUTATE_OR_CROSS",   PGA_MIX_MUTATE_OR_CROSS   }
@@ -401,6 +599,12 @@ static constdef_t constdef [] =
     , {"PGA_STOP_MAXITER",          PGA_STOP_MAXITER          }
     , {"PGA_STOP_NOCHANGE",         PGA_STOP_NOCHANGE         }
     , {"PGA_STOP_TOOSIMILAR",       PGA_STOP_TOOSIMILAR       }
+    , {"PGA_SYMMETRY_NONE",         PGA_SYMMETRY_NONE         }
+    , {"PGA_SYMMETRY_SQUARE",       PGA_SYMMETRY_SQUARE       }
+    , {"PGA_SYMMETRY_TOUR",         PGA_SYMMETRY_TOUR         }
+    , {"PGA_TOPOLOGY_COMPLETE",     PGA_TOPOLOGY_COMPLETE     }
+    , {"PGA_TOPOLOGY_RING",         PGA_TOPOLOGY_RING         }
+    , {"PGA_TOPOLOGY_TORUS",        PGA_TOPOLOGY_TORUS        }
     , {NULL,                        0                         }
     };
 
@@ -484,7 +688,7 @@ static PGAContext *get_context (PyObject *self)
     ERR_DECREF_RET (PyArg_Parse (PGA_ctx, "L", &llctx), PGA_ctx, NULL);
     Py_DECREF (PGA_ctx);
     /* If an error occurred */
-    if (*((int *)((PGAContext *)llctx)->ga.CustomData)) {
+    if (HAS_ERR ((PGAContext *)llctx)) {
         return NULL;
     }
     /* Visual C disable warning about size */
@@ -499,39 +703,17 @@ static PGAContext *get_context (PyObject *self)
 }
 
 /*
- * Retrieve the FILE *fp from the PGA object
+ * Retrieve the FILE *fp for a file passed to print_string: If called
+ * from print_gene this is the stream PGApack is printing to, otherwise
+ * return NULL.
  */
-static FILE *get_fp (PyObject *self, PyObject *file)
+static FILE *get_fp (PGAContext *ctx, PyObject *file)
 {
-    PyObject *pyfp = PyObject_GetAttrString (self, "_fp");
-    PyObject *fno = NULL;
-    long long lfp;
-    int fd_from_self = -1;
-    int fd_from_file = -1;
-    if (!pyfp) {
+    PGACustomData *cd = CUSTOM (ctx);
+    if (cd->report_file == NULL || file != cd->report_file) {
         return NULL;
     }
-    ERR_DECREF_RET (PyArg_Parse (pyfp, "L", &lfp), pyfp, NULL);
-    Py_DECREF (pyfp);
-    fd_from_self = fileno ((FILE *)lfp);
-    /* Now extract fd from file */
-    fno = PyObject_CallMethod (file, "fileno", "");
-    /* If an error happens here (should not) we return the fp anyway */
-    if (fno != NULL) {
-        if (PyArg_Parse (fno, "i", &fd_from_file)) {
-            ERR_DECREF_RET (fd_from_self == fd_from_file, fno, NULL);
-        }
-        Py_DECREF (fno);
-    }
-    /* Visual C disable warning about size */
-    #ifdef _MSC_VER
-    #pragma warning(push)
-    #pragma warning(disable:4305)
-    #endif
-    return (FILE *)lfp;
-    #ifdef _MSC_VER
-    #pragma warning(pop)
-    #endif
+    return cd->report_fp;
 }
 
 static PyObject *module_os = NULL;
@@ -546,12 +728,6 @@ static FILE *get_fp_from_file (PyObject *file)
     if (fno == NULL) {
         return NULL;
     }
-    if (module_os == NULL) {
-        module_os = PyImport_ImportModule ("os");
-        if (!module_os) {
-            return NULL;
-        }
-    }
     fdp = PyObject_CallMethod (module_os, "dup", "O", fno);
     Py_DECREF (fno);
     if (fdp == NULL) {
@@ -566,20 +742,225 @@ static FILE *get_fp_from_file (PyObject *file)
 }
 
 /*
- * Retrieve the PGA object via the PGApack ctx
+ * Look up the user methods once when initializing the PGA object.
+ * Methods defined in the class are stored as the underlying function
+ * and called with self prepended. Other callables (e.g. a function
+ * stored in the instance) are called as-is. A builtin method bound to
+ * the object would keep the object alive, so for these only the name
+ * is stored and looked up on each call.
  */
-static PyObject *get_self (PGAContext *ctx)
+static int resolve_methods (PGAContext *ctx, PyObject *self)
 {
-    PyObject *self, *PGA_ctx = Py_BuildValue ("L", (long long) ctx);
+    PGACustomData *cd = CUSTOM (ctx);
+    int m;
+
+    cd->self = self;
+    for (m=0; m<M_COUNT; m++) {
+        PyObject *attr = PyObject_GetAttrString (self, method_names [m]);
+        if (attr == NULL) {
+            if (!PyErr_ExceptionMatches (PyExc_AttributeError)) {
+                return 0;
+            }
+            PyErr_Clear ();
+            continue;
+        }
+        /* A method set to None on the instance is not used */
+        if (attr == Py_None) {
+            Py_DECREF (attr);
+            continue;
+        }
+        if (PyMethod_Check (attr) && PyMethod_GET_SELF (attr) == self) {
+            cd->method   [m] = PyMethod_GET_FUNCTION (attr);
+            cd->calltype [m] = CALL_BOUND;
+            Py_INCREF (cd->method [m]);
+            Py_DECREF (attr);
+        } else if
+            (PyCFunction_Check (attr) && PyCFunction_GET_SELF (attr) == self)
+        {
+            Py_DECREF (attr);
+            cd->method   [m] = PyUnicode_InternFromString (method_names [m]);
+            cd->calltype [m] = CALL_LOOKUP;
+            if (cd->method [m] == NULL) {
+                return 0;
+            }
+        } else {
+            cd->method   [m] = attr;
+            cd->calltype [m] = CALL_PLAIN;
+        }
+    }
+    return 1;
+}
 
-    if (!PGA_ctx) {
-        return NULL;
+/*
+ * Free per-context data, called after PGADestroy
+ */
+static void free_custom_data (PGACustomData *cd)
+{
+    int m;
+
+    for (m=0; m<M_COUNT; m++) {
+        Py_CLEAR (cd->method [m]);
     }
-    self = PyObject_GetItem (contexts, PGA_ctx);
-    Py_DECREF (PGA_ctx);
-    return self;
+    /* Executors we created are shut down: This ends worker threads and
+     * processes and closes the event loop. Not in a forked process, the
+     * workers belong to the parent.
+     */
+    if (cd->own_executor && cd->pid == (long)getpid ()) {
+        PyObject *r = PyObject_CallMethod (cd->executor, "shutdown", NULL);
+        if (r == NULL) {
+            PyErr_WriteUnraisable (cd->executor);
+        }
+        Py_XDECREF (r);
+    }
+    Py_CLEAR (cd->executor);
+    Py_CLEAR (cd->cache);
+    Py_CLEAR (cd->report_file);
+    if (cd->log_fp != NULL) {
+        fclose (cd->log_fp);
+    }
+    free (cd->canonical);
+    free (cd->known_eval);
+    free (cd->is_known);
+    free (cd->migrants);
+    free (cd->ser_buf);
+    free (cd);
+}
+
+/*
+ * Call cached user method m, the arguments are given by fmt: 'i' for
+ * an int, 'd' for a double, 'O' for a python object. Returns a new
+ * reference or NULL on error.
+ */
+static PyObject *call_method (PGAContext *ctx, int m, const char *fmt, ...)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    PyObject *stack [8];
+    PyObject **args = stack + 1;
+    PyObject *func = cd->method [m];
+    PyObject *r = NULL;
+    size_t nargs = 0, i;
+    va_list ap;
+
+    assert (func != NULL);
+    va_start (ap, fmt);
+    for (; *fmt; fmt++) {
+        assert (nargs < 7);
+        switch (*fmt) {
+        case 'i':
+            args [nargs] = PyLong_FromLong (va_arg (ap, int));
+            break;
+        case 'd':
+            args [nargs] = PyFloat_FromDouble (va_arg (ap, double));
+            break;
+        case 'O':
+            args [nargs] = va_arg (ap, PyObject *);
+            Py_INCREF (args [nargs]);
+            break;
+        default:
+            assert (0);
+        }
+        if (args [nargs++] == NULL) {
+            goto errout;
+        }
+    }
+    switch (cd->calltype [m]) {
+    case CALL_PLAIN:
+        r = VECTORCALL (func, args, nargs);
+        break;
+    case CALL_BOUND:
+        stack [0] = cd->self;
+        r = VECTORCALL (func, stack, nargs + 1);
+        break;
+    case CALL_LOOKUP:
+        func = PyObject_GetAttr (cd->self, func);
+        if (func != NULL) {
+            r = VECTORCALL (func, args, nargs);
+            Py_DECREF (func);
+        }
+        break;
+    default:
+        assert (0);
+    }
+errout:
+    va_end (ap);
+    for (i=0; i<nargs; i++) {
+        Py_XDECREF (args [i]);
+    }
+    return r;
+}
+
+/**********
+ * Timing
+ **********/
+
+/*
+ * With the timing parameter the wrappers below count the calls and
+ * accumulate the wall time of each callback. In addition the time of a
+ * run is split into phases at the hooks called by PGApack on rank 0:
+ * - breed: From the stop check to pre_eval: Selection, crossover,
+ *   mutation and duplicate checks (and restarts)
+ * - evaluation: From pre_eval to the end of the last evaluation
+ * - update: From there to endofgen: Population replacement, sorting
+ *   for NSGA-II/III, statistics (and with MPI waiting for evaluations)
+ * - endofgen: The endofgen hook
+ * - report: From endofgen to the stop check: Printing of reports
+ * - stop_check: Stop condition, generation log and migration
+ * The callbacks are called with the GIL released, time spent waiting
+ * for the GIL is included.
+ */
+static double timing_now (void)
+{
+#ifdef _MSC_VER
+    LARGE_INTEGER freq, count;
+    QueryPerformanceFrequency (&freq);
+    QueryPerformanceCounter (&count);
+    return (double)count.QuadPart / (double)freq.QuadPart;
+#else
+    struct timespec ts;
+    clock_gettime (CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+#endif
+}
+
+/* Account time since start to callback or phase t */
+static void timing_add (PGACustomData *cd, int t, double start, double end)
+{
+    cd->timing_count [t]++;
+    cd->timing_time  [t] += end - start;
+}
+
+/*
+ * End the current phase and start phase next (-1 to stop timing
+ * phases), returns the current time.
+ */
+static double timing_phase (PGACustomData *cd, int next)
+{
+    double t = timing_now ();
+    if (cd->phase == T_PHASE_EVALUATION) {
+        timing_add (cd, T_PHASE_EVALUATION, cd->phase_start, cd->eval_end);
+        cd->phase       = T_PHASE_UPDATE;
+        cd->phase_start = cd->eval_end;
+    }
+    if (cd->phase >= 0) {
+        timing_add (cd, cd->phase, cd->phase_start, t);
+    }
+    cd->phase       = next;
+    cd->phase_start = cd->eval_end = t;
+    return t;
 }
 
+/* Execute stmt, if timing is enabled account its time to callback t */
+#define TIMED(ctx, t, stmt) do {                            \
+    PGACustomData *cd_ = CUSTOM (ctx);                      \
+    if (cd_->timing) {                                      \
+        double start_ = timing_now ();                      \
+        stmt;                                               \
+        timing_add (cd_, (t), start_, timing_now ());       \
+    } else {                                                \
+        stmt;                                               \
+    }                                                       \
+} while (0)
+
 /**************************************************
  * PGApack callback functions
  * These get a PGApack ctx and retrieve the object.
@@ -595,36 +976,40 @@ static PyObject *get_self (PGAContext *ctx)
  */
 static void endofgen (PGAContext *ctx)
 {
-    PyObject *self = NULL, *r = NULL;
+    PyObject *r = NULL;
     ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r    = PyObject_CallMethod (self, "endofgen", "");
-    ERR_CHECK_X (ctx, r);
+    if (HAS_METHOD (ctx, M_ENDOFGEN)) {
+        CUSTOM (ctx)->in_endofgen = 1;
+        r = call_method (ctx, M_ENDOFGEN, "");
+        CUSTOM (ctx)->in_endofgen = 0;
+        ERR_CHECK_X (ctx, r);
+        Py_CLEAR (r);
+    }
+    /* Evaluation stores write new evaluations in batches */
+    if (CUSTOM (ctx)->cache_flush) {
+        r = PyObject_CallMethod (CUSTOM (ctx)->cache, "flush", NULL);
+        ERR_CHECK_X (ctx, r);
+    }
 errout:
     Py_CLEAR (r);
-    Py_CLEAR (self);
     return;
 }
 
 /*
- * Need a hash table of mapping ctx to PGA objects. Look up the
- * appropriate object and call its PGA_evaluate
+ * Parse the result of an evaluation: This is either a float (when
+ * using a single evaluation) or a sequence of floats with num_eval
+ * elements. The first is stored in val, the rest into aux.
+ * Returns 1 on success, 0 on error.
  */
-static double evaluate (PGAContext *ctx, int p, int pop, double *aux)
+static int parse_evaluation
+    (PGAContext *ctx, PyObject *res, double *val, double *aux)
 {
-    double retval = 0.0;
-    PyObject *self = NULL, *res1 = NULL, *res2 = NULL, *res3 = NULL;
-    int r;
+    PyObject *res2 = NULL, *res3 = NULL;
+    int r = 0;
     Py_ssize_t length, i;
 
-    ERR_CHECK_X_OCCURRED (ctx);
-    self    = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    res1    = PyObject_CallMethod (self, "evaluate", "ii", p, pop);
-    ERR_CHECK_X (ctx, res1);
-    if (PySequence_Check (res1)) {
-        length = PySequence_Length (res1);
+    if (PySequence_Check (res)) {
+        length = PySequence_Length (res);
         if (length != ctx->ga.NumAuxEval + 1) {
             char x [60];
             sprintf
@@ -633,23 +1018,15 @@ static double evaluate (PGAContext *ctx, int p, int pop, double *aux)
                 );
             PyErr_SetString (PyExc_ValueError, x);
             SET_ERR (ctx);
-            goto errout;
+            return 0;
         }
-        res2 = PySequence_GetItem(res1, 0);
-        ERR_CHECK_X (ctx, res2);
-        res3 = PyNumber_Float (res2);
-        Py_CLEAR (res2);
-        ERR_CHECK_X (ctx, res3);
-        r = PyArg_Parse (res3, "d", &retval);
-        ERR_CHECK_X (ctx, r);
-        Py_CLEAR (res3);
-        for (i=1; i<length; i++) {
-            res2 = PySequence_GetItem (res1, i);
+        for (i=0; i<length; i++) {
+            res2 = PySequence_GetItem (res, i);
             ERR_CHECK_X (ctx, res2);
             res3 = PyNumber_Float (res2);
             Py_CLEAR (res2);
             ERR_CHECK_X (ctx, res3);
-            r = PyArg_Parse (res3, "d", aux + (i - 1));
+            r = PyArg_Parse (res3, "d", i ? aux + (i - 1) : val);
             ERR_CHECK_X (ctx, r);
             Py_CLEAR (res3);
         }
@@ -659,18 +1036,423 @@ static double evaluate (PGAContext *ctx, int p, int pop, double *aux)
             sprintf (x, "Expected %d evaluations", ctx->ga.NumAuxEval + 1);
             PyErr_SetString (PyExc_ValueError, x);
             SET_ERR (ctx);
-            goto errout;
+            return 0;
         }
-        res2 = PyNumber_Float (res1);
+        res2 = PyNumber_Float (res);
         ERR_CHECK_X (ctx, res2);
-        r = PyArg_Parse (res2, "d", &retval);
+        r = PyArg_Parse (res2, "d", val);
         ERR_CHECK_X (ctx, r);
     }
 errout:
-    Py_CLEAR (self);
-    Py_CLEAR (res1);
     Py_CLEAR (res2);
     Py_CLEAR (res3);
+    return r;
+}
+
+/*
+ * Set the evaluations of the given individuals (a tuple of indeces into
+ * pop) from a sequence with one evaluation per individual in the same
+ * order. Returns 1 on success, 0 on error.
+ */
+static int set_evaluations
+    (PGAContext *ctx, int pop, PyObject *indeces, PyObject *res)
+{
+    PyObject *seq = NULL;
+    Py_ssize_t n = PyTuple_GET_SIZE (indeces), i;
+    int r = 0;
+
+    seq = PySequence_Fast (res, "Batch evaluations must be a sequence");
+    ERR_CHECK_X (ctx, seq);
+    if (PySequence_Fast_GET_SIZE (seq) != n) {
+        char x [80];
+        sprintf
+            ( x, "Invalid length %zd of batch evaluations, expect %zd"
+            , PySequence_Fast_GET_SIZE (seq), n
+            );
+        PyErr_SetString (PyExc_ValueError, x);
+        SET_ERR (ctx);
+        goto errout;
+    }
+    for (i=0; i<n; i++) {
+        int p = PyLong_AsLong (PyTuple_GET_ITEM (indeces, i));
+        double val = 0.0;
+        double *aux = PGAGetAuxEvaluation (ctx, p, pop);
+        r = parse_evaluation
+            (ctx, PySequence_Fast_GET_ITEM (seq, i), &val, aux);
+        ERR_CHECK_X (ctx, r);
+        _PGASetEvaluation (ctx, p, pop, val, aux);
+    }
+errout:
+    Py_CLEAR (seq);
+    return r;
+}
+
+static size_t chrom_size (PGAContext *ctx);
+static int storage_row (PGAContext *ctx, int p, int pop);
+static PyObject *get_chromosome (PGAContext *ctx, int p, int pop);
+static int set_chromosome (PGAContext *ctx, int p, int pop, PyObject *chrom);
+
+/*
+ * Key of an individual for the evaluation cache: The raw chromosome as
+ * a bytes object for builtin datatypes, the gene object itself for user
+ * defined datatypes (which must be hashable).
+ */
+static PyObject *cache_key (PGAContext *ctx, int p, int pop)
+{
+    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+
+    if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+        if (ind->chrom == NULL) {
+            PyErr_SetString (PyExc_ValueError, "This gene is not set");
+            return NULL;
+        }
+        Py_INCREF (ind->chrom);
+        return ind->chrom;
+    }
+    return PyBytes_FromStringAndSize (ind->chrom, chrom_size (ctx));
+}
+
+/*
+ * Look up key in the evaluation cache. Returns 1 and fills in val and
+ * aux on a hit, 0 on a miss and -1 on error.
+ */
+static int cache_get (PGAContext *ctx, PyObject *key, double *val, double *aux)
+{
+    PyObject *res = NULL;
+    int r = -1;
+
+    res = PyObject_CallMethod (CUSTOM (ctx)->cache, "lookup", "O", key);
+    ERR_CHECK_X (ctx, res);
+    if (res == Py_None) {
+        r = 0;
+    } else {
+        ERR_CHECK_X (ctx, parse_evaluation (ctx, res, val, aux));
+        r = 1;
+    }
+errout:
+    Py_CLEAR (res);
+    return r;
+}
+
+/*
+ * Store the evaluation of an individual in the evaluation cache, the
+ * value is a tuple of the evaluation and the auxiliary evaluations.
+ * Returns 1 on success and 0 on error.
+ */
+static int cache_put (PGAContext *ctx, PyObject *key, double val, double *aux)
+{
+    PyObject *value = NULL, *res = NULL;
+    int i, r = 0;
+
+    value = PyTuple_New (ctx->ga.NumAuxEval + 1);
+    ERR_CHECK_X (ctx, value);
+    for (i=0; i<=ctx->ga.NumAuxEval; i++) {
+        PyObject *v = PyFloat_FromDouble (i ? aux [i - 1] : val);
+        ERR_CHECK_X (ctx, v);
+        PyTuple_SET_ITEM (value, i, v);
+    }
+    res = PyObject_CallMethod
+        (CUSTOM (ctx)->cache, "store", "OO", key, value);
+    ERR_CHECK_X (ctx, res);
+    r = 1;
+errout:
+    Py_CLEAR (value);
+    Py_CLEAR (res);
+    return r;
+}
+
+
+/*
+ * Set the evaluations of the given individuals from the shared results
+ * array, the worker processes have written the evaluations there.
+ */
+static void set_shared_evaluations (PGAContext *ctx, int pop, PyObject *indeces)
+{
+    Py_ssize_t n = PyTuple_GET_SIZE (indeces), i;
+    int naux = ctx->ga.NumAuxEval;
+
+    for (i=0; i<n; i++) {
+        int p = PyLong_AsLong (PyTuple_GET_ITEM (indeces, i));
+        double *res = CUSTOM (ctx)->results
+                    + storage_row (ctx, p, pop) * (naux + 1);
+        double *aux = PGAGetAuxEvaluation (ctx, p, pop);
+        if (naux) {
+            memcpy (aux, res + 1, naux * sizeof (double));
+        }
+        _PGASetEvaluation (ctx, p, pop, res [0], aux);
+    }
+}
+
+/*
+ * Evaluate the given individuals with the executor: The evaluate method
+ * is called for each index via the map method of the executor.
+ * Returns a list of evaluations or NULL on error.
+ */
+static PyObject *map_evaluate (PGAContext *ctx, int pop, PyObject *indeces)
+{
+    PyObject *func = NULL, *pops = NULL, *it = NULL, *res = NULL;
+    Py_ssize_t n = PyTuple_GET_SIZE (indeces), i;
+
+    func = PyObject_GetAttrString (CUSTOM (ctx)->self, "evaluate");
+    ERR_CHECK_X (ctx, func);
+    pops = PyTuple_New (n);
+    ERR_CHECK_X (ctx, pops);
+    for (i=0; i<n; i++) {
+        PyObject *p = PyLong_FromLong (pop);
+        ERR_CHECK_X (ctx, p);
+        PyTuple_SET_ITEM (pops, i, p);
+    }
+    it = PyObject_CallMethod
+        (CUSTOM (ctx)->executor, "map", "OOO", func, indeces, pops);
+    ERR_CHECK_X (ctx, it);
+    res = PySequence_List (it);
+    ERR_CHECK_X (ctx, res);
+errout:
+    Py_CLEAR (func);
+    Py_CLEAR (pops);
+    Py_CLEAR (it);
+    return res;
+}
+
+/*
+ * Evaluate all individuals in pop that are not up-to-date: Either with
+ * a single call to evaluate_batch or by distributing calls to evaluate
+ * to the executor. This is called before PGApack evaluates the
+ * population (from the PreEval hook), PGApack will skip individuals
+ * that have an up-to-date evaluation. So we need to count evaluations.
+ */
+static void evaluate_pending (PGAContext *ctx, int pop)
+{
+    PyObject *indeces = NULL, *res = NULL, *keys = NULL;
+    Py_ssize_t n = 0, nhit = 0, i;
+    int p;
+
+    for (p=0; p<ctx->ga.PopSize; p++) {
+        if (!PGAGetEvaluationUpToDateFlag (ctx, p, pop)) {
+            n++;
+        }
+    }
+    if (n == 0) {
+        return;
+    }
+    if (CUSTOM (ctx)->cache != NULL) {
+        keys = PyList_New (0);
+        ERR_CHECK_X (ctx, keys);
+    }
+    indeces = PyTuple_New (n);
+    ERR_CHECK_X (ctx, indeces);
+    for (p=0, i=0; p<ctx->ga.PopSize; p++) {
+        if (!PGAGetEvaluationUpToDateFlag (ctx, p, pop)) {
+            PyObject *idx = NULL;
+            if (keys != NULL) {
+                double val = 0.0;
+                double *aux = PGAGetAuxEvaluation (ctx, p, pop);
+                PyObject *key = cache_key (ctx, p, pop);
+                int r;
+                ERR_CHECK_X (ctx, key);
+                r = cache_get (ctx, key, &val, aux);
+                if (r == 0 && PyList_Append (keys, key) < 0) {
+                    r = -1;
+                }
+                Py_DECREF (key);
+                ERR_CHECK_X (ctx, r >= 0);
+                if (r > 0) {
+                    _PGASetEvaluation (ctx, p, pop, val, aux);
+                    nhit++;
+                    continue;
+                }
+            }
+            idx = PyLong_FromLong (p);
+            ERR_CHECK_X (ctx, idx);
+            PyTuple_SET_ITEM (indeces, i++, idx);
+        }
+    }
+    ctx->rep.nevals += nhit;
+    if (i == 0) {
+        goto errout;
+    }
+    if (i < n) {
+        ERR_CHECK_X (ctx, _PyTuple_Resize (&indeces, i) == 0);
+    }
+    n = i;
+    if (HAS_METHOD (ctx, M_EVALUATE_BATCH)) {
+        res = call_method (ctx, M_EVALUATE_BATCH, "iO", pop, indeces);
+    } else {
+        res = map_evaluate (ctx, pop, indeces);
+    }
+    ERR_CHECK_X (ctx, res);
+    if (CUSTOM (ctx)->results != NULL && !HAS_METHOD (ctx, M_EVALUATE_BATCH)) {
+        set_shared_evaluations (ctx, pop, indeces);
+    } else {
+        ERR_CHECK_X (ctx, set_evaluations (ctx, pop, indeces, res));
+    }
+    ctx->rep.nevals += n;
+    for (i=0; keys != NULL && i<n; i++) {
+        p = PyLong_AsLong (PyTuple_GET_ITEM (indeces, i));
+        ERR_CHECK_X
+            ( ctx
+            , cache_put
+                ( ctx
+                , PyList_GET_ITEM (keys, i)
+                , _PGAGetEvaluation (ctx, p, pop, NULL)
+                , PGAGetAuxEvaluation (ctx, p, pop)
+                )
+            );
+    }
+errout:
+    Py_CLEAR (indeces);
+    Py_CLEAR (res);
+    Py_CLEAR (keys);
+}
+
+/*
+ * Asynchronous steady-state evaluation with the process pool: The new
+ * individuals of pop are dispatched to the workers, evaluations of
+ * earlier generations may still be running. As soon as as many
+ * evaluations have finished as there are new individuals, the finished
+ * individuals take the places of the new ones, which are inserted in a
+ * later generation when their evaluation is done. So we never wait for
+ * the slowest evaluation. To keep all workers busy the pool asks for a
+ * backlog of additional individuals, these are mutated copies of
+ * random individuals of the old population. If mutation leaves a copy
+ * unchanged another individual is drawn, after PopSize unsuccessful
+ * attempts the copy is not added to the backlog.
+ */
+static void evaluate_steady_state (PGAContext *ctx, int pop)
+{
+    PyObject *executor = CUSTOM (ctx)->executor;
+    PyObject *indeces = NULL, *chroms = NULL, *res = NULL, *evals = NULL;
+    PyObject *r = NULL;
+    Py_ssize_t n = 0, i;
+    long backlog;
+    int p;
+
+    for (p=0; p<ctx->ga.PopSize; p++) {
+        if (!PGAGetEvaluationUpToDateFlag (ctx, p, pop)) {
+            n++;
+        }
+    }
+    if (n == 0) {
+        return;
+    }
+    indeces = PyTuple_New (n);
+    ERR_CHECK_X (ctx, indeces);
+    chroms = PyList_New (0);
+    ERR_CHECK_X (ctx, chroms);
+    for (p=0, i=0; p<ctx->ga.PopSize; p++) {
+        if (!PGAGetEvaluationUpToDateFlag (ctx, p, pop)) {
+            PyObject *idx = PyLong_FromLong (p);
+            ERR_CHECK_X (ctx, idx);
+            PyTuple_SET_ITEM (indeces, i++, idx);
+            r = get_chromosome (ctx, p, pop);
+            ERR_CHECK_X (ctx, r);
+            ERR_CHECK_X (ctx, PyList_Append (chroms, r) == 0);
+            Py_CLEAR (r);
+        }
+    }
+    r = PyObject_CallMethod (executor, "backlog", NULL);
+    ERR_CHECK_X (ctx, r);
+    backlog = PyLong_AsLong (r);
+    ERR_CHECK_X (ctx, backlog != -1 || !PyErr_Occurred ());
+    Py_CLEAR (r);
+    for (; backlog > 0; backlog--) {
+        int k, mutated = 0;
+        for (k=0; !mutated && k<ctx->ga.PopSize; k++) {
+            int q = PGARandomInterval (ctx, 0, ctx->ga.PopSize - 1);
+            PGACopyIndividual (ctx, q, PGA_OLDPOP, PGA_TEMP1, pop);
+            mutated = PGAMutate (ctx, PGA_TEMP1, pop);
+            ERR_CHECK_X_OCCURRED (ctx);
+        }
+        if (!mutated) {
+            continue;
+        }
+        r = get_chromosome (ctx, PGA_TEMP1, pop);
+        ERR_CHECK_X (ctx, r);
+        ERR_CHECK_X (ctx, PyList_Append (chroms, r) == 0);
+        Py_CLEAR (r);
+    }
+    res = PyObject_CallMethod
+        (executor, "steady_state", "Oni", chroms, n, pop);
+    ERR_CHECK_X (ctx, res);
+    evals = PyList_New (n);
+    ERR_CHECK_X (ctx, evals);
+    for (i=0; i<n; i++) {
+        PyObject *chrom = NULL, *ev = NULL;
+        int rr;
+        p  = PyLong_AsLong (PyTuple_GET_ITEM (indeces, i));
+        r  = PySequence_GetItem (res, i);
+        ERR_CHECK_X (ctx, r);
+        rr = PyArg_ParseTuple (r, "OO:steady_state", &chrom, &ev);
+        ERR_CHECK_X (ctx, rr);
+        ERR_CHECK_X (ctx, set_chromosome (ctx, p, pop, chrom));
+        Py_INCREF (ev);
+        PyList_SET_ITEM (evals, i, ev);
+        Py_CLEAR (r);
+    }
+    ERR_CHECK_X (ctx, set_evaluations (ctx, pop, indeces, evals));
+    ctx->rep.nevals += n;
+errout:
+    Py_CLEAR (indeces);
+    Py_CLEAR (chroms);
+    Py_CLEAR (res);
+    Py_CLEAR (evals);
+    Py_CLEAR (r);
+}
+
+/*
+ * Need a hash table of mapping ctx to PGA objects. Look up the
+ * appropriate object and call its PGA_evaluate
+ * If the object has an evaluate_batch method, most individuals are
+ * already evaluated by evaluate_pending. Remaining individuals (e.g.
+ * after a restart or on an MPI slave) are evaluated with a batch of
+ * size one, the same is done for evaluate_async. If an evaluation cache
+ * is configured it is consulted first.
+ */
+static double evaluate (PGAContext *ctx, int p, int pop, double *aux)
+{
+    double retval = 0.0;
+    PyObject *res = NULL, *idx = NULL, *key = NULL;
+    int r;
+
+    ERR_CHECK_X_OCCURRED (ctx);
+    if (CUSTOM (ctx)->cache != NULL) {
+        key = cache_key (ctx, p, pop);
+        ERR_CHECK_X (ctx, key);
+        r = cache_get (ctx, key, &retval, aux);
+        ERR_CHECK_X (ctx, r >= 0);
+        if (r > 0) {
+            goto errout;
+        }
+    }
+    if (HAS_METHOD (ctx, M_EVALUATE_BATCH)) {
+        idx = Py_BuildValue ("(i)", p);
+        ERR_CHECK_X (ctx, idx);
+        res = call_method (ctx, M_EVALUATE_BATCH, "iO", pop, idx);
+        ERR_CHECK_X (ctx, res);
+        r = set_evaluations (ctx, pop, idx, res);
+        ERR_CHECK_X (ctx, r);
+        retval = _PGAGetEvaluation (ctx, p, pop, NULL);
+    } else if (HAS_METHOD (ctx, M_EVALUATE_ASYNC)) {
+        idx = Py_BuildValue ("(i)", p);
+        ERR_CHECK_X (ctx, idx);
+        res = map_evaluate (ctx, pop, idx);
+        ERR_CHECK_X (ctx, res);
+        r = set_evaluations (ctx, pop, idx, res);
+        ERR_CHECK_X (ctx, r);
+        retval = _PGAGetEvaluation (ctx, p, pop, NULL);
+    } else {
+        res = call_method (ctx, M_EVALUATE, "ii", p, pop);
+        ERR_CHECK_X (ctx, res);
+        r = parse_evaluation (ctx, res, &retval, aux);
+        ERR_CHECK_X (ctx, r);
+    }
+    if (key != NULL) {
+        ERR_CHECK_X (ctx, cache_put (ctx, key, retval, aux));
+    }
+errout:
+    Py_CLEAR (res);
+    Py_CLEAR (idx);
+    Py_CLEAR (key);
     return retval;
 }
 
@@ -682,17 +1464,16 @@ errout:
 static PGAHash build_hash (PGAContext *ctx, int p, int pop)
 {
     Py_hash_t hash = 0;
-    PyObject *self = NULL;
+    PyObject *r = NULL;
     PGAIndividual *ind = NULL;
     ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    if (PyObject_HasAttrString (self, "hash")) {
+    if (HAS_METHOD (ctx, M_HASH)) {
         int rr;
-        PyObject *r = PyObject_CallMethod (self, "hash", "ii", p, pop);
+        r = call_method (ctx, M_HASH, "ii", p, pop);
         ERR_CHECK_X (ctx, r);
         rr = PyArg_Parse (r, "L", &hash);
         ERR_CHECK_X (ctx, rr);
+        Py_CLEAR (r);
         hash = ((hash >> 32) ^ hash) & 0xFFFFFFFF;
         return hash;
     }
@@ -710,11 +1491,10 @@ static PGAHash build_hash (PGAContext *ctx, int p, int pop)
     }
     hash = PyObject_Hash ((PyObject *)ind->chrom);
     ERR_CHECK_X (ctx, hash != -1);
-    Py_CLEAR (self);
     hash = ((hash >> 32) ^ hash) & 0xFFFFFFFF;
     return (PGAHash)hash;
 errout:
-    Py_CLEAR (self);
+    Py_CLEAR (r);
     return 0;
 }
 
@@ -726,52 +1506,209 @@ errout:
  */
 static int check_duplicate (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
 {
-    PyObject *self = NULL, *r = NULL;
+    PyObject *r = NULL;
     int rr, retval = 0;
     ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r    = PyObject_CallMethod
-        (self, "check_duplicate", "iiii", p1, pop1, p2, pop2);
+    r = call_method (ctx, M_CHECK_DUPLICATE, "iiii", p1, pop1, p2, pop2);
     ERR_CHECK_X (ctx, r);
     rr = PyArg_Parse (r, "i", &retval);
     ERR_CHECK_X (ctx, rr);
 errout:
     Py_CLEAR (r);
-    Py_CLEAR (self);
     return !!retval;
 }
 
 /*
- * Check stopping criteria, this is always active.
- * User can set a stop_cond method to add stopping criteria.
- * We perform the magic here that if during one of the callback
- * functions (calling into python, e.g. evaluate) an error occurs, we
- * check the error flag here and stop. This way we can return an error
- * in one of the callback functions to python and raise the appropriate
- * exception there.
+ * Built-in duplicate detection for integer genes with symmetries: All
+ * genes that are equivalent under the symmetry are mapped to the same
+ * canonical form, the lexicographically smallest of the equivalent
+ * genes. The hash and the duplicate check use the canonical form so
+ * they never need to call into python.
  */
-static int check_stop (PGAContext *ctx)
-{
-    PyObject *self = NULL;
-    ERR_CHECK_OCCURRED (ctx, PGA_TRUE);
-    self = get_self (ctx);
-    ERR_CHECK (ctx, self, PGA_TRUE);
-    if (PyObject_HasAttrString (self, "stop_cond")) {
-        int retval = PGA_TRUE, rr;
-        PyObject *r = PyObject_CallMethod (self, "stop_cond", NULL);
+
+/* Tour index j when starting at index i in direction dir */
+#define TOUR_IDX(i,j,dir,n) (((i) + (dir) * (j) + (n)) % (n))
+
+/*
+ * A tour (e.g. for the TSP) is equivalent to all its rotations and to
+ * the tour traversed in the opposite direction. The canonical form
+ * starts with the smallest allele, so only rotations starting there
+ * need to be compared (two for a permutation).
+ */
+static void canonical_tour (const PGAInteger *a, int n, PGAInteger *out)
+{
+    int i, j, dir, found = 0;
+    PGAInteger min = a [0];
+    for (i=1; i<n; i++) {
+        if (a [i] < min) {
+            min = a [i];
+        }
+    }
+    for (i=0; i<n; i++) {
+        if (a [i] != min) {
+            continue;
+        }
+        for (dir = 1; dir >= -1; dir -= 2) {
+            if (found) {
+                for (j=1; j<n; j++) {
+                    if (a [TOUR_IDX (i, j, dir, n)] != out [j]) {
+                        break;
+                    }
+                }
+                if (j == n || a [TOUR_IDX (i, j, dir, n)] > out [j]) {
+                    continue;
+                }
+            }
+            for (j=0; j<n; j++) {
+                out [j] = a [TOUR_IDX (i, j, dir, n)];
+            }
+            found = 1;
+        }
+    }
+}
+
+/* Index of row r, column c after transformation t of a square */
+static int square_idx (int t, int r, int c, int side)
+{
+    if (t & 1) {
+        int tmp = r;
+        r = c;
+        c = tmp;
+    }
+    if (t & 2) {
+        r = side - 1 - r;
+    }
+    if (t & 4) {
+        c = side - 1 - c;
+    }
+    return r * side + c;
+}
+
+/*
+ * A square (e.g. a magic square) stored row by row is equivalent to
+ * its rotations and reflections, the eight transformations are
+ * generated by transposing and flipping rows and columns.
+ */
+static void canonical_square (const PGAInteger *a, int side, PGAInteger *out)
+{
+    int t, i, n = side * side;
+    memcpy (out, a, n * sizeof (PGAInteger));
+    for (t=1; t<8; t++) {
+        for (i=0; i<n; i++) {
+            PGAInteger v = a [square_idx (t, i / side, i % side, side)];
+            if (v != out [i]) {
+                break;
+            }
+        }
+        if (i == n || a [square_idx (t, i / side, i % side, side)] > out [i]) {
+            continue;
+        }
+        for (i=0; i<n; i++) {
+            out [i] = a [square_idx (t, i / side, i % side, side)];
+        }
+    }
+}
+
+static PGAInteger *canonical_form (PGAContext *ctx, int p, int pop, int idx)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    PGAInteger *a = (PGAInteger *)PGAGetIndividual (ctx, p, pop)->chrom;
+    PGAInteger *out = cd->canonical + idx * ctx->ga.StringLen;
+    if (cd->symmetry == PGA_SYMMETRY_TOUR) {
+        canonical_tour (a, ctx->ga.StringLen, out);
+    } else {
+        assert (cd->symmetry == PGA_SYMMETRY_SQUARE);
+        canonical_square (a, cd->square_side, out);
+    }
+    return out;
+}
+
+static PGAHash symmetry_hash (PGAContext *ctx, int p, int pop)
+{
+    PGAInteger *c = canonical_form (ctx, p, pop, 0);
+    return PGAUtilHash
+        (c, sizeof (PGAInteger) * ctx->ga.StringLen, PGA_INITIAL_HASH);
+}
+
+static int symmetry_duplicate
+    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+{
+    PGAInteger *c1 = canonical_form (ctx, p1, pop1, 0);
+    PGAInteger *c2 = canonical_form (ctx, p2, pop2, 1);
+    return !memcmp (c1, c2, sizeof (PGAInteger) * ctx->ga.StringLen);
+}
+
+static int islands_done (PGAContext *ctx, int done);
+static void migrate (PGAContext *ctx);
+static void write_log (PGAContext *ctx);
+
+/*
+ * Check stopping criteria, this is always active.
+ * User can set a stop_cond method to add stopping criteria.
+ * We perform the magic here that if during one of the callback
+ * functions (calling into python, e.g. evaluate) an error occurs, we
+ * check the error flag here and stop. This way we can return an error
+ * in one of the callback functions to python and raise the appropriate
+ * exception there.
+ */
+static int stop_condition (PGAContext *ctx)
+{
+    ERR_CHECK_OCCURRED (ctx, PGA_TRUE);
+    if (CUSTOM (ctx)->is_known) {
+        memset (CUSTOM (ctx)->is_known, 0, ctx->ga.PopSize);
+    }
+    if (HAS_METHOD (ctx, M_STOP_COND)) {
+        int retval = PGA_TRUE, rr;
+        PyObject *r = call_method (ctx, M_STOP_COND, "");
         ERR_CHECK_X (ctx, r);
         rr = PyArg_Parse (r, "i", &retval);
         ERR_CHECK_X (ctx, rr);
     errout:
         Py_CLEAR (r);
-        Py_CLEAR (self);
         return !!retval;
     }
-    Py_CLEAR (self);
     return PGACheckStoppingConditions (ctx);
 }
 
+/*
+ * With the island model all islands must agree on stopping (an error
+ * on one island stops all of them), otherwise the remaining islands
+ * would wait forever for migrants. Migration is done here and not in
+ * endofgen because this is called once per loop on every island, even
+ * for generations that were restarted.
+ * This is called with the GIL released, the GIL is acquired for the
+ * parts calling into python, islands wait for each other in
+ * islands_done without holding it.
+ */
+static int check_stop (PGAContext *ctx)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    int done;
+    if (cd->timing) {
+        timing_phase (cd, T_PHASE_STOP_CHECK);
+    }
+    TIMED (ctx, T_STOP_COND, WITH_GIL (done = stop_condition (ctx)));
+    if (cd->log_fp != NULL && !HAS_ERR (ctx)) {
+        write_log (ctx);
+    }
+    if (cd->migration_interval) {
+        done = islands_done (ctx, done);
+        if (  !done
+           && cd->generation
+           && cd->generation % cd->migration_interval == 0
+           )
+        {
+            WITH_GIL (migrate (ctx));
+        }
+        cd->generation++;
+    }
+    if (cd->timing) {
+        /* The final report is printed after the last stop check */
+        timing_phase (cd, done ? T_PHASE_REPORT : T_PHASE_BREED);
+    }
+    return done;
+}
+
 /*
  * Used only for user defined data type.
  * Copy the python object and update refcounts.
@@ -808,296 +1745,1305 @@ errout:
  */
 static void initstring (PGAContext *ctx, int p, int pop)
 {
-    PyObject *self = NULL, *r = NULL;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r    = PyObject_CallMethod (self, "initstring", "ii", p, pop);
-    ERR_CHECK_X (ctx, r);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
-    return;
+    PyObject *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    r = call_method (ctx, M_INITSTRING, "ii", p, pop);
+    ERR_CHECK_X (ctx, r);
+errout:
+    Py_CLEAR (r);
+    return;
+}
+
+/*
+ * Used only for user defined data type.
+ * If the initflag is zero, we do no initialization and assert that the
+ * chromosome is a NULL pointer. Otherwise we call self.initstring.
+ */
+static void createstring (PGAContext *ctx, int p, int pop, int initflag)
+{
+    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+    if (!initflag) {
+        assert (ind->chrom == NULL);
+        return;
+    }
+    initstring (ctx, p, pop);
+}
+
+/*
+ * Used if the calling object has a crossover method.
+ * Otherwise use built-in default for the datatype.
+ * Perform crossover from p1 and p2 into c1 and c2
+ */
+static void crossover
+    (PGAContext *ctx, int p1, int p2, int p_pop, int c1, int c2, int c_pop)
+{
+    PyObject *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    r = call_method
+        (ctx, M_CROSSOVER, "iiiiii", p1, p2, p_pop, c1, c2, c_pop);
+    ERR_CHECK_X (ctx, r);
+errout:
+    Py_CLEAR (r);
+    return;
+}
+
+/*
+ * Check that a value returned as an evaluation (by mutation or
+ * hillclimb) is a float or a list or tuple of floats. A bool or int is
+ * rejected so that an unrelated return value is not taken for an
+ * evaluation.
+ */
+static int is_float_evaluation (PyObject *res)
+{
+    Py_ssize_t i;
+    if (PyFloat_Check (res)) {
+        return 1;
+    }
+    if (!PyList_Check (res) && !PyTuple_Check (res)) {
+        return 0;
+    }
+    for (i=0; i<PySequence_Fast_GET_SIZE (res); i++) {
+        if (!PyFloat_Check (PySequence_Fast_GET_ITEM (res, i))) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+/*
+ * Incremental evaluation: The mutation method may return the new
+ * evaluation of the mutated individual together with the number of
+ * mutations. PGApack marks a mutated individual as not up-to-date
+ * after mutation, so we remember the evaluation and set it before the
+ * new population is evaluated (in pre_eval), this skips the evaluate
+ * call for that individual. Individuals of PGA_NEWPOP are written
+ * only once per generation (except for being mutated again, e.g. when
+ * they are duplicates), remembered evaluations are discarded at the
+ * start of each generation in check_stop.
+ */
+static int remember_evaluation
+    (PGAContext *ctx, int p, int pop, PyObject *ev)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    int n = ctx->ga.NumAuxEval + 1;
+    double *row;
+    /* Backlog copies of async_steady_state are evaluated by the pool */
+    if (cd->steady_state && p == PGA_TEMP1) {
+        return 1;
+    }
+    /* Otherwise the evaluation would be lost */
+    if (pop != PGA_NEWPOP || p < 0 || p >= ctx->ga.PopSize) {
+        PyErr_SetString
+            ( PyExc_ValueError
+            , "mutation can return an evaluation only for individuals "
+              "of PGA_NEWPOP"
+            );
+        SET_ERR (ctx);
+        return 0;
+    }
+    if (cd->known_eval == NULL) {
+        cd->known_eval = malloc (sizeof (double) * n * ctx->ga.PopSize);
+        cd->is_known   = calloc (ctx->ga.PopSize, 1);
+        if (cd->known_eval == NULL || cd->is_known == NULL) {
+            PyErr_NoMemory ();
+            SET_ERR (ctx);
+            return 0;
+        }
+    }
+    row = cd->known_eval + n * p;
+    if (!parse_evaluation (ctx, ev, row, row + 1)) {
+        return 0;
+    }
+    cd->is_known [p] = 1;
+    return 1;
+}
+
+static void forget_evaluation (PGAContext *ctx, int p, int pop)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    if (cd->is_known && pop == PGA_NEWPOP && p >= 0 && p < ctx->ga.PopSize) {
+        cd->is_known [p] = 0;
+    }
+}
+
+static void set_known_evaluations (PGAContext *ctx, int pop)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    int p, n = ctx->ga.NumAuxEval + 1;
+    if (cd->is_known == NULL || pop != PGA_NEWPOP) {
+        return;
+    }
+    for (p=0; p<ctx->ga.PopSize; p++) {
+        if (cd->is_known [p]) {
+            double *row = cd->known_eval + n * p;
+            _PGASetEvaluation (ctx, p, pop, row [0], row + 1);
+            cd->is_known [p] = 0;
+        }
+    }
+}
+
+/*
+ * Used if the calling object has a mutation method.
+ * Otherwise use built-in default for the datatype.
+ * Insert code to mutate Data.
+ * Remember to count the number of mutations that happen, and return
+ * that value!
+ */
+static int mutation (PGAContext *ctx, int p, int pop, double mr)
+{
+    PyObject *r = NULL;
+    PyObject *ev = NULL;
+    int retval = 0, rr;
+    ERR_CHECK_X_OCCURRED (ctx);
+    r = call_method (ctx, M_MUTATION, "iid", p, pop, mr);
+    ERR_CHECK_X (ctx, r);
+    if (PyTuple_Check (r)) {
+        rr = PyArg_ParseTuple (r, "iO:mutation", &retval, &ev);
+        ERR_CHECK_X (ctx, rr);
+        if (!is_float_evaluation (ev)) {
+            PyErr_SetString
+                ( PyExc_TypeError
+                , "mutation must return the number of mutations and "
+                  "a float or a sequence of floats"
+                );
+            SET_ERR (ctx);
+            goto errout;
+        }
+        rr = remember_evaluation (ctx, p, pop, ev);
+        ERR_CHECK_X (ctx, rr);
+    } else {
+        rr = PyArg_Parse (r, "i", &retval);
+        ERR_CHECK_X (ctx, rr);
+        forget_evaluation (ctx, p, pop);
+    }
+errout:
+    Py_CLEAR (r);
+    return retval;
+}
+
+/*
+ * Used if the calling object has a gene_distance method.
+ * Otherwise use built-in default for the datatype.
+ * Insert code to compute genetic difference of two individuals.
+ */
+static double gene_distance
+    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+{
+    PyObject *r = NULL;
+    int rr;
+    double retval = 0.0;
+    ERR_CHECK_X_OCCURRED (ctx);
+    r = call_method (ctx, M_GENE_DISTANCE, "iiii", p1, pop1, p2, pop2);
+    ERR_CHECK_X (ctx, r);
+    rr = PyArg_Parse (r, "d", &retval);
+    ERR_CHECK_X (ctx, rr);
+errout:
+    Py_CLEAR (r);
+    return retval;
+}
+
+/*
+ * Used if the calling object has a hillclimb method.
+ */
+static void hillclimb (PGAContext *ctx, int p, int pop)
+{
+    PyObject *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    r = call_method (ctx, M_HILLCLIMB, "ii", p, pop);
+    ERR_CHECK_X (ctx, r);
+    /* The evaluation after hillclimbing may be returned */
+    if (r != Py_None) {
+        double val = 0.0;
+        double *aux = NULL;
+        int rr = is_float_evaluation (r);
+        if (!rr) {
+            PyErr_SetString
+                ( PyExc_TypeError
+                , "hillclimb must return None, a float "
+                  "or a sequence of floats"
+                );
+            SET_ERR (ctx);
+            goto errout;
+        }
+        aux = PGAGetAuxEvaluation (ctx, p, pop);
+        rr  = parse_evaluation (ctx, r, &val, aux);
+        ERR_CHECK_X (ctx, rr);
+        _PGASetEvaluation (ctx, p, pop, val, aux);
+    }
+errout:
+    Py_CLEAR (r);
+    return;
+}
+
+/*
+ * Used if the calling object has a pre_eval, evaluate_batch or mutation
+ * method or if evaluations are distributed to an executor.
+ * Evaluations returned by mutation are set first, then the pre_eval
+ * method is called, it may modify individuals before they are evaluated.
+ * The initial population is always evaluated completely, also in
+ * asynchronous steady-state mode.
+ */
+static void pre_eval (PGAContext *ctx, int pop)
+{
+    PyObject *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    set_known_evaluations (ctx, pop);
+    if (HAS_METHOD (ctx, M_PRE_EVAL)) {
+        r = call_method (ctx, M_PRE_EVAL, "i", pop);
+        ERR_CHECK_X (ctx, r);
+    }
+    if (CUSTOM (ctx)->steady_state && pop == PGA_NEWPOP) {
+        evaluate_steady_state (ctx, pop);
+    } else if (HAS_METHOD (ctx, M_EVALUATE_BATCH) || CUSTOM (ctx)->executor) {
+        evaluate_pending (ctx, pop);
+    }
+errout:
+    Py_CLEAR (r);
+    return;
+}
+
+/*
+ * Python file object for the stream fp PGApack is printing to: It is
+ * created once and kept in the custom data, it does not close the
+ * underlying file descriptor. A new one is created when PGApack prints
+ * to another stream.
+ */
+static PyObject *get_report_file (PGAContext *ctx, FILE *fp)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    PyObject *file = NULL;
+    int fd = fileno (fp);
+
+    /* Should never happen unles fp is not a valid stream */
+    ERR_CHECK_ERRNO (ctx, fd >= 0, NULL);
+    if (cd->report_file != NULL && cd->report_fp == fp && cd->report_fd == fd)
+    {
+        return cd->report_file;
+    }
+#if IS_PY3
+    file = PyFile_FromFd (fd, "", "w", -1, "utf-8", NULL, NULL, 0);
+#else
+    {
+        FILE *fp2 = fdopen (fd, "w");
+        ERR_CHECK_ERRNO (ctx, fp2 != NULL, NULL);
+        file = PyFile_FromFile (fp2, "<PGA_file>", "w", NULL);
+    }
+#endif
+    ERR_CHECK (ctx, file, NULL);
+    Py_CLEAR (cd->report_file);
+    cd->report_file = file;
+    cd->report_fp   = fp;
+    cd->report_fd   = fd;
+    return file;
+}
+
+/*
+ * Low-level gene print function
+ * The python file object passed to print_string writes to the same
+ * file descriptor as fp. So we flush fp before calling print_string
+ * and the python file afterwards, this keeps the output in order. The
+ * print_string method of PGA recognizes the file object and prints to
+ * fp directly (see get_fp).
+ */
+static void print_gene (PGAContext *ctx, FILE *fp, int p, int pop)
+{
+    PyObject *file = NULL, *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    file = get_report_file (ctx, fp);
+    ERR_CHECK_X (ctx, file);
+    fflush (fp);
+    r = call_method (ctx, M_PRINT_STRING, "Oii", file, p, pop);
+    ERR_CHECK_X (ctx, r);
+    Py_CLEAR (r);
+    r = PyObject_CallMethod (file, "flush", NULL);
+    ERR_CHECK_X (ctx, r);
+errout:
+    Py_CLEAR (r);
+}
+
+/******************
+ * Serialization
+ ******************/
+
+static PyObject *pickle_dumps     = NULL;
+static PyObject *pickle_loads     = NULL;
+static PyObject *pickle_protocol  = NULL;
+
+/*
+ * Look up the pickle functions once, we use the highest protocol.
+ */
+static int init_pickle (void)
+{
+    PyObject *pickle = NULL;
+    if (pickle_dumps != NULL) {
+        return 1;
+    }
+    pickle = PyImport_ImportModule ("pickle");
+    if (pickle == NULL) {
+        return 0;
+    }
+    pickle_dumps    = PyObject_GetAttrString (pickle, "dumps");
+    pickle_loads    = PyObject_GetAttrString (pickle, "loads");
+    pickle_protocol = PyObject_GetAttrString (pickle, "HIGHEST_PROTOCOL");
+    Py_DECREF (pickle);
+    if (!pickle_dumps || !pickle_loads || !pickle_protocol) {
+        Py_CLEAR (pickle_dumps);
+        Py_CLEAR (pickle_loads);
+        Py_CLEAR (pickle_protocol);
+        return 0;
+    }
+    return 1;
+}
+
+/*
+ * Header of a buffer returned by serialize, the serialized data follows
+ * the header. It lets serialize_free find the context of a buffer.
+ */
+typedef struct {
+    PGACustomData *cd;            /* Context that serialized the gene */
+    size_t         size;          /* Allocated size of the data */
+    int            reusable;      /* The per-context buffer, not freed */
+} PGASerialHeader;
+
+/*
+ * Get a buffer for size bytes of serialized data: The reusable buffer
+ * of the context (grown on demand) if no other serialization is
+ * outstanding, otherwise a buffer that is freed by serialize_free.
+ * Returns NULL with a MemoryError set if allocation fails.
+ */
+static void *serial_buffer (PGACustomData *cd, size_t size)
+{
+    PGASerialHeader *h = NULL;
+    if (cd->ser_outstanding == 0) {
+        h = cd->ser_buf;
+        if (h == NULL || h->size < size) {
+            h = realloc (cd->ser_buf, sizeof (PGASerialHeader) + size);
+            if (h == NULL) {
+                PyErr_NoMemory ();
+                return NULL;
+            }
+            cd->ser_buf = h;
+            h->size = size;
+        }
+        h->reusable = 1;
+    } else {
+        h = malloc (sizeof (PGASerialHeader) + size);
+        if (h == NULL) {
+            PyErr_NoMemory ();
+            return NULL;
+        }
+        h->size = size;
+        h->reusable = 0;
+    }
+    h->cd = cd;
+    cd->ser_outstanding++;
+    return h + 1;
+}
+
+/*
+ * Used only for user defined data type.
+ * The gene is serialized with the serialize_gene method if defined,
+ * otherwise with pickle. The result (any object supporting the buffer
+ * protocol) is copied into the reusable buffer of the context which is
+ * handed to PGApack until serialize_free is called. If serializations
+ * are outstanding (e.g. for non-blocking sends or from a callback
+ * during a serialization) a separate buffer is allocated, so any
+ * number of serializations may be outstanding at the same time.
+ */
+static size_t serialize (PGAContext *ctx, int p, int pop, void **ser)
+{
+    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+    PyObject *obj = NULL;
+    Py_buffer view;
+    size_t size = 0;
+    *ser = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    ERR_CHECK_X (ctx, ind->chrom != NULL);
+    if (HAS_METHOD (ctx, M_SERIALIZE_GENE)) {
+        obj = call_method (ctx, M_SERIALIZE_GENE, "ii", p, pop);
+    } else {
+        obj = PyObject_CallFunctionObjArgs
+            (pickle_dumps, ind->chrom, pickle_protocol, NULL);
+    }
+    ERR_CHECK_X (ctx, obj);
+    ERR_CHECK_X (ctx, PyObject_GetBuffer (obj, &view, PyBUF_SIMPLE) == 0);
+    *ser = serial_buffer (CUSTOM (ctx), view.len);
+    if (*ser != NULL) {
+        memcpy (*ser, view.buf, view.len);
+        size = view.len;
+    }
+    PyBuffer_Release (&view);
+    ERR_CHECK_X (ctx, *ser);
+errout:
+    Py_CLEAR (obj);
+    return size;
+}
+
+/*
+ * The pointer is immediately freed after being used: The reusable
+ * buffer of the context is kept, other buffers are freed.
+ */
+static void serialize_free (void *p)
+{
+    PGASerialHeader *h = (PGASerialHeader *)p - 1;
+    assert (h->cd->ser_outstanding > 0);
+    h->cd->ser_outstanding--;
+    if (!h->reusable) {
+        free (h);
+    }
+}
+
+/*
+ * Free the gene
+ */
+static void chrom_free (PGAIndividual *ind)
+{
+    if (ind->chrom != NULL) {
+        Py_DECREF (ind->chrom);
+        ind->chrom = NULL;
+    }
+}
+
+/*
+ * The received data is passed to deserialize_gene (or pickle.loads) as
+ * a read-only memoryview without copying it. The view is released
+ * afterwards, so the data must not be kept.
+ */
+static void deserialize
+    (PGAContext *ctx, int p, int pop, const void *serial, size_t size)
+{
+    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+    PyObject *serialized = NULL;
+    PyObject *obj = NULL, *r = NULL;
+    ERR_CHECK_X_OCCURRED (ctx);
+    serialized = PyMemoryView_FromMemory ((char *)serial, size, PyBUF_READ);
+    ERR_CHECK_X (ctx, serialized);
+    if (HAS_METHOD (ctx, M_DESERIALIZE_GENE)) {
+        obj = call_method (ctx, M_DESERIALIZE_GENE, "O", serialized);
+    } else {
+        obj = PyObject_CallFunctionObjArgs (pickle_loads, serialized, NULL);
+    }
+    ERR_CHECK_X (ctx, obj);
+    r = PyObject_CallMethod (serialized, "release", NULL);
+    ERR_CHECK_X (ctx, r);
+    if (ind->chrom != NULL) {
+        Py_DECREF (ind->chrom);
+        ind->chrom = NULL;
+    }
+    /* No need to increment refcount */
+    ind->chrom = obj;
+    obj = NULL;
+errout:
+    Py_CLEAR (serialized);
+    Py_CLEAR (obj);
+    Py_CLEAR (r);
+}
+
+/**************
+ * Island model
+ **************/
+
+/* MPI tags, these are sent on MPI_COMM_WORLD between islands */
+#define MIGRATION_TAG_DONE 100
+#define MIGRATION_TAG_SIZE 101
+#define MIGRATION_TAG_DATA 102
+#define MIGRATION_TAG_ACK  103
+
+/*
+ * Number of exchanges per migration: Each exchange is a permutation of
+ * the islands, every island sends to one and receives from one other
+ * island. This way the exchange can be done with MPI_Sendrecv without
+ * the risk of a deadlock.
+ */
+static int migration_shifts (PGACustomData *cd)
+{
+    switch (cd->topology) {
+    case PGA_TOPOLOGY_COMPLETE:
+        return cd->num_islands - 1;
+    case PGA_TOPOLOGY_TORUS:
+        return 2;
+    }
+    return 1;
+}
+
+/*
+ * Island we send to (dir = 1) or receive from (dir = -1) in the given
+ * exchange. The torus is a grid of islands with torus_cols columns
+ * that wraps around in both directions: We send to the right and down.
+ */
+static int migration_neighbor (PGACustomData *cd, int shift, int dir)
+{
+    int n = cd->num_islands;
+    int cols = cd->torus_cols, rows = n / cols;
+    int row = cd->island / cols, col = cd->island % cols;
+
+    switch (cd->topology) {
+    case PGA_TOPOLOGY_COMPLETE:
+        return (cd->island + dir * (shift + 1) + n) % n;
+    case PGA_TOPOLOGY_TORUS:
+        if (shift == 0) {
+            col = (col + dir + cols) % cols;
+        } else {
+            row = (row + dir + rows) % rows;
+        }
+        return row * cols + col;
+    }
+    return (cd->island + dir + n) % n;
+}
+
+/*
+ * Logical "or" of done over all islands: Gathered by island 0 and
+ * broadcast back to all islands.
+ */
+static int islands_done (PGAContext *ctx, int done)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    MPI_Status status;
+    int i, other;
+
+    if (cd->num_islands < 2) {
+        return done;
+    }
+    if (cd->island == 0) {
+        for (i=1; i<cd->num_islands; i++) {
+            MPI_Recv
+                ( &other, 1, MPI_INT, i, MIGRATION_TAG_DONE
+                , MPI_COMM_WORLD, &status
+                );
+            done = done || other;
+        }
+    } else {
+        MPI_Send (&done, 1, MPI_INT, 0, MIGRATION_TAG_DONE, MPI_COMM_WORLD);
+    }
+    MPI_Bcast (&done, 1, MPI_INT, 0, MPI_COMM_WORLD);
+    return done;
+}
+
+/*
+ * Pack the best migration_size individuals into a buffer. Each
+ * individual consists of the evaluation and auxiliary evaluations, the
+ * size of the chromosome and the chromosome. Chromosomes of user
+ * defined datatypes are serialized. If serialization or allocation
+ * fails, fewer individuals are sent: We still need to take part in the
+ * exchange. Called with the GIL held.
+ */
+static char *pack_migrants (PGAContext *ctx, int pop, int *len)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    size_t evsize = (ctx->ga.NumAuxEval + 1) * sizeof (double);
+    size_t used = 0;
+    char *buf = NULL;
+    int i;
+
+    for (i=0; i<cd->migration_size; i++) {
+        PGAIndividual *ind = PGAGetIndividual (ctx, cd->migrants [i], pop);
+        void *data = ind->chrom;
+        int size = chrom_size (ctx);
+        char *b;
+        if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+            size = serialize (ctx, cd->migrants [i], pop, &data);
+            if (data == NULL) {
+                break;
+            }
+        }
+        b = realloc (buf, used + evsize + sizeof (int) + size);
+        if (b == NULL) {
+            if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+                serialize_free (data);
+            }
+            PyErr_NoMemory ();
+            SET_ERR (ctx);
+            break;
+        }
+        buf = b;
+        memcpy (buf + used, &ind->evalue, sizeof (double));
+        if (ctx->ga.NumAuxEval) {
+            memcpy
+                ( buf + used + sizeof (double), ind->auxeval
+                , evsize - sizeof (double)
+                );
+        }
+        memcpy (buf + used + evsize, &size, sizeof (int));
+        memcpy (buf + used + evsize + sizeof (int), data, size);
+        used += evsize + sizeof (int) + size;
+        if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+            serialize_free (data);
+        }
+    }
+    *len = used;
+    return buf;
+}
+
+/*
+ * Unpack migrants received from another island, they replace the worst
+ * individuals of the population, starting before index slot of the
+ * sorted population. Returns the new slot.
+ */
+static int unpack_migrants
+    (PGAContext *ctx, int pop, int slot, const char *buf, int len)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    size_t evsize = (ctx->ga.NumAuxEval + 1) * sizeof (double);
+    size_t pos = 0;
+
+    while (  pos + evsize + sizeof (int) <= (size_t)len
+          && slot > cd->migration_size
+          )
+    {
+        int p = cd->migrants [--slot];
+        PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+        const char *data = buf + pos + evsize + sizeof (int);
+        double val;
+        int size;
+        memcpy (&size, buf + pos + evsize, sizeof (int));
+        if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+            deserialize (ctx, p, pop, data, size);
+        } else {
+            memcpy (ind->chrom, data, size);
+        }
+        if (!HAS_ERR (ctx)) {
+            memcpy (&val, buf + pos, sizeof (double));
+            if (ctx->ga.NumAuxEval) {
+                memcpy
+                    ( ind->auxeval, buf + pos + sizeof (double)
+                    , evsize - sizeof (double)
+                    );
+            }
+            _PGASetEvaluation (ctx, p, pop, val, ind->auxeval);
+        }
+        pos += evsize + sizeof (int) + size;
+    }
+    return slot;
+}
+
+/*
+ * Migrate the best migration_size individuals of the current
+ * population (PGA_OLDPOP at the start of a generation) to the
+ * neighboring islands, migrants received replace our worst individuals.
+ * After exchanging the sizes each island acknowledges the number of
+ * bytes it can receive, this is zero if allocation failed.
+ * Called with the GIL held.
+ */
+static void migrate (PGAContext *ctx)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    int pop = PGA_OLDPOP;
+    int nshift = migration_shifts (cd);
+    int slot = ctx->ga.PopSize;
+    int outlen = 0, s;
+    char *out = NULL;
+
+    if (cd->num_islands < 2) {
+        return;
+    }
+    PGAEvalSort (ctx, pop, cd->migrants);
+    out = pack_migrants (ctx, pop, &outlen);
+    for (s=0; s<nshift; s++) {
+        int dest = migration_neighbor (cd, s, 1);
+        int src  = migration_neighbor (cd, s, -1);
+        int inlen = 0, sendlen = 0;
+        char *in = NULL;
+        MPI_Status status;
+        /* Torus with a single row */
+        if (dest == cd->island) {
+            continue;
+        }
+        MPI_Sendrecv
+            ( &outlen, 1, MPI_INT, dest, MIGRATION_TAG_SIZE
+            , &inlen,  1, MPI_INT, src,  MIGRATION_TAG_SIZE
+            , MPI_COMM_WORLD, &status
+            );
+        in = malloc (inlen ? inlen : 1);
+        if (in == NULL) {
+            PyErr_NoMemory ();
+            SET_ERR (ctx);
+            inlen = 0;
+        }
+        MPI_Sendrecv
+            ( &inlen,   1, MPI_INT, src,  MIGRATION_TAG_ACK
+            , &sendlen, 1, MPI_INT, dest, MIGRATION_TAG_ACK
+            , MPI_COMM_WORLD, &status
+            );
+        MPI_Sendrecv
+            ( out, sendlen, MPI_BYTE, dest, MIGRATION_TAG_DATA
+            , in,  inlen,   MPI_BYTE, src,  MIGRATION_TAG_DATA
+            , MPI_COMM_WORLD, &status
+            );
+        if (in != NULL) {
+            slot = unpack_migrants (ctx, pop, slot, in, inlen);
+            free (in);
+        }
+    }
+    free (out);
+    PGAUpdateBest (ctx, pop);
+    if (  PGAGetSelectType (ctx) == PGA_SELECT_SUS
+       || PGAGetSelectType (ctx) == PGA_SELECT_PROPORTIONAL
+       )
+    {
+        PGAFitness (ctx, pop);
+    }
+}
+
+/*****************
+ * Generation log
+ *****************/
+
+/*
+ * JSON has no representation for NaN and infinity, we write them like
+ * the json module of python does.
+ */
+static void log_double (FILE *fp, double v)
+{
+    if (isnan (v)) {
+        fputs ("NaN", fp);
+    } else if (isinf (v)) {
+        fputs (v > 0 ? "Infinity" : "-Infinity", fp);
+    } else {
+        fprintf (fp, "%.17g", v);
+    }
+}
+
+static void log_array (FILE *fp, const char *name, const double *v, int n)
+{
+    int i;
+    fprintf (fp, ", \"%s\": [", name);
+    for (i=0; i<n; i++) {
+        if (i) {
+            fputs (", ", fp);
+        }
+        log_double (fp, v [i]);
+    }
+    fputc (']', fp);
+}
+
+/* Evaluation and auxiliary evaluations of individual p */
+static void log_evaluations (PGAContext *ctx, int p, int pop, double *v)
+{
+    v [0] = _PGAGetEvaluation (ctx, p, pop, NULL);
+    if (ctx->ga.NumAuxEval) {
+        memcpy
+            ( v + 1, PGAGetAuxEvaluation (ctx, p, pop)
+            , ctx->ga.NumAuxEval * sizeof (double)
+            );
+    }
+}
+
+/* Alleles of individual p of the builtin datatypes as a JSON value */
+static void log_genome (PGAContext *ctx, int p, int pop)
+{
+    FILE *fp = CUSTOM (ctx)->log_fp;
+    int i;
+
+    if (ctx->ga.datatype == PGA_DATATYPE_CHARACTER) {
+        fputc ('"', fp);
+        for (i=0; i<ctx->ga.StringLen; i++) {
+            unsigned char c = PGAGetCharacterAllele (ctx, p, pop, i);
+            if (c == '"' || c == '\\') {
+                fprintf (fp, "\\%c", c);
+            } else if (c < 0x20 || c > 0x7e) {
+                fprintf (fp, "\\u%04x", c);
+            } else {
+                fputc (c, fp);
+            }
+        }
+        fputc ('"', fp);
+        return;
+    }
+    fputc ('[', fp);
+    for (i=0; i<ctx->ga.StringLen; i++) {
+        if (i) {
+            fputs (", ", fp);
+        }
+        switch (ctx->ga.datatype) {
+        case PGA_DATATYPE_BINARY:
+            fputc (PGAGetBinaryAllele (ctx, p, pop, i) ? '1' : '0', fp);
+            break;
+        case PGA_DATATYPE_INTEGER:
+            fprintf (fp, "%ld", (long)PGAGetIntegerAllele (ctx, p, pop, i));
+            break;
+        case PGA_DATATYPE_REAL:
+            log_double (fp, PGAGetRealAllele (ctx, p, pop, i));
+            break;
+        default:
+            assert (0);
+        }
+    }
+    fputc (']', fp);
+}
+
+/*
+ * Append one JSON record for the current population to the generation
+ * log: The iteration, the number of evaluations and the best, worst
+ * and mean value of each evaluation (the first evaluation is maximized
+ * or minimized as configured, auxiliary evaluations are minimized).
+ * With constraints the number of infeasible individuals and the
+ * smallest sum of constraint violations are added, optionally the
+ * genome of the best individual. This is called from check_stop, so it
+ * is also called after a restart: We only log each iteration once. The
+ * file is buffered and flushed at the end of a run.
+ */
+static void write_log (PGAContext *ctx)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    FILE *fp = cd->log_fp;
+    int pop = PGA_OLDPOP;
+    int n = ctx->ga.NumAuxEval + 1;
+    int ncon = ctx->ga.NumConstraint;
+    int maximize = PGAGetOptDirFlag (ctx) == PGA_MAXIMIZE;
+    int p, k, infeasible = 0;
+    double min_violation = 0;
+    DECLARE_DYNARRAY (double, best,  n);
+    DECLARE_DYNARRAY (double, worst, n);
+    DECLARE_DYNARRAY (double, mean,  n);
+    DECLARE_DYNARRAY (double, v,     n);
+
+    if (cd->log_iter == ctx->ga.iter) {
+        return;
+    }
+    cd->log_iter = ctx->ga.iter;
+    /* Start with individual 0, it is counted again in the loop below */
+    log_evaluations (ctx, 0, pop, best);
+    memcpy (worst, best, n * sizeof (double));
+    memset (mean, 0, n * sizeof (double));
+    for (p=0; p<ctx->ga.PopSize; p++) {
+        double violation = 0;
+        log_evaluations (ctx, p, pop, v);
+        for (k=0; k<n; k++) {
+            int better = k == 0 && maximize ? v [k] > best [k]
+                                            : v [k] < best [k];
+            int worse  = k == 0 && maximize ? v [k] < worst [k]
+                                            : v [k] > worst [k];
+            if (better) {
+                best [k] = v [k];
+            }
+            if (worse) {
+                worst [k] = v [k];
+            }
+            mean [k] += v [k];
+        }
+        for (k=n-ncon; k<n; k++) {
+            if (v [k] > 0) {
+                violation += v [k];
+            }
+        }
+        if (violation > 0) {
+            infeasible++;
+        }
+        if (p == 0 || violation < min_violation) {
+            min_violation = violation;
+        }
+    }
+    for (k=0; k<n; k++) {
+        mean [k] /= ctx->ga.PopSize;
+    }
+    fprintf
+        (fp, "{\"iter\": %d, \"evals\": %d", ctx->ga.iter, ctx->rep.nevals);
+    log_array (fp, "best",  best,  n);
+    log_array (fp, "worst", worst, n);
+    log_array (fp, "mean",  mean,  n);
+    if (ncon) {
+        fprintf
+            (fp, ", \"infeasible\": %d, \"min_violation\": ", infeasible);
+        log_double (fp, min_violation);
+    }
+    if (cd->log_genome) {
+        fputs (", \"genome\": ", fp);
+        log_genome (ctx, PGAGetBestIndex (ctx, pop), pop);
+    }
+    fputs ("}\n", fp);
+}
+
+/****************
+ * GIL handling
+ ****************/
+
+/*
+ * PGARun is called with the GIL released, so other python threads run
+ * while PGApack does selection, crossover, mutation, sorting etc. for
+ * the builtin datatypes. The callbacks calling into python are
+ * installed via the following wrappers that acquire the GIL. Callbacks
+ * are also called with the GIL held (e.g. from PGA methods called in
+ * python), PyGILState_Ensure handles this.
+ */
+static void gil_endofgen (PGAContext *ctx)
+{
+    PGACustomData *cd = CUSTOM (ctx);
+    if (cd->timing) {
+        double start = timing_phase (cd, T_PHASE_ENDOFGEN);
+        WITH_GIL (endofgen (ctx));
+        timing_add (cd, T_ENDOFGEN, start, timing_phase (cd, T_PHASE_REPORT));
+        return;
+    }
+    WITH_GIL (endofgen (ctx));
+}
+
+static double gil_evaluate (PGAContext *ctx, int p, int pop, double *aux)
+{
+    double retval;
+    TIMED (ctx, T_EVALUATE, WITH_GIL (retval = evaluate (ctx, p, pop, aux)));
+    if (CUSTOM (ctx)->timing) {
+        CUSTOM (ctx)->eval_end = timing_now ();
+    }
+    return retval;
+}
+
+static PGAHash gil_build_hash (PGAContext *ctx, int p, int pop)
+{
+    PGAHash retval;
+    TIMED (ctx, T_HASH, WITH_GIL (retval = build_hash (ctx, p, pop)));
+    return retval;
+}
+
+static int gil_check_duplicate
+    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+{
+    int retval;
+    TIMED
+        ( ctx, T_CHECK_DUPLICATE
+        , WITH_GIL (retval = check_duplicate (ctx, p1, pop1, p2, pop2))
+        );
+    return retval;
+}
+
+static void gil_copystring
+    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+{
+    TIMED (ctx, T_COPY_GENE, WITH_GIL (copystring (ctx, p1, pop1, p2, pop2)));
+}
+
+static void gil_initstring (PGAContext *ctx, int p, int pop)
+{
+    TIMED (ctx, T_INITSTRING, WITH_GIL (initstring (ctx, p, pop)));
+}
+
+static void gil_createstring (PGAContext *ctx, int p, int pop, int initflag)
+{
+    TIMED
+        ( ctx, T_CREATESTRING
+        , WITH_GIL (createstring (ctx, p, pop, initflag))
+        );
+}
+
+static void gil_crossover
+    (PGAContext *ctx, int p1, int p2, int p_pop, int c1, int c2, int c_pop)
+{
+    TIMED
+        ( ctx, T_CROSSOVER
+        , WITH_GIL (crossover (ctx, p1, p2, p_pop, c1, c2, c_pop))
+        );
+}
+
+static int gil_mutation (PGAContext *ctx, int p, int pop, double mr)
+{
+    int retval;
+    TIMED (ctx, T_MUTATION, WITH_GIL (retval = mutation (ctx, p, pop, mr)));
+    return retval;
+}
+
+static double gil_gene_distance
+    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+{
+    double retval;
+    TIMED
+        ( ctx, T_GENE_DISTANCE
+        , WITH_GIL (retval = gene_distance (ctx, p1, pop1, p2, pop2))
+        );
+    return retval;
+}
+
+static void gil_hillclimb (PGAContext *ctx, int p, int pop)
+{
+    TIMED (ctx, T_HILLCLIMB, WITH_GIL (hillclimb (ctx, p, pop)));
 }
 
-/*
- * Used only for user defined data type.
- * If the initflag is zero, we do no initialization and assert that the
- * chromosome is a NULL pointer. Otherwise we call self.initstring.
- */
-static void createstring (PGAContext *ctx, int p, int pop, int initflag)
+static void gil_pre_eval (PGAContext *ctx, int pop)
 {
-    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
-    if (!initflag) {
-        assert (ind->chrom == NULL);
+    PGACustomData *cd = CUSTOM (ctx);
+    if (cd->timing) {
+        double start = timing_phase (cd, T_PHASE_EVALUATION);
+        WITH_GIL (pre_eval (ctx, pop));
+        cd->eval_end = timing_now ();
+        timing_add (cd, T_PRE_EVAL, start, cd->eval_end);
         return;
     }
-    initstring (ctx, p, pop);
+    WITH_GIL (pre_eval (ctx, pop));
 }
 
-/*
- * Used if the calling object has a crossover method.
- * Otherwise use built-in default for the datatype.
- * Perform crossover from p1 and p2 into c1 and c2
- */
-static void crossover
-    (PGAContext *ctx, int p1, int p2, int p_pop, int c1, int c2, int c_pop)
+static void gil_print_gene (PGAContext *ctx, FILE *fp, int p, int pop)
 {
-    PyObject *self = NULL, *r = NULL;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r    = PyObject_CallMethod
-        (self, "crossover", "iiiiii", p1, p2, p_pop, c1, c2, c_pop);
-    ERR_CHECK_X (ctx, r);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
-    return;
+    TIMED (ctx, T_PRINT_STRING, WITH_GIL (print_gene (ctx, fp, p, pop)));
 }
 
-/*
- * Used if the calling object has a mutation method.
- * Otherwise use built-in default for the datatype.
- * Insert code to mutate Data.
- * Remember to count the number of mutations that happen, and return
- * that value!
- */
-static int mutation (PGAContext *ctx, int p, int pop, double mr)
+static size_t gil_serialize (PGAContext *ctx, int p, int pop, void **ser)
 {
-    PyObject *self = NULL, *r = NULL;
-    int retval = 0, rr;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r    = PyObject_CallMethod (self, "mutation", "iid", p, pop, mr);
-    ERR_CHECK_X (ctx, r);
-    rr = PyArg_Parse (r, "i", &retval);
-    ERR_CHECK_X (ctx, rr);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
+    size_t retval;
+    TIMED
+        ( ctx, T_SERIALIZE_GENE
+        , WITH_GIL (retval = serialize (ctx, p, pop, ser))
+        );
     return retval;
 }
 
-/*
- * Used if the calling object has a gene_distance method.
- * Otherwise use built-in default for the datatype.
- * Insert code to compute genetic difference of two individuals.
- */
-static double gene_distance
-    (PGAContext *ctx, int p1, int pop1, int p2, int pop2)
+static void gil_serialize_free (void *p)
 {
-    PyObject *self = NULL, *r = NULL;
-    int rr;
-    double retval = 0.0;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r = PyObject_CallMethod
-        (self, "gene_distance", "iiii", p1, pop1, p2, pop2);
-    ERR_CHECK_X (ctx, r);
-    rr = PyArg_Parse (r, "d", &retval);
-    ERR_CHECK_X (ctx, rr);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
-    return retval;
+    WITH_GIL (serialize_free (p));
+}
+
+static void gil_chrom_free (PGAIndividual *ind)
+{
+    TIMED (ind->ctx, T_CHROM_FREE, WITH_GIL (chrom_free (ind)));
+}
+
+static void gil_deserialize
+    (PGAContext *ctx, int p, int pop, const void *serial, size_t size)
+{
+    TIMED
+        ( ctx, T_DESERIALIZE_GENE
+        , WITH_GIL (deserialize (ctx, p, pop, serial, size))
+        );
 }
 
+/*********************
+ * Population storage
+ *********************/
+
 /*
- * Used if the calling object has a hillclimb method.
+ * Size in bytes of one chromosome for the builtin data types
  */
-static void hillclimb (PGAContext *ctx, int p, int pop)
+static size_t chrom_size (PGAContext *ctx)
 {
-    PyObject *self = NULL, *r = NULL;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r = PyObject_CallMethod (self, "hillclimb", "ii", p, pop);
-    ERR_CHECK_X (ctx, r);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
-    return;
+    switch (ctx->ga.datatype) {
+    case PGA_DATATYPE_BINARY:
+        return ctx->ga.tw * sizeof (PGABinary);
+    case PGA_DATATYPE_CHARACTER:
+        return ctx->ga.StringLen * sizeof (PGACharacter);
+    case PGA_DATATYPE_INTEGER:
+        return ctx->ga.StringLen * sizeof (PGAInteger);
+    case PGA_DATATYPE_REAL:
+        return ctx->ga.StringLen * sizeof (PGAReal);
+    }
+    return 0;
 }
 
 /*
- * Used if the calling object has a pre_eval method.
+ * Number of doubles in the shared results array: One evaluation
+ * (including auxiliary evaluations) per row of the chromosome storage.
  */
-static void pre_eval (PGAContext *ctx, int pop)
+static size_t results_size (PGAContext *ctx)
 {
-    PyObject *self = NULL, *r = NULL;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    r = PyObject_CallMethod (self, "pre_eval", "i", pop);
-    ERR_CHECK_X (ctx, r);
-errout:
-    Py_CLEAR (r);
-    Py_CLEAR (self);
-    return;
+    return 2 * (ctx->ga.PopSize + 2) * (ctx->ga.NumAuxEval + 1);
 }
 
-static PyObject *get_file_from_fp (PGAContext *ctx, PyObject *self, FILE *fp)
+/*
+ * Allocate an anonymous shared mmap that holds the results array
+ * followed by csize bytes for the chromosomes. Forked worker processes
+ * see the same memory, so they can read chromosomes and write
+ * evaluations in place.
+ */
+static int allocate_shared (PGAContext *ctx, size_t csize)
 {
-    int retval = -1;
-    PyObject *file = NULL;
-    PyObject *pyfp = NULL;
-    int fd = fileno (fp);
-    
-    /* Should never happen unles fp is not a valid stream */
-    ERR_CHECK_ERRNO (ctx, fd >= 0, NULL);
-#if IS_PY3
-    file = PyFile_FromFd (fd, "", "w", -1, "utf-8", NULL, NULL, 0);
-#else
+    PyObject *mmap = NULL;
+    size_t size = results_size (ctx) * sizeof (double) + csize;
+    int r = 0;
+
+    mmap = PyImport_ImportModule ("mmap");
+    if (mmap == NULL) {
+        return 0;
+    }
+    CUSTOM (ctx)->shared = PyObject_CallMethod (mmap, "mmap", "in", -1, size);
+    if (CUSTOM (ctx)->shared == NULL) {
+        goto errout;
+    }
+    if (PyObject_GetBuffer
+        (CUSTOM (ctx)->shared, &CUSTOM (ctx)->shared_view, PyBUF_WRITABLE) < 0
+       )
     {
-        FILE *fp2 = fdopen (fd, "w");
-        ERR_CHECK_ERRNO (ctx, fp2 != NULL, NULL);
-        file = PyFile_FromFile (fp2, "<PGA_file>", "w", NULL);
+        Py_CLEAR (CUSTOM (ctx)->shared);
+        goto errout;
     }
-#endif
-    ERR_CHECK (ctx, file, NULL);
-    pyfp = Py_BuildValue ("L", (long long) fp);
-    ERR_CHECK (ctx, pyfp, NULL);
-    retval = PyObject_SetAttrString (self, "_fp", pyfp);
-    ERR_CHECK (ctx, retval >= 0, NULL);
-    return file;
+    CUSTOM (ctx)->results = CUSTOM (ctx)->shared_view.buf;
+    r = 1;
+errout:
+    Py_DECREF (mmap);
+    return r;
 }
 
 /*
- * Low-level gene print function
- * Note: We do a hack here and store both, the original FILE *fp and the
- * generated python file object into member variables _fp and _file,
- * respectively. These are reused in the print_gene function (and the
- * called print_string python method). This avoids garbage collection
- * and/or memory leak issues with files and FILE * variables. There is
- * no way to temporarily create a FILE * and avoiding the unterlying
- * file descriptor being closed in C. The previous version used dup2 to
- * duplicate the file descriptor but this is non-portable. The issue is
- * further complicated by the fact that Python3 (as opposed to Python2)
- * uses file descriptors not FILE* for generating a file object.
+ * PGApack allocates each chromosome of a builtin data type separately.
+ * After PGASetUp we move the chromosomes of both population arrays into
+ * a single contiguous block, the individuals of one population array
+ * (including the two temporary individuals) are consecutive rows. The
+ * chrom pointers are never reassigned by PGApack for builtin data types
+ * so the block can be exported via the buffer protocol. Note that
+ * PGApack swaps the population arrays after each generation, so the
+ * row of an individual depends on the array currently used for pop.
  */
-static void print_gene (PGAContext *ctx, FILE *fp, int p, int pop)
+static int relocate_chromosomes (PGAContext *ctx, int shared)
 {
-    PyObject *self = NULL, *file = NULL, *r = NULL;
-    int retval = -1;
-    ERR_CHECK_X_OCCURRED (ctx);
-    self    = get_self (ctx);
-    ERR_CHECK_X (ctx, self);
-    fflush (fp);
+    PGAIndividual *pops [2];
+    size_t csize = chrom_size (ctx);
+    int npop = ctx->ga.PopSize + 2;
+    int i, k;
+    char *storage;
 
-    file = get_file_from_fp (ctx, self, fp);
-    ERR_CHECK_X (ctx, file);
-    r = PyObject_CallMethod (self, "print_string", "Oii", file, p, pop);
-    ERR_CHECK_X (ctx, r);
-    Py_CLEAR (r);
-    /* Flush file */
-    r = PyObject_CallMethod (file, "flush", "");
-    ERR_CHECK_X (ctx, r);
-    Py_CLEAR (r);
-    /* File is set to not close unterlying fd but close anyway */
-    r = PyObject_CallMethod (file, "close", "");
-    ERR_CHECK_X (ctx, r);
-    Py_CLEAR (r);
-    /* Now remove self._fp */
-    retval = PyObject_DelAttrString (self, "_fp");
-    ERR_CHECK_X (ctx, retval == 0);
-errout:
-    Py_CLEAR (file);
-    Py_CLEAR (r);
-    Py_CLEAR (self);
+    if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+        return 1;
+    }
+    if (shared) {
+        if (!allocate_shared (ctx, 2 * npop * csize)) {
+            return 0;
+        }
+        storage = (char *)(CUSTOM (ctx)->results + results_size (ctx));
+    } else {
+        storage = malloc (2 * npop * csize);
+        if (storage == NULL) {
+            PyErr_NoMemory ();
+            return 0;
+        }
+    }
+    pops [0] = ctx->ga.oldpop;
+    pops [1] = ctx->ga.newpop;
+    for (k=0; k<2; k++) {
+        for (i=0; i<npop; i++) {
+            PGAIndividual *ind = pops [k] + i;
+            char *chrom = storage + (k * npop + i) * csize;
+            memcpy (chrom, ind->chrom, csize);
+            free (ind->chrom);
+            ind->chrom = chrom;
+        }
+    }
+    CUSTOM (ctx)->chrom_storage = storage;
+    return 1;
 }
 
-/******************
- * Serialization
- ******************/
+/*
+ * Must be called before PGADestroy: PGApack frees each chromosome
+ * separately, so we reset the pointers into our block first.
+ */
+static void release_chromosomes (PGAContext *ctx)
+{
+    int i;
 
-static void *serialize_object  = NULL;
-static void *serialize_inner   = NULL;
-static PyObject *pickle_module = NULL;
+    if (CUSTOM (ctx)->chrom_storage == NULL) {
+        return;
+    }
+    for (i=0; i<ctx->ga.PopSize + 2; i++) {
+        ctx->ga.oldpop [i].chrom = NULL;
+        ctx->ga.newpop [i].chrom = NULL;
+    }
+    if (CUSTOM (ctx)->shared != NULL) {
+        PyBuffer_Release (&CUSTOM (ctx)->shared_view);
+        Py_CLEAR (CUSTOM (ctx)->shared);
+        CUSTOM (ctx)->results = NULL;
+    } else {
+        free (CUSTOM (ctx)->chrom_storage);
+    }
+    CUSTOM (ctx)->chrom_storage = NULL;
+}
 
 /*
- * Used only for user defined data type.
- * This implementation relies on a serialization to be immediately used
- * and freed afterwards.
+ * Row of an individual in the chromosome storage, see
+ * relocate_chromosomes.
  */
-static size_t serialize (PGAContext *ctx, int p, int pop, void **ser)
+static int storage_row (PGAContext *ctx, int p, int pop)
 {
     PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
-    Py_ssize_t serial_size = 0;
-    ERR_CHECK_X_OCCURRED (ctx);
-    ERR_CHECK_X (ctx, ind->chrom != NULL);
-    ERR_CHECK_X (ctx, serialize_object == NULL);
-    ERR_CHECK_X (ctx, serialize_inner  == NULL);
-    if (pickle_module == NULL) {
-        pickle_module = PyImport_ImportModule ("pickle");
-    }
-    ERR_CHECK_X (ctx, pickle_module);
-    serialize_object = PyObject_CallMethod
-        (pickle_module, "dumps", "O", ind->chrom);
-    ERR_CHECK_X (ctx, serialize_object);
-    serial_size = PyByteArray_Size (serialize_object);
-    ERR_CHECK_X (ctx, serial_size >= 0);
-    serialize_inner = PyBytes_AsString (serialize_object);
-    ERR_CHECK_X (ctx, serialize_inner);
-    goto out;
-errout:
-    Py_CLEAR (serialize_object);
-    serialize_object = serialize_inner = NULL;
-out:
-    *ser = serialize_inner;
-    return (size_t)serial_size;
+    char *base = CUSTOM (ctx)->chrom_storage;
+    return ((char *)ind->chrom - base) / chrom_size (ctx);
 }
 
 /*
- * The pointer is immediately freed after being used, so we free the
- * corresponding python object here.
+ * Buffer object exporting the chromosomes of a population as a
+ * two-dimensional array. It keeps a reference to the PGA object, the
+ * storage is valid as long as a view into the buffer exists.
  */
-static void serialize_free (void *p)
+typedef struct {
+    PyObject_HEAD
+    PyObject   *pga;
+    char       *buf;
+    char       *format;
+    Py_ssize_t  itemsize;
+    Py_ssize_t  shape   [2];
+    Py_ssize_t  strides [2];
+} PGABufferObject;
+
+static int PGABuffer_getbuffer (PyObject *obj, Py_buffer *view, int flags)
 {
-    PyObject *o = serialize_object;
-    assert (o != NULL);
-    assert (p == serialize_inner);
-    Py_DECREF (o);
-    serialize_object = NULL;
-    serialize_inner  = NULL;
+    PGABufferObject *self = (PGABufferObject *)obj;
+
+    view->obj        = obj;
+    view->buf        = self->buf;
+    view->len        = self->shape [0] * self->shape [1] * self->itemsize;
+    view->readonly   = 0;
+    view->itemsize   = self->itemsize;
+    view->format     = (flags & PyBUF_FORMAT) ? self->format : NULL;
+    view->ndim       = 2;
+    view->shape      = self->shape;
+    view->strides    = self->strides;
+    view->suboffsets = NULL;
+    view->internal   = NULL;
+    if ((flags & PyBUF_ND) != PyBUF_ND) {
+        view->ndim    = 1;
+        view->shape   = NULL;
+        view->strides = NULL;
+    } else if ((flags & PyBUF_STRIDES) != PyBUF_STRIDES) {
+        view->strides = NULL;
+    }
+    Py_INCREF (obj);
+    return 0;
 }
 
-/*
- * Free the gene
- */
-static void chrom_free (PGAIndividual *ind)
+static void PGABuffer_dealloc (PyObject *obj)
 {
-    if (ind->chrom != NULL) {
-        Py_DECREF (ind->chrom);
-        ind->chrom = NULL;
-    }
+    PGABufferObject *self = (PGABufferObject *)obj;
+    Py_CLEAR (self->pga);
+    Py_TYPE (obj)->tp_free (obj);
 }
 
-static void deserialize
-    (PGAContext *ctx, int p, int pop, const void *serial, size_t size)
+static PyBufferProcs PGABuffer_as_buffer = {
+    .bf_getbuffer      = PGABuffer_getbuffer,
+};
+
+static PyTypeObject PGABuffer_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name           = "pga.PGABuffer",
+    .tp_doc            = "Buffer exporting the alleles of a population",
+    .tp_basicsize      = sizeof (PGABufferObject),
+    .tp_itemsize       = 0,
+    .tp_flags          = Py_TPFLAGS_DEFAULT,
+    .tp_as_buffer      = &PGABuffer_as_buffer,
+    .tp_dealloc        = (destructor) PGABuffer_dealloc,
+};
+
+static PyObject *module_numpy = NULL;
+
+/*
+ * Return a numpy array for an object exporting the buffer protocol
+ * (without copying), if numpy is not available return a memoryview.
+ */
+static PyObject *wrap_buffer (PyObject *obj)
 {
-    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
-    PyObject *serialized = NULL;
-    PyObject *obj = NULL;
-    ERR_CHECK_X_OCCURRED (ctx);
-    serialized = PyBytes_FromStringAndSize (serial, size);
-    ERR_CHECK_X (ctx, serialized);
-    if (pickle_module == NULL) {
-        pickle_module = PyImport_ImportModule ("pickle");
+    if (module_numpy == NULL) {
+        PyObject *numpy = PyImport_ImportModule ("numpy");
+        if (numpy == NULL) {
+            if (!PyErr_ExceptionMatches (PyExc_ImportError)) {
+                return NULL;
+            }
+            PyErr_Clear ();
+            Py_INCREF (Py_None);
+            numpy = Py_None;
+        }
+        /* Another thread may have imported it while importing */
+        if (module_numpy == NULL) {
+            module_numpy = numpy;
+        } else {
+            Py_DECREF (numpy);
+        }
     }
-    ERR_CHECK_X (ctx, pickle_module);
-    obj = PyObject_CallMethod (pickle_module, "loads", "O", serialized);
-    ERR_CHECK_X (ctx, obj);
-    if (ind->chrom != NULL) {
-        Py_DECREF (ind->chrom);
-        ind->chrom = NULL;
+    if (module_numpy == Py_None) {
+        return PyMemoryView_FromObject (obj);
     }
-    /* No need to increment refcount */
-    ind->chrom = obj;
-errout:
-    Py_CLEAR (serialized);
+    return PyObject_CallMethod (module_numpy, "asarray", "O", obj);
 }
 
 /******************
@@ -1332,7 +3278,7 @@ static char **parse_argv (PyObject *argv, int *argcp)
 
 #define INIT_FAIL -1
 
-/* Registered as atexit function and also called by destructor */
+/* Registered as atexit function */
 static void exitfunc (void)
 {
     int mpi_finalized = 0;
@@ -1420,6 +3366,22 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
     int mutation_scramble_max = -1;
     int sort_nd = -1;
     int crowding_method = -1;
+    int num_threads = 0;
+    PyObject *executor = NULL;
+    int num_processes = 0;
+    PyObject *shared = NULL;
+    int shared_population = 0;
+    PyObject *eval_cache = NULL;
+    int async_concurrency = 0;
+    int symmetry = PGA_SYMMETRY_NONE;
+    int migration_interval = 0;
+    int migration_size = 1;
+    int migration_topology = PGA_TOPOLOGY_RING;
+    PyObject *steady_state = NULL;
+    int loopback_ranks = 0;
+    PyObject *log_file = NULL;
+    PyObject *log_genome = NULL;
+    PyObject *timing = NULL;
     static char *kwlist[] =
         { "type"
         , "length"
@@ -1500,6 +3462,21 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
         , "mutation_scramble_max"
         , "sort_nd"
         , "crowding_method"
+        , "num_threads"
+        , "executor"
+        , "num_processes"
+        , "shared_population"
+        , "eval_cache"
+        , "async_concurrency"
+        , "symmetry"
+        , "migration_interval"
+        , "migration_size"
+        , "migration_topology"
+        , "async_steady_state"
+        , "loopback_ranks"
+        , "log_file"
+        , "log_genome"
+        , "timing"
         , NULL
         };
 
@@ -1507,7 +3484,7 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
             ( args
             , kw
             , "Oi|OiiOOOiiiidOiiOOOiidOOOddiOiOOiddd"
-              "iiiddddddOOOididdidiidiiiOOidOOiidiiOiiOiii"
+              "iiiddddddOOOididdidiidiiiOOidOOiidiiOiiOiiiiOiOOiiiiiOiOOO"
             , kwlist
             , &type
             , &length
@@ -1588,6 +3565,21 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
             , &mutation_scramble_max
             , &sort_nd
             , &crowding_method
+            , &num_threads
+            , &executor
+            , &num_processes
+            , &shared
+            , &eval_cache
+            , &async_concurrency
+            , &symmetry
+            , &migration_interval
+            , &migration_size
+            , &migration_topology
+            , &steady_state
+            , &loopback_ranks
+            , &log_file
+            , &log_genome
+            , &timing
             )
         )
     {
@@ -1665,27 +3657,229 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
     if (PGA_ctx == NULL) {
         return INIT_FAIL;
     }
-    assert (contexts);
-    assert (self);
-    PyObject_SetItem (contexts, PGA_ctx, self);
-
-    ERR_DECREF_RET
-        ( PyObject_SetAttrString (self, "context", PGA_ctx) >= 0
-        , PGA_ctx, INIT_FAIL
+    assert (contexts);
+    assert (self);
+    PyObject_SetItem (contexts, PGA_ctx, self);
+
+    ERR_DECREF_RET
+        ( PyObject_SetAttrString (self, "context", PGA_ctx) >= 0
+        , PGA_ctx, INIT_FAIL
+        );
+    Py_CLEAR (PGA_ctx);
+    /*
+     * Allocate per-context data structure, this contains the error
+     * indicator used for terminating the search and raising an error
+     * outside
+     */
+    assert (ctx->ga.CustomData == NULL);
+    ctx->ga.CustomData = calloc (1, sizeof (PGACustomData));
+    if (ctx->ga.CustomData == NULL) {
+        PyErr_NoMemory ();
+        return INIT_FAIL;
+    }
+    CUSTOM (ctx)->pid = (long)getpid ();
+    if (!resolve_methods (ctx, self)) {
+        return INIT_FAIL;
+    }
+    CHECK_VALUE (num_threads >= 0, "num_threads must not be negative");
+    CHECK_VALUE (num_processes >= 0, "num_processes must not be negative");
+    CHECK_VALUE
+        ( loopback_ranks >= 0 || loopback_ranks == PGA_LOOPBACK_ENV
+        , "loopback_ranks must not be negative"
+        );
+    /* The loopback transport replaces evaluation (and hillclimb), so
+     * the environment variable is only used if explicitly requested.
+     */
+    if (loopback_ranks == PGA_LOOPBACK_ENV) {
+        const char *env = getenv ("PGA_LOOPBACK_RANKS");
+        loopback_ranks = 0;
+        if (env != NULL) {
+            loopback_ranks = atoi (env);
+        }
+        CHECK_VALUE
+            ( loopback_ranks >= 0
+            , "PGA_LOOPBACK_RANKS must not be negative"
+            );
+    }
+    CHECK_VALUE
+        ( (executor != NULL && executor != Py_None)
+        + (num_threads > 0) + (num_processes > 0) + (loopback_ranks > 0) <= 1
+        , "Only one of num_threads, num_processes, loopback_ranks and "
+          "executor may be specified"
+        );
+    if (executor != NULL && executor != Py_None) {
+        Py_INCREF (executor);
+        CUSTOM (ctx)->executor = executor;
+    } else if (num_threads > 1) {
+        PyObject *futures = PyImport_ImportModule ("concurrent.futures");
+        if (futures == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->executor = PyObject_CallMethod
+            (futures, "ThreadPoolExecutor", "i", num_threads);
+        Py_DECREF (futures);
+        if (CUSTOM (ctx)->executor == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->own_executor = 1;
+    } else if (num_processes > 1) {
+        PyObject *parallel = PyImport_ImportModule ("pga.parallel");
+        if (parallel == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->executor = PyObject_CallMethod
+            (parallel, "PGA_Process_Pool", "Oi", self, num_processes);
+        Py_DECREF (parallel);
+        if (CUSTOM (ctx)->executor == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->own_executor = 1;
+    }
+    CHECK_VALUE
+        ( async_concurrency >= 0
+        , "async_concurrency must not be negative"
+        );
+    if (HAS_METHOD (ctx, M_EVALUATE_ASYNC)) {
+        PyObject *parallel = NULL;
+        CHECK_VALUE
+            ( CUSTOM (ctx)->executor == NULL && loopback_ranks == 0
+            , "evaluate_async cannot be combined with num_threads, "
+              "num_processes, loopback_ranks or executor"
+            );
+        parallel = PyImport_ImportModule ("pga.parallel");
+        if (parallel == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->executor = PyObject_CallMethod
+            ( parallel, "PGA_Async_Executor", "Oi"
+            , self, async_concurrency
+            );
+        Py_DECREF (parallel);
+        if (CUSTOM (ctx)->executor == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->own_executor = 1;
+    }
+    if (loopback_ranks > 1) {
+        PyObject *parallel = NULL;
+        CHECK_VALUE
+            ( PGAGetNumProcs (ctx, MPI_COMM_WORLD) == 1
+            , "loopback_ranks cannot be used with MPI"
+            );
+        parallel = PyImport_ImportModule ("pga.parallel");
+        if (parallel == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->executor = PyObject_CallMethod
+            (parallel, "PGA_Loopback", "Oi", self, loopback_ranks);
+        Py_DECREF (parallel);
+        if (CUSTOM (ctx)->executor == NULL) {
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->own_executor = 1;
+    }
+    if (shared && PyObject_IsTrue (shared)) {
+        CHECK_VALUE
+            ( num_processes > 1
+            , "shared_population requires num_processes"
+            );
+        CHECK_VALUE
+            ( ctx->ga.datatype != PGA_DATATYPE_USER
+            , "shared_population is not supported for user datatypes"
+            );
+        shared_population = 1;
+    }
+    if (steady_state && PyObject_IsTrue (steady_state)) {
+        CHECK_VALUE
+            ( num_processes > 1
+            , "async_steady_state requires num_processes"
+            );
+        CHECK_VALUE
+            ( !shared_population
+            , "async_steady_state cannot be combined with shared_population"
+            );
+        /* Finished individuals are inserted after the duplicate check */
+        CHECK_VALUE
+            ( !no_duplicates || !PyObject_IsTrue (no_duplicates)
+            , "async_steady_state cannot be combined with no_duplicates"
+            );
+        CHECK_VALUE
+            (  !HAS_METHOD (ctx, M_EVALUATE_BATCH)
+            && (eval_cache == NULL || eval_cache == Py_None)
+            , "async_steady_state cannot be combined with evaluate_batch "
+              "or eval_cache"
+            );
+        CUSTOM (ctx)->steady_state = 1;
+    }
+    CHECK_VALUE
+        (  symmetry >= PGA_SYMMETRY_NONE && symmetry <= PGA_SYMMETRY_TOUR
+        , "Invalid symmetry"
         );
-    Py_CLEAR (PGA_ctx);
-    /*
-     * Allocate data structure for error indicator, for now this is just
-     * an integer flag. This is used for terminating the search and
-     * raising an error outside
-     */
-    assert (ctx->ga.CustomData == NULL);
-    ctx->ga.CustomData = malloc (sizeof (int));
-    if (ctx->ga.CustomData == NULL) {
-        PyErr_NoMemory ();
-        return INIT_FAIL;
+    if (symmetry != PGA_SYMMETRY_NONE) {
+        CHECK_VALUE
+            ( ctx->ga.datatype == PGA_DATATYPE_INTEGER
+            , "symmetry is only supported for integer genes"
+            );
+        CHECK_VALUE
+            (  !HAS_METHOD (ctx, M_HASH)
+            && !HAS_METHOD (ctx, M_CHECK_DUPLICATE)
+            , "symmetry cannot be combined with hash or check_duplicate"
+            );
+        if (symmetry == PGA_SYMMETRY_SQUARE) {
+            int side = 1;
+            while (side * side < length) {
+                side++;
+            }
+            CHECK_VALUE
+                ( side * side == length
+                , "PGA_SYMMETRY_SQUARE needs a square number as length"
+                );
+            CUSTOM (ctx)->square_side = side;
+        }
+        CUSTOM (ctx)->canonical = malloc (2 * length * sizeof (PGAInteger));
+        if (CUSTOM (ctx)->canonical == NULL) {
+            PyErr_NoMemory ();
+            return INIT_FAIL;
+        }
+        CUSTOM (ctx)->symmetry = symmetry;
     }
-    *((int *)ctx->ga.CustomData) = 0;
+    CHECK_VALUE
+        ( migration_interval >= 0
+        , "migration_interval must not be negative"
+        );
+    CHECK_VALUE (migration_size >= 1, "migration_size must be at least 1");
+    CHECK_VALUE
+        (  migration_topology >= PGA_TOPOLOGY_COMPLETE
+        && migration_topology <= PGA_TOPOLOGY_TORUS
+        , "Invalid migration_topology"
+        );
+    if (migration_interval) {
+        int n = PGAGetNumProcs (ctx, MPI_COMM_WORLD);
+        int rows = 1, r;
+        /* Grid of the torus is as square as possible */
+        for (r=1; r * r <= n; r++) {
+            if (n % r == 0) {
+                rows = r;
+            }
+        }
+        CUSTOM (ctx)->migration_interval = migration_interval;
+        CUSTOM (ctx)->migration_size     = migration_size;
+        CUSTOM (ctx)->topology           = migration_topology;
+        CUSTOM (ctx)->island             = PGAGetRank (ctx, MPI_COMM_WORLD);
+        CUSTOM (ctx)->num_islands        = n;
+        CUSTOM (ctx)->torus_cols         = n / rows;
+        /* Each island runs the whole GA on its own rank */
+        PGASetCommunicator (ctx, MPI_COMM_SELF);
+    }
+    if (eval_cache != NULL && eval_cache != Py_None) {
+        Py_INCREF (eval_cache);
+        CUSTOM (ctx)->cache = eval_cache;
+        CUSTOM (ctx)->cache_flush = PyObject_HasAttrString
+            (eval_cache, "flush");
+    }
+    /* The timing of phases needs the endofgen and pre_eval hooks */
+    CUSTOM (ctx)->timing = timing && PyObject_IsTrue (timing);
+    CUSTOM (ctx)->phase  = -1;
 
     /* If using userdefined datatypes we also set the user functions
      * because PGAPack requires these and for many use-cases they are
@@ -1695,80 +3889,102 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
      * Some of the functions are *only* defined internally and do not
      * call into python methods.
      */
-    if (  PyObject_HasAttrString (self, "check_duplicate")
+    if (  HAS_METHOD (ctx, M_CHECK_DUPLICATE)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_DUPLICATE, (void *)check_duplicate);
+            (ctx, PGA_USERFUNCTION_DUPLICATE, (void *)gil_check_duplicate);
+    } else if (CUSTOM (ctx)->symmetry != PGA_SYMMETRY_NONE) {
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_DUPLICATE, (void *)symmetry_duplicate);
     }
-    if (  PyObject_HasAttrString (self, "hash")
+    if (  HAS_METHOD (ctx, M_HASH)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
-        PGASetUserFunction (ctx, PGA_USERFUNCTION_HASH, (void *)build_hash);
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_HASH, (void *)gil_build_hash);
+    } else if (CUSTOM (ctx)->symmetry != PGA_SYMMETRY_NONE) {
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_HASH, (void *)symmetry_hash);
     }
     PGASetUserFunction (ctx, PGA_USERFUNCTION_STOPCOND, (void *)check_stop);
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_COPYSTRING, (void *)copystring);
+            (ctx, PGA_USERFUNCTION_COPYSTRING, (void *)gil_copystring);
     }
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_CREATESTRING, (void *)createstring);
+            (ctx, PGA_USERFUNCTION_CREATESTRING, (void *)gil_createstring);
     }
-    if (  PyObject_HasAttrString (self, "crossover")
+    if (  HAS_METHOD (ctx, M_CROSSOVER)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
-        PGASetUserFunction (ctx, PGA_USERFUNCTION_CROSSOVER, (void *)crossover);
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_CROSSOVER, (void *)gil_crossover);
     }
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_DESERIALIZE, (void *)deserialize);
+            (ctx, PGA_USERFUNCTION_DESERIALIZE, (void *)gil_deserialize);
     }
-    if (PyObject_HasAttrString (self, "endofgen")) {
-        PGASetUserFunction (ctx, PGA_USERFUNCTION_ENDOFGEN, (void *)endofgen);
+    if (  HAS_METHOD (ctx, M_ENDOFGEN)
+       || CUSTOM (ctx)->cache_flush
+       || CUSTOM (ctx)->timing
+       )
+    {
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_ENDOFGEN, (void *)gil_endofgen);
     }
-    if (  PyObject_HasAttrString (self, "gene_distance")
+    if (  HAS_METHOD (ctx, M_GENE_DISTANCE)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_GEN_DISTANCE, (void *)gene_distance);
+            (ctx, PGA_USERFUNCTION_GEN_DISTANCE, (void *)gil_gene_distance);
     }
-    if (PyObject_HasAttrString (self, "hillclimb")) {
-        PGASetUserFunction (ctx, PGA_USERFUNCTION_HILLCLIMB, (void *)hillclimb);
+    if (HAS_METHOD (ctx, M_HILLCLIMB)) {
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_HILLCLIMB, (void *)gil_hillclimb);
     }
-    if (  PyObject_HasAttrString (self, "initstring")
+    if (  HAS_METHOD (ctx, M_INITSTRING)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_INITSTRING, (void *)initstring);
+            (ctx, PGA_USERFUNCTION_INITSTRING, (void *)gil_initstring);
     }
-    if (  PyObject_HasAttrString (self, "mutation")
+    if (  HAS_METHOD (ctx, M_MUTATION)
        || ctx->ga.datatype == PGA_DATATYPE_USER
        )
     {
-        PGASetUserFunction (ctx, PGA_USERFUNCTION_MUTATION, (void *)mutation);
+        PGASetUserFunction
+            (ctx, PGA_USERFUNCTION_MUTATION, (void *)gil_mutation);
     }
-    if (PyObject_HasAttrString (self, "pre_eval")) {
+    if (  HAS_METHOD (ctx, M_PRE_EVAL)
+       || HAS_METHOD (ctx, M_EVALUATE_BATCH)
+       || HAS_METHOD (ctx, M_MUTATION)
+       || CUSTOM (ctx)->executor
+       || CUSTOM (ctx)->timing
+       )
+    {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_PRE_EVAL, (void *)pre_eval);
+            (ctx, PGA_USERFUNCTION_PRE_EVAL, (void *)gil_pre_eval);
     }
-    PGASetUserFunction (ctx, PGA_USERFUNCTION_PRINTSTRING, (void *)print_gene);
+    PGASetUserFunction
+        (ctx, PGA_USERFUNCTION_PRINTSTRING, (void *)gil_print_gene);
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_SERIALIZE, (void *)serialize);
+            (ctx, PGA_USERFUNCTION_SERIALIZE, (void *)gil_serialize);
     }
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_SERIALIZE_FREE, (void *)serialize_free);
+            (ctx, PGA_USERFUNCTION_SERIALIZE_FREE, (void *)gil_serialize_free);
     }
     if (ctx->ga.datatype == PGA_DATATYPE_USER) {
         PGASetUserFunction
-            (ctx, PGA_USERFUNCTION_CHROM_FREE, (void *)chrom_free);
+            (ctx, PGA_USERFUNCTION_CHROM_FREE, (void *)gil_chrom_free);
     }
 
     if (crossover_prob >= 0) {
@@ -2326,7 +4542,59 @@ static int PGA_init (PyObject *self, PyObject *args, PyObject *kw)
         PGASetCrowdingMethod (ctx, crowding_method);
     }
 
+    if (log_genome && PyObject_IsTrue (log_genome)) {
+        CHECK_VALUE
+            ( ctx->ga.datatype != PGA_DATATYPE_USER
+            , "log_genome is not supported for user datatypes"
+            );
+        CUSTOM (ctx)->log_genome = 1;
+    }
+    CUSTOM (ctx)->log_iter = -1;
+
     PGASetUp (ctx);
+    if (!relocate_chromosomes (ctx, shared_population)) {
+        return INIT_FAIL;
+    }
+    /* With the island model only island 0 writes the log */
+    if (  log_file != NULL
+       && log_file != Py_None
+       && PGAGetRank (ctx, MPI_COMM_WORLD) == 0
+       )
+    {
+        PyObject *b = NULL;
+        FILE *fp = NULL;
+        b = PyUnicode_AsEncodedString (log_file, "utf-8", "strict");
+        if (!b) {
+            return INIT_FAIL;
+        }
+        fp = fopen (PyBytes_AS_STRING (b), "a");
+        if (fp == NULL) {
+            PyErr_SetFromErrnoWithFilenameObject (PyExc_OSError, log_file);
+            Py_DECREF (b);
+            return INIT_FAIL;
+        }
+        Py_DECREF (b);
+        setvbuf (fp, NULL, _IOFBF, 65536);
+        CUSTOM (ctx)->log_fp = fp;
+    }
+    if (migration_interval) {
+        PGACustomData *cd = CUSTOM (ctx);
+        int nsrc = cd->num_islands - 1;
+        if (cd->topology == PGA_TOPOLOGY_RING) {
+            nsrc = nsrc ? 1 : 0;
+        } else if (cd->topology == PGA_TOPOLOGY_TORUS) {
+            nsrc = (cd->torus_cols > 1) + (cd->torus_cols < cd->num_islands);
+        }
+        CHECK_VALUE
+            ( migration_size * (nsrc + 1) <= ctx->ga.PopSize
+            , "migration_size too large for population size"
+            );
+        cd->migrants = malloc (ctx->ga.PopSize * sizeof (int));
+        if (cd->migrants == NULL) {
+            PyErr_NoMemory ();
+            return INIT_FAIL;
+        }
+    }
 
     return 0;
 }
@@ -2506,100 +4774,359 @@ static PyObject *PGA_euclidian_distance (PyObject *self, PyObject *args)
 static PyObject *PGA_evaluate (PyObject *self, PyObject *args)
 {
     int p, pop;
-
+
+    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+        return NULL;
+    }
+    PyErr_SetString \
+        ( PyExc_NotImplementedError
+        , "You must define \"evaluate\" in a derived class"
+        );
+    return NULL;
+}
+
+/* (Re)compute fitness */
+static PyObject *PGA_fitness (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int pop;
+
+    if (!PyArg_ParseTuple (args, "i", &pop)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    PGAFitness (ctx, pop);
+    Py_INCREF   (Py_None);
+    return Py_None;
+}
+
+/* Used to set the gene for user defined datatypes.
+ * If no user defined datatypes are in use, raise a ValueError.
+ * This gets p, pop, userdata, the last being a PyObject (an instance of
+ * the user defined datatype)
+ */
+static PyObject *PGA_set_gene (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
+    PyObject *gene = NULL;
+    PGAIndividual *ind = NULL;
+    if (!PyArg_ParseTuple (args, "iiO", &p, &pop, &gene)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( ctx->ga.datatype == PGA_DATATYPE_USER
+        , "This method is used only for user-defined datatypes"
+        , PyExc_ValueError
+        , NULL
+        );
+    ind = PGAGetIndividual (ctx, p, pop);
+    /* Decrement refcount of stored user data object if existing */
+    if (ind->chrom != NULL) {
+        Py_DECREF (ind->chrom);
+        ind->chrom = NULL;
+    }
+    ind->chrom = gene;
+    Py_INCREF (gene);
+    Py_INCREF (Py_None);
+    return Py_None;
+}
+
+/* Used to retrieve the gene for user defined datatypes.
+ * If no user defined datatypes are in use, raise a ValueError.
+ * This gets p, pop and returns the gene, a PyObject (an instance of the
+ * user defined datatype)
+ */
+static PyObject *PGA_get_gene (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
+    PGAIndividual *ind = NULL;
+    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( ctx->ga.datatype == PGA_DATATYPE_USER
+        , "This method is used only for user-defined datatypes"
+        , PyExc_ValueError
+        , NULL
+        );
+    ind = PGAGetIndividual (ctx, p, pop);
+    CHECK_VALUE_EXCEPTION
+        ( ind->chrom != NULL
+        , "This gene is not set"
+        , PyExc_ValueError
+        , NULL
+        );
+    Py_INCREF (ind->chrom);
+    return ind->chrom;
+}
+
+static PyObject *deepcopy = NULL;
+
+/* Used to retrieve the gene for user defined datatypes for modifying
+ * it in place: Since copystring only copies a reference, a gene may be
+ * shared by several individuals (e.g. an unmodified copy of a parent in
+ * the new population). If the reference count shows that the gene is
+ * referenced elsewhere it is cloned first (with the copy_gene method if
+ * defined, otherwise with copy.deepcopy) and the clone is stored in the
+ * individual. A gene only referenced by this individual is returned
+ * as-is. Note that references held by the caller (e.g. from an earlier
+ * get_gene) also count as sharing.
+ */
+static PyObject *PGA_get_gene_mut (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
+    PGAIndividual *ind = NULL;
+    PyObject *clone = NULL;
+    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( ctx->ga.datatype == PGA_DATATYPE_USER
+        , "This method is used only for user-defined datatypes"
+        , PyExc_ValueError
+        , NULL
+        );
+    ind = PGAGetIndividual (ctx, p, pop);
+    CHECK_VALUE_EXCEPTION
+        ( ind->chrom != NULL
+        , "This gene is not set"
+        , PyExc_ValueError
+        , NULL
+        );
+    if (Py_REFCNT ((PyObject *)ind->chrom) > 1) {
+        if (HAS_METHOD (ctx, M_COPY_GENE)) {
+            clone = call_method (ctx, M_COPY_GENE, "O", ind->chrom);
+        } else {
+            clone = PyObject_CallFunctionObjArgs (deepcopy, ind->chrom, NULL);
+        }
+        if (clone == NULL) {
+            return NULL;
+        }
+        Py_DECREF (ind->chrom);
+        ind->chrom = clone;
+    }
+    Py_INCREF (ind->chrom);
+    return ind->chrom;
+}
+
+/* Used by the process pool (see pga/parallel.py) to transfer
+ * chromosomes to worker processes: For builtin datatypes this returns
+ * the raw chromosome as a bytes object, user defined datatypes are
+ * serialized the same way as for sending to another MPI process.
+ */
+static PyObject *get_chromosome (PGAContext *ctx, int p, int pop)
+{
+    PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+    CHECK_VALUE_EXCEPTION
+        ( ind->chrom != NULL
+        , "This gene is not set"
+        , PyExc_ValueError
+        , NULL
+        );
+    if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+        void *ser = NULL;
+        size_t size = serialize (ctx, p, pop, &ser);
+        PyObject *r = NULL;
+        if (ser == NULL) {
+            return NULL;
+        }
+        r = PyBytes_FromStringAndSize (ser, size);
+        serialize_free (ser);
+        return r;
+    }
+    return PyBytes_FromStringAndSize (ind->chrom, chrom_size (ctx));
+}
+
+static PyObject *PGA_get_chromosome (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
+    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    return get_chromosome (ctx, p, pop);
+}
+
+/* Counterpart of get_chromosome: Store the transferred chromosome into
+ * individual p of population pop. Returns 1 on success, 0 on error.
+ */
+static int set_chromosome (PGAContext *ctx, int p, int pop, PyObject *chrom)
+{
+    PGAIndividual *ind = NULL;
+    CHECK_VALUE_EXCEPTION
+        ( PyBytes_Check (chrom)
+       && (  ctx->ga.datatype == PGA_DATATYPE_USER
+          || (size_t)PyBytes_GET_SIZE (chrom) == chrom_size (ctx)
+          )
+        , "Chromosome must be a bytes object of matching size"
+        , PyExc_ValueError
+        , 0
+        );
+    if (ctx->ga.datatype == PGA_DATATYPE_USER) {
+        deserialize
+            ( ctx, p, pop
+            , PyBytes_AS_STRING (chrom), PyBytes_GET_SIZE (chrom)
+            );
+        ERR_CHECK_OCCURRED (ctx, 0);
+        return 1;
+    }
+    ind = PGAGetIndividual (ctx, p, pop);
+    memcpy (ind->chrom, PyBytes_AS_STRING (chrom), chrom_size (ctx));
+    return 1;
+}
+
+/* Called in the worker process, see set_chromosome */
+static PyObject *PGA_set_chromosome (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
+    PyObject *chrom = NULL;
+    if (!PyArg_ParseTuple (args, "iiO", &p, &pop, &chrom)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    if (!set_chromosome (ctx, p, pop, chrom)) {
+        return NULL;
+    }
+    Py_INCREF (Py_None);
+    return Py_None;
+}
+
+/* With a shared population the process pool sends only the row of an
+ * individual in the shared chromosome storage to the worker: PGApack
+ * swaps population arrays, so the index p and pop in the parent may
+ * refer to a different population array than in the worker.
+ */
+static PyObject *PGA_storage_row (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    int p, pop;
     if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
         return NULL;
     }
-    PyErr_SetString \
-        ( PyExc_NotImplementedError
-        , "You must define \"evaluate\" in a derived class"
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    if (!check_allele (ctx, p, pop, 0)) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( CUSTOM (ctx)->results != NULL
+        , "No shared population"
+        , PyExc_ValueError
+        , NULL
         );
-    return NULL;
+    return Py_BuildValue ("i", storage_row (ctx, p, pop));
 }
 
-/* (Re)compute fitness */
-static PyObject *PGA_fitness (PyObject *self, PyObject *args)
+/* Called in the worker: Return p and pop of the individual stored in
+ * the given row of the shared chromosome storage.
+ */
+static PyObject *PGA_storage_individual (PyObject *self, PyObject *args)
 {
     PGAContext *ctx;
-    int pop;
-
-    if (!PyArg_ParseTuple (args, "i", &pop)) {
+    int row, npop, p, pop;
+    if (!PyArg_ParseTuple (args, "i", &row)) {
         return NULL;
     }
     if (!(ctx = get_context (self))) {
         return NULL;
     }
-    PGAFitness (ctx, pop);
-    Py_INCREF   (Py_None);
-    return Py_None;
+    npop = ctx->ga.PopSize + 2;
+    CHECK_VALUE_EXCEPTION
+        ( CUSTOM (ctx)->results != NULL && row >= 0 && row < 2 * npop
+        , "Invalid row of shared population"
+        , PyExc_ValueError
+        , NULL
+        );
+    /* Is the first storage block currently used for PGA_OLDPOP? */
+    if ((row < npop) == (storage_row (ctx, 0, PGA_OLDPOP) == 0)) {
+        pop = PGA_OLDPOP;
+    } else {
+        pop = PGA_NEWPOP;
+    }
+    p = row % npop;
+    if (p == ctx->ga.PopSize) {
+        p = PGA_TEMP1;
+    } else if (p == ctx->ga.PopSize + 1) {
+        p = PGA_TEMP2;
+    }
+    return Py_BuildValue ("ii", p, pop);
 }
 
-/* Used to set the gene for user defined datatypes.
- * If no user defined datatypes are in use, raise a ValueError.
- * This gets p, pop, userdata, the last being a PyObject (an instance of
- * the user defined datatype)
+/* Called in the worker: Store the evaluation into the shared results
+ * array, the parent picks it up from there after all workers are done.
  */
-static PyObject *PGA_set_gene (PyObject *self, PyObject *args)
+static PyObject *PGA_set_shared_evaluation (PyObject *self, PyObject *args)
 {
     PGAContext *ctx;
-    int p, pop;
-    PyObject *gene = NULL;
-    PGAIndividual *ind = NULL;
-    if (!PyArg_ParseTuple (args, "iiO", &p, &pop, &gene)) {
+    int row;
+    double *res;
+    PyObject *val = NULL;
+    if (!PyArg_ParseTuple (args, "iO", &row, &val)) {
         return NULL;
     }
     if (!(ctx = get_context (self))) {
         return NULL;
     }
     CHECK_VALUE_EXCEPTION
-        ( ctx->ga.datatype == PGA_DATATYPE_USER
-        , "This method is used only for user-defined datatypes"
+        ( CUSTOM (ctx)->results != NULL
+       && row >= 0 && row < 2 * (ctx->ga.PopSize + 2)
+        , "Invalid row of shared population"
         , PyExc_ValueError
         , NULL
         );
-    ind = PGAGetIndividual (ctx, p, pop);
-    /* Decrement refcount of stored user data object if existing */
-    if (ind->chrom != NULL) {
-        Py_DECREF (ind->chrom);
-        ind->chrom = NULL;
+    res = CUSTOM (ctx)->results + row * (ctx->ga.NumAuxEval + 1);
+    if (!parse_evaluation (ctx, val, res, res + 1)) {
+        return NULL;
     }
-    ind->chrom = gene;
-    Py_INCREF (gene);
     Py_INCREF (Py_None);
     return Py_None;
 }
 
-/* Used to retrieve the gene for user defined datatypes.
- * If no user defined datatypes are in use, raise a ValueError.
- * This gets p, pop and returns the gene, a PyObject (an instance of the
- * user defined datatype)
+/* Called in a worker process of the loopback transport (see
+ * pga/parallel.py): The mpi_rank and mpi_n_proc properties return the
+ * emulated rank and number of ranks.
  */
-static PyObject *PGA_get_gene (PyObject *self, PyObject *args)
+static PyObject *PGA_set_loopback_rank (PyObject *self, PyObject *args)
 {
     PGAContext *ctx;
-    int p, pop;
-    PGAIndividual *ind = NULL;
-    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+    int rank, size;
+    if (!PyArg_ParseTuple (args, "ii", &rank, &size)) {
         return NULL;
     }
     if (!(ctx = get_context (self))) {
         return NULL;
     }
     CHECK_VALUE_EXCEPTION
-        ( ctx->ga.datatype == PGA_DATATYPE_USER
-        , "This method is used only for user-defined datatypes"
-        , PyExc_ValueError
-        , NULL
-        );
-    ind = PGAGetIndividual (ctx, p, pop);
-    CHECK_VALUE_EXCEPTION
-        ( ind->chrom != NULL
-        , "This gene is not set"
+        ( rank >= 0 && rank < size
+        , "Invalid loopback rank"
         , PyExc_ValueError
         , NULL
         );
-    Py_INCREF (ind->chrom);
-    return ind->chrom;
+    CUSTOM (ctx)->loopback_rank = rank;
+    CUSTOM (ctx)->loopback_size = size;
+    Py_INCREF (Py_None);
+    return Py_None;
 }
 
 
@@ -2659,6 +5186,65 @@ static PyObject *PGA_get_allele (PyObject *self, PyObject *args)
     return Py_None;
 }
 
+/*
+ * Return all alleles of individual p in pop as a list, the items are
+ * the same as returned by get_allele.
+ */
+static PyObject *PGA_get_alleles (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PyObject *res = NULL;
+    void *chrom;
+    int p, pop, i, len;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    ERR_CHECK_OCCURRED (ctx, NULL);
+    if (!PyArg_ParseTuple (args, "ii", &p, &pop)) {
+        return NULL;
+    }
+    if (!check_allele (ctx, p, pop, 0)) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( PGAGetDataType (ctx) != PGA_DATATYPE_USER
+        , "No allele for user data type"
+        , PyExc_ValueError
+        , NULL
+        );
+    len   = ctx->ga.StringLen;
+    chrom = PGAGetIndividual (ctx, p, pop)->chrom;
+    if ((res = PyList_New (len)) == NULL) {
+        return NULL;
+    }
+    for (i=0; i<len; i++) {
+        PyObject *allele = NULL;
+        switch (PGAGetDataType (ctx)) {
+        case PGA_DATATYPE_BINARY:
+            allele = PyLong_FromLong (PGAGetBinaryAllele (ctx, p, pop, i));
+            break;
+        case PGA_DATATYPE_CHARACTER:
+            allele = PyBytes_FromStringAndSize ((char *)chrom + i, 1);
+            break;
+        case PGA_DATATYPE_INTEGER:
+            allele = PyLong_FromLong (((PGAInteger *)chrom) [i]);
+            break;
+        case PGA_DATATYPE_REAL:
+            allele = PyFloat_FromDouble (((PGAReal *)chrom) [i]);
+            break;
+        default:
+            assert (0);
+        }
+        if (allele == NULL) {
+            Py_DECREF (res);
+            return NULL;
+        }
+        PyList_SET_ITEM (res, i, allele);
+    }
+    return res;
+}
+
 static PyObject *PGA_get_best_index (PyObject *self, PyObject *args)
 {
     PGAContext *ctx = NULL;
@@ -2921,9 +5507,8 @@ static PyObject *PGA_print_string (PyObject *self, PyObject *args)
     if (!(ctx = get_context (self))) {
         return NULL;
     }
-    if (!(fp = get_fp (self, file))) {
-        PyErr_Clear ();
-        fp = get_fp_from_file (file);
+    if (!(fp = get_fp (ctx, (PyObject *)file))) {
+        fp = get_fp_from_file ((PyObject *)file);
         if (fp == NULL) {
             return NULL;
         }
@@ -2973,6 +5558,69 @@ static PyObject *PGA_print_string (PyObject *self, PyObject *args)
     return Py_None;
 }
 
+/*
+ * Return a writable two-dimensional view of the alleles of population
+ * pop without copying. Rows are individuals, columns alleles (for the
+ * binary datatype columns are the words of the packed bit string).
+ */
+static PyObject *PGA_population_array (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PGABufferObject *buf = NULL;
+    PyObject *r = NULL;
+    int pop;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    if (!PyArg_ParseTuple (args, "i", &pop)) {
+        return NULL;
+    }
+    if (!check_allele (ctx, 0, pop, 0)) {
+        return NULL;
+    }
+    if (CUSTOM (ctx)->chrom_storage == NULL) {
+        PyErr_SetString
+            (PyExc_ValueError, "No population array for user data type");
+        return NULL;
+    }
+    buf = PyObject_New (PGABufferObject, &PGABuffer_Type);
+    if (buf == NULL) {
+        return NULL;
+    }
+    Py_INCREF (self);
+    buf->pga        = self;
+    buf->buf        = PGAGetIndividual (ctx, 0, pop)->chrom;
+    buf->shape [0]  = ctx->ga.PopSize;
+    buf->shape [1]  = ctx->ga.StringLen;
+    switch (ctx->ga.datatype) {
+    case PGA_DATATYPE_BINARY:
+        buf->format    = "L";
+        buf->itemsize  = sizeof (PGABinary);
+        buf->shape [1] = ctx->ga.tw;
+        break;
+    case PGA_DATATYPE_CHARACTER:
+        buf->format    = "c";
+        buf->itemsize  = sizeof (PGACharacter);
+        break;
+    case PGA_DATATYPE_INTEGER:
+        buf->format    = "l";
+        buf->itemsize  = sizeof (PGAInteger);
+        break;
+    case PGA_DATATYPE_REAL:
+        buf->format    = "d";
+        buf->itemsize  = sizeof (PGAReal);
+        break;
+    default:
+        assert (0);
+    }
+    buf->strides [0] = chrom_size (ctx);
+    buf->strides [1] = buf->itemsize;
+    r = wrap_buffer ((PyObject *)buf);
+    Py_DECREF (buf);
+    return r;
+}
+
 /*
  * Python context print function -- used for debugging purposes
  * Currently we always print to stderr
@@ -2999,7 +5647,136 @@ static PyObject *PGA_random_01 (PyObject *self, PyObject *args)
     if (!(ctx = get_context (self))) {
         return NULL;
     }
-    return Py_BuildValue ("d", PGARandom01 (ctx, 0));
+    return PyFloat_FromDouble (PGARandom01 (ctx, 0));
+}
+
+/*
+ * Return n random numbers 0 <= f < 1 with a single call, as a numpy
+ * array if numpy is available, otherwise as a memoryview.
+ */
+static PyObject *PGA_random_01_array (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PyObject *ba = NULL, *mv = NULL, *cast = NULL, *r = NULL;
+    Py_ssize_t n, i;
+    double *v;
+
+    if (!PyArg_ParseTuple (args, "n", &n)) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( n >= 0, "Number of random numbers must be >= 0"
+        , PyExc_ValueError, NULL
+        );
+    CHECK_VALUE_EXCEPTION
+        ( (size_t)n <= PY_SSIZE_T_MAX / sizeof (double)
+        , "Number of random numbers too large"
+        , PyExc_ValueError, NULL
+        );
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    ba = PyByteArray_FromStringAndSize (NULL, n * sizeof (double));
+    if (ba == NULL) {
+        return NULL;
+    }
+    v = (double *)PyByteArray_AS_STRING (ba);
+    for (i=0; i<n; i++) {
+        v [i] = PGARandom01 (ctx, 0);
+    }
+    mv = PyMemoryView_FromObject (ba);
+    if (mv == NULL) {
+        goto errout;
+    }
+    cast = PyObject_CallMethod (mv, "cast", "s", "d");
+    if (cast == NULL) {
+        goto errout;
+    }
+    r = wrap_buffer (cast);
+errout:
+    Py_CLEAR (ba);
+    Py_CLEAR (mv);
+    Py_CLEAR (cast);
+    return r;
+}
+
+/*
+ * The state of the random number generator of PGApack is exported as
+ * bytes: The two generator states of the context followed by the
+ * index of the generator currently in use.
+ */
+#define RANDOM_STATE_SIZE (2 * sizeof (PGARandomState) + sizeof (int))
+
+/* Check a random state before using it, the indeces index into u */
+static int check_random_state (const PGARandomState *st)
+{
+    CHECK_VALUE_EXCEPTION
+        (  st->i96 >= 0 && st->i96 < 97 && st->j96 >= 0 && st->j96 < 97
+        , "Invalid random state"
+        , PyExc_ValueError, 0
+        );
+    return 1;
+}
+
+static PyObject *PGA_get_random_state (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PyObject *r = NULL;
+    char *q;
+    int idx;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    r = PyBytes_FromStringAndSize (NULL, RANDOM_STATE_SIZE);
+    if (r == NULL) {
+        return NULL;
+    }
+    q   = PyBytes_AS_STRING (r);
+    idx = ctx->randstate == &ctx->rand2;
+    memcpy (q, &ctx->rand1, sizeof (PGARandomState));
+    q += sizeof (PGARandomState);
+    memcpy (q, &ctx->rand2, sizeof (PGARandomState));
+    q += sizeof (PGARandomState);
+    memcpy (q, &idx, sizeof (int));
+    return r;
+}
+
+static PyObject *PGA_set_random_state (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PGARandomState st [2];
+    Py_buffer state;
+    const char *q;
+    int idx, ok = 0;
+
+    if (!PyArg_ParseTuple (args, "y*", &state)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        goto errout;
+    }
+    if (state.len != RANDOM_STATE_SIZE) {
+        PyErr_SetString (PyExc_ValueError, "Invalid random state");
+        goto errout;
+    }
+    q = state.buf;
+    memcpy (st, q, sizeof (st));
+    memcpy (&idx, q + sizeof (st), sizeof (int));
+    if (!check_random_state (st) || !check_random_state (st + 1)) {
+        goto errout;
+    }
+    ctx->rand1     = st [0];
+    ctx->rand2     = st [1];
+    ctx->randstate = idx ? &ctx->rand2 : &ctx->rand1;
+    ok = 1;
+errout:
+    PyBuffer_Release (&state);
+    if (!ok) {
+        return NULL;
+    }
+    Py_INCREF (Py_None);
+    return Py_None;
 }
 
 static PyObject *PGA_random_flip (PyObject *self, PyObject *args)
@@ -3013,68 +5790,472 @@ static PyObject *PGA_random_flip (PyObject *self, PyObject *args)
     if (!check_probability (probability)) {
         return NULL;
     }
-    if (!(ctx = get_context (self))) {
-        return NULL;
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    return Py_BuildValue ("i", PGARandomFlip (ctx, probability));
+}
+
+static PyObject *PGA_random_gaussian (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    double     l, r;
+
+    if (!PyArg_ParseTuple (args, "dd", &l, &r)) {
+        return NULL;
+    }
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    return Py_BuildValue ("d", PGARandomGaussian (ctx, l, r));
+}
+
+static PyObject *PGA_random_interval (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    int        l, r;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    ERR_CHECK_OCCURRED (ctx, NULL);
+    if (!PyArg_ParseTuple (args, "ii", &l, &r)) {
+        return NULL;
+    }
+    check_interval (l, r);
+    return Py_BuildValue ("i", PGARandomInterval (ctx, l, r));
+}
+
+static PyObject *PGA_random_uniform (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx;
+    double     l, r;
+
+    if (!PyArg_ParseTuple (args, "dd", &l, &r)) {
+        return NULL;
+    }
+    check_interval (l, r);
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    return Py_BuildValue ("d", PGARandomUniform (ctx, l, r));
+}
+
+/*
+ * Return the timing of callbacks and phases, see the timing parameter:
+ * A dict with the keys "callbacks" and "phases", each a dict mapping
+ * the name to a tuple of (count, seconds). Only called callbacks are
+ * included.
+ */
+static PyObject *PGA_get_timing (PyObject *self, PyObject *args)
+{
+    PGAContext *ctx = NULL;
+    PGACustomData *cd;
+    PyObject *r = NULL, *callbacks = NULL, *phases = NULL, *v = NULL;
+    int t;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    cd = CUSTOM (ctx);
+    CHECK_VALUE_EXCEPTION
+        ( cd->timing, "Timing is not enabled, use the timing parameter"
+        , PyExc_ValueError, NULL
+        );
+    if (  (callbacks = PyDict_New ()) == NULL
+       || (phases    = PyDict_New ()) == NULL
+       )
+    {
+        goto errout;
+    }
+    for (t=0; t<T_COUNT; t++) {
+        if (t < T_PHASE_FIRST && !cd->timing_count [t]) {
+            continue;
+        }
+        v = Py_BuildValue ("ld", cd->timing_count [t], cd->timing_time [t]);
+        if (  v == NULL
+           || PyDict_SetItemString
+                (t < T_PHASE_FIRST ? callbacks : phases, timing_names [t], v)
+            < 0
+           )
+        {
+            goto errout;
+        }
+        Py_CLEAR (v);
     }
-    return Py_BuildValue ("i", PGARandomFlip (ctx, probability));
+    r = Py_BuildValue ("{sOsO}", "callbacks", callbacks, "phases", phases);
+errout:
+    Py_CLEAR (callbacks);
+    Py_CLEAR (phases);
+    Py_CLEAR (v);
+    return r;
 }
 
-static PyObject *PGA_random_gaussian (PyObject *self, PyObject *args)
+static PyObject *PGA_reset_timing (PyObject *self, PyObject *args)
 {
-    PGAContext *ctx;
-    double     l, r;
+    PGAContext *ctx = NULL;
+    PGACustomData *cd;
 
-    if (!PyArg_ParseTuple (args, "dd", &l, &r)) {
-        return NULL;
-    }
     if (!(ctx = get_context (self))) {
         return NULL;
     }
-    return Py_BuildValue ("d", PGARandomGaussian (ctx, l, r));
+    cd = CUSTOM (ctx);
+    memset (cd->timing_count, 0, sizeof (cd->timing_count));
+    memset (cd->timing_time,  0, sizeof (cd->timing_time));
+    /* During a run the current phase restarts now: Time before the
+     * reset is not accounted to it.
+     */
+    if (cd->phase >= 0) {
+        cd->phase_start = cd->eval_end = timing_now ();
+    }
+    Py_INCREF (Py_None);
+    return Py_None;
 }
 
-static PyObject *PGA_random_interval (PyObject *self, PyObject *args)
+static PyObject *PGA_run (PyObject *self, PyObject *args)
 {
     PGAContext *ctx = NULL;
-    int        l, r;
+    int with_mpi;
 
     if (!(ctx = get_context (self))) {
         return NULL;
     }
+    with_mpi = PGAGetNumProcs (ctx, MPI_COMM_WORLD) > 1
+            || CUSTOM (ctx)->num_islands > 1;
+    /* Another thread may call run while the GIL is released */
+    CHECK_VALUE_EXCEPTION
+        ( !CUSTOM (ctx)->running, "PGA object is already running"
+        , PyExc_RuntimeError, NULL
+        );
+    /* MPI is initialized without thread support (MPI_THREAD_SINGLE)
+     * and messages of concurrent runs would get mixed up: A PGA object
+     * using MPI must not run concurrently with any other PGA object.
+     */
+    CHECK_VALUE_EXCEPTION
+        ( !mpi_running && !(with_mpi && n_running)
+        , "A PGA object using MPI cannot run concurrently with another one"
+        , PyExc_RuntimeError, NULL
+        );
+    CUSTOM (ctx)->running = 1;
+    n_running++;
+    mpi_running = with_mpi;
+    Py_BEGIN_ALLOW_THREADS
+    PGARun (ctx, gil_evaluate);
+    Py_END_ALLOW_THREADS
+    if (CUSTOM (ctx)->timing) {
+        timing_phase (CUSTOM (ctx), -1);
+    }
+    CUSTOM (ctx)->running = 0;
+    n_running--;
+    if (with_mpi) {
+        mpi_running = 0;
+    }
+    if (CUSTOM (ctx)->log_fp != NULL) {
+        fflush (CUSTOM (ctx)->log_fp);
+    }
+    /* Evaluations still running are not inserted anymore */
+    if (CUSTOM (ctx)->steady_state) {
+        PyObject *r = PyObject_CallMethod
+            (CUSTOM (ctx)->executor, "discard", NULL);
+        if (r == NULL) {
+            SET_ERR (ctx);
+        }
+        Py_XDECREF (r);
+    }
     ERR_CHECK_OCCURRED (ctx, NULL);
-    if (!PyArg_ParseTuple (args, "ii", &l, &r)) {
-        return NULL;
+    if (CUSTOM (ctx)->cache_flush) {
+        PyObject *r = PyObject_CallMethod (CUSTOM (ctx)->cache, "flush", NULL);
+        if (r == NULL) {
+            return NULL;
+        }
+        Py_DECREF (r);
     }
-    check_interval (l, r);
-    return Py_BuildValue ("i", PGARandomInterval (ctx, l, r));
+    Py_INCREF (Py_None);
+    return Py_None;
 }
 
-static PyObject *PGA_random_uniform (PyObject *self, PyObject *args)
+/*
+ * Checkpoints: The state file starts with STATE_MAGIC followed by the
+ * header (see the S_ constants below), the states of both random number
+ * generators of PGApack and for each individual of the current
+ * population the evaluation, the fitness, the up-to-date flag, the
+ * auxiliary evaluations and the size of the chromosome followed by the
+ * chromosome. Everything is stored in native byte order.
+ */
+#define STATE_MAGIC "PGAPYST1"
+#define STATE_MAGIC_LEN (sizeof (STATE_MAGIC) - 1)
+enum
+    { S_DATATYPE
+    , S_STRING_LENGTH
+    , S_POP_SIZE
+    , S_NUM_AUX
+    , S_ITER
+    , S_ITERS_OF_SAME
+    , S_NEVALS
+    , S_RANDSTATE
+    , S_LOG_ITER
+    , S_COUNT
+    };
+
+/* Copy n bytes from src to the state buffer and advance it */
+#define STATE_PUT(q, src, n) do {  \
+    memcpy ((q), (src), (n));      \
+    (q) += (n);                    \
+} while (0)
+
+/* Copy n bytes from the state buffer to dst, fail if it is too short */
+#define STATE_GET(q, end, dst, n) do {                       \
+    if ((size_t)((end) - (q)) < (n)) {                       \
+        PyErr_SetString (PyExc_ValueError, "State truncated"); \
+        goto errout;                                         \
+    }                                                        \
+    memcpy ((dst), (q), (n));                                \
+    (q) += (n);                                              \
+} while (0)
+
+static PyObject *PGA_save_state (PyObject *self, PyObject *args)
 {
-    PGAContext *ctx;
-    double     l, r;
+    PGAContext *ctx = NULL;
+    PyObject *path = NULL, *tmp = NULL, *chroms = NULL, *r = NULL;
+    int header [S_COUNT];
+    int pop, p, n, naux, ok = 0, err = 0;
+    size_t size, csize;
+    char *buf = NULL, *q;
 
-    if (!PyArg_ParseTuple (args, "dd", &l, &r)) {
+    if (!PyArg_ParseTuple (args, "O&", PyUnicode_FSConverter, &path)) {
         return NULL;
     }
-    check_interval (l, r);
     if (!(ctx = get_context (self))) {
-        return NULL;
+        goto errout;
     }
-    return Py_BuildValue ("d", PGARandomUniform (ctx, l, r));
+    /* In endofgen the new generation is not yet in PGA_OLDPOP */
+    pop  = CUSTOM (ctx)->in_endofgen ? PGA_NEWPOP : PGA_OLDPOP;
+    n    = ctx->ga.PopSize;
+    naux = ctx->ga.NumAuxEval;
+    size = STATE_MAGIC_LEN + sizeof (header) + 2 * sizeof (PGARandomState)
+         + n * ((naux + 2) * sizeof (double) + sizeof (int) + sizeof (size));
+    chroms = PyTuple_New (n);
+    if (chroms == NULL) {
+        goto errout;
+    }
+    for (p=0; p<n; p++) {
+        PyObject *c = get_chromosome (ctx, p, pop);
+        if (c == NULL) {
+            goto errout;
+        }
+        PyTuple_SET_ITEM (chroms, p, c);
+        size += PyBytes_GET_SIZE (c);
+    }
+    header [S_DATATYPE]      = ctx->ga.datatype;
+    header [S_STRING_LENGTH] = ctx->ga.StringLen;
+    header [S_POP_SIZE]      = n;
+    header [S_NUM_AUX]       = naux;
+    header [S_ITER]          = ctx->ga.iter;
+    header [S_ITERS_OF_SAME] = ctx->ga.ItersOfSame;
+    header [S_NEVALS]        = ctx->rep.nevals;
+    header [S_RANDSTATE]     = ctx->randstate == &ctx->rand2;
+    header [S_LOG_ITER]      = CUSTOM (ctx)->log_iter;
+    buf = q = malloc (size);
+    if (buf == NULL) {
+        PyErr_NoMemory ();
+        goto errout;
+    }
+    STATE_PUT (q, STATE_MAGIC, STATE_MAGIC_LEN);
+    STATE_PUT (q, header, sizeof (header));
+    STATE_PUT (q, &ctx->rand1, sizeof (PGARandomState));
+    STATE_PUT (q, &ctx->rand2, sizeof (PGARandomState));
+    for (p=0; p<n; p++) {
+        PGAIndividual *ind = PGAGetIndividual (ctx, p, pop);
+        PyObject *c = PyTuple_GET_ITEM (chroms, p);
+        STATE_PUT (q, &ind->evalue, sizeof (double));
+        STATE_PUT (q, &ind->fitness, sizeof (double));
+        STATE_PUT (q, &ind->evaluptodate, sizeof (int));
+        STATE_PUT (q, ind->auxeval, naux * sizeof (double));
+        csize = PyBytes_GET_SIZE (c);
+        STATE_PUT (q, &csize, sizeof (csize));
+        STATE_PUT (q, PyBytes_AS_STRING (c), csize);
+    }
+    assert ((size_t)(q - buf) == size);
+    Py_CLEAR (chroms);
+    tmp = PyBytes_FromFormat ("%s.tmp", PyBytes_AS_STRING (path));
+    if (tmp == NULL) {
+        goto errout;
+    }
+    /* Write to a temporary file and rename it: A crash during the
+     * write leaves the previous state intact. The run may continue in
+     * other threads during the write.
+     */
+    Py_BEGIN_ALLOW_THREADS
+    {
+        FILE *fp = fopen (PyBytes_AS_STRING (tmp), "wb");
+        if (fp != NULL) {
+            ok = fwrite (buf, size, 1, fp) == 1;
+            err = errno;
+            if (fclose (fp) != 0 && ok) {
+                ok = 0;
+                err = errno;
+            }
+            if (  ok
+               && rename (PyBytes_AS_STRING (tmp), PyBytes_AS_STRING (path))
+               )
+            {
+                ok = 0;
+                err = errno;
+            }
+            if (!ok) {
+                remove (PyBytes_AS_STRING (tmp));
+            }
+        } else {
+            err = errno;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (!ok) {
+        errno = err;
+        PyErr_SetFromErrnoWithFilenameObject (PyExc_OSError, path);
+        goto errout;
+    }
+    Py_INCREF (Py_None);
+    r = Py_None;
+errout:
+    free (buf);
+    Py_CLEAR (chroms);
+    Py_CLEAR (tmp);
+    Py_CLEAR (path);
+    return r;
 }
 
-static PyObject *PGA_run (PyObject *self, PyObject *args)
+/*
+ * Read a state written by save_state into the current population of
+ * ctx. Returns 1 on success, 0 on error.
+ */
+static int load_state (PGAContext *ctx, PyObject *pathobj)
+{
+    PyObject *path = NULL, *c = NULL;
+    int header [S_COUNT];
+    int p, naux = ctx->ga.NumAuxEval, ok = 0, err = 0;
+    size_t size = 0, csize;
+    char *buf = NULL, *q, *end;
+
+    if (!PyUnicode_FSConverter (pathobj, &path)) {
+        return 0;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    {
+        FILE *fp = fopen (PyBytes_AS_STRING (path), "rb");
+        if (fp != NULL) {
+            if (  fseek (fp, 0, SEEK_END) == 0
+               && (long)(size = ftell (fp)) >= 0
+               && fseek (fp, 0, SEEK_SET) == 0
+               && (buf = malloc (size + 1)) != NULL
+               )
+            {
+                ok = fread (buf, 1, size, fp) == size;
+            }
+            err = errno;
+            fclose (fp);
+        } else {
+            err = errno;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (!ok) {
+        errno = err;
+        PyErr_SetFromErrnoWithFilenameObject (PyExc_OSError, pathobj);
+        goto errout;
+    }
+    ok = 0;
+    q   = buf;
+    end = buf + size;
+    if (size < STATE_MAGIC_LEN || memcmp (q, STATE_MAGIC, STATE_MAGIC_LEN)) {
+        PyErr_SetString (PyExc_ValueError, "Not a PGA state file");
+        goto errout;
+    }
+    q += STATE_MAGIC_LEN;
+    STATE_GET (q, end, header, sizeof (header));
+    if (  header [S_DATATYPE]      != ctx->ga.datatype
+       || header [S_STRING_LENGTH] != ctx->ga.StringLen
+       || header [S_POP_SIZE]      != ctx->ga.PopSize
+       || header [S_NUM_AUX]       != naux
+       )
+    {
+        PyErr_SetString
+            ( PyExc_ValueError
+            , "State does not match data type, length, pop_size or num_eval"
+            );
+        goto errout;
+    }
+    STATE_GET (q, end, &ctx->rand1, sizeof (PGARandomState));
+    STATE_GET (q, end, &ctx->rand2, sizeof (PGARandomState));
+    if (!check_random_state (&ctx->rand1) || !check_random_state (&ctx->rand2))
+    {
+        goto errout;
+    }
+    for (p=0; p<ctx->ga.PopSize; p++) {
+        PGAIndividual *ind = PGAGetIndividual (ctx, p, PGA_OLDPOP);
+        STATE_GET (q, end, &ind->evalue, sizeof (double));
+        STATE_GET (q, end, &ind->fitness, sizeof (double));
+        STATE_GET (q, end, &ind->evaluptodate, sizeof (int));
+        STATE_GET (q, end, ind->auxeval, naux * sizeof (double));
+        STATE_GET (q, end, &csize, sizeof (csize));
+        if ((size_t)(end - q) < csize) {
+            PyErr_SetString (PyExc_ValueError, "State truncated");
+            goto errout;
+        }
+        ind->auxtotalok = PGA_FALSE;
+        c = PyBytes_FromStringAndSize (q, csize);
+        if (c == NULL || !set_chromosome (ctx, p, PGA_OLDPOP, c)) {
+            goto errout;
+        }
+        Py_CLEAR (c);
+        q += csize;
+    }
+    ctx->randstate       = header [S_RANDSTATE] ? &ctx->rand2 : &ctx->rand1;
+    ctx->ga.iter         = header [S_ITER];
+    ctx->ga.ItersOfSame  = header [S_ITERS_OF_SAME];
+    ctx->rep.nevals      = header [S_NEVALS];
+    /* A state saved in endofgen is written before the generation is
+     * logged, it is logged after resuming.
+     */
+    CUSTOM (ctx)->log_iter = header [S_LOG_ITER];
+    ok = 1;
+errout:
+    free (buf);
+    Py_CLEAR (c);
+    Py_CLEAR (path);
+    return ok;
+}
+
+/*
+ * Class method: Create an object by calling the class with the
+ * remaining arguments and restore the state saved with save_state.
+ */
+static PyObject *PGA_from_state (PyObject *cls, PyObject *args, PyObject *kw)
 {
+    PyObject *rest = NULL, *obj = NULL;
     PGAContext *ctx = NULL;
 
-    if (!(ctx = get_context (self))) {
+    CHECK_VALUE_EXCEPTION
+        ( PyTuple_GET_SIZE (args) >= 1
+        , "from_state requires the path of the state"
+        , PyExc_TypeError, NULL
+        );
+    rest = PyTuple_GetSlice (args, 1, PyTuple_GET_SIZE (args));
+    if (rest == NULL) {
         return NULL;
     }
-    PGARun (ctx, evaluate);
-    ERR_CHECK_OCCURRED (ctx, NULL);
-    Py_INCREF (Py_None);
-    return Py_None;
+    obj = PyObject_Call (cls, rest, kw);
+    Py_DECREF (rest);
+    if (obj == NULL) {
+        return NULL;
+    }
+    if (  !(ctx = get_context (obj))
+       || !load_state (ctx, PyTuple_GET_ITEM (args, 0))
+       )
+    {
+        Py_CLEAR (obj);
+    }
+    return obj;
 }
 
 static PyObject *PGA_select_next_index (PyObject *self, PyObject *args)
@@ -3158,6 +6339,154 @@ static PyObject *PGA_set_allele (PyObject *self, PyObject *args)
     return Py_None;
 }
 
+/*
+ * Try to copy alleles from an object supporting the buffer protocol
+ * with the item format of the chromosome (e.g. a numpy array or an
+ * array.array). Returns 1 if copied, 0 if the object is not a matching
+ * buffer (the caller falls back to the sequence protocol) and -1 on
+ * error.
+ */
+static int set_alleles_from_buffer (PGAContext *ctx, void *chrom, PyObject *v)
+{
+    Py_buffer view;
+    const char *fmt;
+    size_t itemsize;
+    int r = 0;
+
+    switch (PGAGetDataType (ctx)) {
+    case PGA_DATATYPE_CHARACTER:
+        itemsize = sizeof (PGACharacter);
+        break;
+    case PGA_DATATYPE_INTEGER:
+        itemsize = sizeof (PGAInteger);
+        break;
+    case PGA_DATATYPE_REAL:
+        itemsize = sizeof (PGAReal);
+        break;
+    default:
+        /* Binary alleles are packed, no direct copy */
+        return 0;
+    }
+    if (!PyObject_CheckBuffer (v)) {
+        return 0;
+    }
+    if (PyObject_GetBuffer (v, &view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) < 0) {
+        PyErr_Clear ();
+        return 0;
+    }
+    fmt = view.format ? view.format : "B";
+    if (*fmt == '@' || *fmt == '=') {
+        fmt++;
+    }
+    if ((size_t)view.itemsize != itemsize || fmt [0] == '\0' || fmt [1]) {
+        goto out;
+    }
+    switch (PGAGetDataType (ctx)) {
+    case PGA_DATATYPE_CHARACTER:
+        r = strchr ("bBc", *fmt) != NULL;
+        break;
+    case PGA_DATATYPE_INTEGER:
+        r = strchr ("lq", *fmt) != NULL;
+        break;
+    case PGA_DATATYPE_REAL:
+        r = *fmt == 'd';
+        break;
+    }
+    if (r && view.len != (Py_ssize_t)(itemsize * ctx->ga.StringLen)) {
+        PyErr_SetString (PyExc_ValueError, "Length must match string length");
+        r = -1;
+    }
+    if (r > 0) {
+        memcpy (chrom, view.buf, view.len);
+    }
+out:
+    PyBuffer_Release (&view);
+    return r;
+}
+
+/*
+ * Set all alleles of individual p in pop from a sequence (or a buffer
+ * with matching item type) of length string_length.
+ */
+static PyObject *PGA_set_alleles (PyObject *self, PyObject *args)
+{
+    PyObject *val = NULL, *seq = NULL;
+    PGAContext *ctx = NULL;
+    void *chrom;
+    int p, pop, i, r;
+
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    ERR_CHECK_OCCURRED (ctx, NULL);
+    if (!PyArg_ParseTuple (args, "iiO", &p, &pop, &val)) {
+        return NULL;
+    }
+    if (!check_allele (ctx, p, pop, 0)) {
+        return NULL;
+    }
+    CHECK_VALUE_EXCEPTION
+        ( PGAGetDataType (ctx) != PGA_DATATYPE_USER
+        , "No allele for user data type"
+        , PyExc_ValueError
+        , NULL
+        );
+    chrom = PGAGetIndividual (ctx, p, pop)->chrom;
+    r = set_alleles_from_buffer (ctx, chrom, val);
+    if (r < 0) {
+        return NULL;
+    }
+    if (r > 0) {
+        Py_INCREF (Py_None);
+        return Py_None;
+    }
+    seq = PySequence_Fast (val, "Alleles must be a sequence");
+    if (seq == NULL) {
+        return NULL;
+    }
+    if (PySequence_Fast_GET_SIZE (seq) != ctx->ga.StringLen) {
+        PyErr_SetString (PyExc_ValueError, "Length must match string length");
+        goto errout;
+    }
+    for (i=0; i<ctx->ga.StringLen; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM (seq, i);
+        switch (PGAGetDataType (ctx)) {
+        case PGA_DATATYPE_BINARY:
+        {
+            PGABinary allele;
+            if (!PyArg_Parse (item, "k", &allele)) {
+                goto errout;
+            }
+            PGASetBinaryAllele (ctx, p, pop, i, !!allele);
+            break;
+        }
+        case PGA_DATATYPE_CHARACTER:
+            if (!PyArg_Parse (item, "c", (PGACharacter *)chrom + i)) {
+                goto errout;
+            }
+            break;
+        case PGA_DATATYPE_INTEGER:
+            if (!PyArg_Parse (item, "l", (PGAInteger *)chrom + i)) {
+                goto errout;
+            }
+            break;
+        case PGA_DATATYPE_REAL:
+            if (!PyArg_Parse (item, "d", (PGAReal *)chrom + i)) {
+                goto errout;
+            }
+            break;
+        default:
+            assert (0);
+        }
+    }
+    Py_DECREF (seq);
+    Py_INCREF (Py_None);
+    return Py_None;
+errout:
+    Py_DECREF (seq);
+    return NULL;
+}
+
 static PyObject *PGA_set_evaluation (PyObject *self, PyObject *args)
 {
     PGAContext *ctx = NULL;
@@ -3261,9 +6590,16 @@ static PyMethodDef PGA_methods [] =
 , { "fitness",                   PGA_fitness,                   METH_VARARGS
   , "(Re) compute fitness from evaluations"
   }
+, { "from_state", (PyCFunction)PGA_from_state
+  , METH_VARARGS | METH_KEYWORDS | METH_CLASS
+  , "Create object with the given parameters and restore a saved state"
+  }
 , { "get_allele",                PGA_get_allele,                METH_VARARGS
   , "Get allele"
   }
+, { "get_alleles",               PGA_get_alleles,               METH_VARARGS
+  , "Get all alleles of an individual"
+  }
 , { "get_best_index",            PGA_get_best_index,            METH_VARARGS
   , "Get best index in population pop"
   }
@@ -3285,6 +6621,9 @@ static PyMethodDef PGA_methods [] =
 , { "get_gene",                  PGA_get_gene,                  METH_VARARGS
   , "Get gene for user defined datatype"
   }
+, { "get_gene_mut",              PGA_get_gene_mut,              METH_VARARGS
+  , "Get unshared gene for modification for user defined datatype"
+  }
 , { "get_int_from_binary",       PGA_get_int_from_binary,       METH_VARARGS
   , "Get integer value from binary string encoded in BCD"
   }
@@ -3294,15 +6633,24 @@ static PyMethodDef PGA_methods [] =
 , { "get_iteration",             PGA_get_iteration,             METH_VARARGS
   , "Current iteration (GA iter)"
   }
+, { "get_random_state",          PGA_get_random_state,          METH_VARARGS
+  , "State of the random number generator as bytes"
+  }
 , { "get_real_from_binary",      PGA_get_real_from_binary,      METH_VARARGS
   , "Get real value from binary string encoded in BCD"
   }
 , { "get_real_from_gray_code",   PGA_get_real_from_gray_code,   METH_VARARGS
   , "Get real value from binary string encoded in gray code"
   }
+, { "get_timing",                PGA_get_timing,                METH_VARARGS
+  , "Call counts and seconds spent in callbacks and phases of run"
+  }
 , { "get_worst_index",           PGA_get_worst_index,           METH_VARARGS
   , "Get worst index in population pop"
   }
+, { "population_array",          PGA_population_array,          METH_VARARGS
+  , "Array view of the alleles of population pop"
+  }
 , { "print_context",             PGA_print_context,             METH_VARARGS
   , "Python context print, debug info about PGApack context"
   }
@@ -3312,6 +6660,9 @@ static PyMethodDef PGA_methods [] =
 , { "random01",                  PGA_random_01,                 METH_VARARGS
   , "Random float 0 <= f <= 1"
   }
+, { "random01_array",            PGA_random_01_array,           METH_VARARGS
+  , "Array of n random floats 0 <= f < 1"
+  }
 , { "random_flip",               PGA_random_flip,               METH_VARARGS
   , "Random int 0/1 with probability p"
   }
@@ -3324,15 +6675,24 @@ static PyMethodDef PGA_methods [] =
 , { "random_uniform",            PGA_random_uniform,            METH_VARARGS
   , "Random float [l,r]"
   }
+, { "reset_timing",              PGA_reset_timing,              METH_VARARGS
+  , "Reset the counters returned by get_timing"
+  }
 , { "run",                       PGA_run,                       METH_VARARGS
   , "Run optimization"
   }
+, { "save_state",                PGA_save_state,                METH_VARARGS
+  , "Save population and state for a later restart with from_state"
+  }
 , { "select_next_index",         PGA_select_next_index,         METH_VARARGS
   , "Get index of next individual after selection"
   }
 , { "set_allele",                PGA_set_allele,                METH_VARARGS
   , "Set allele"
   }
+, { "set_alleles",               PGA_set_alleles,               METH_VARARGS
+  , "Set all alleles of an individual"
+  }
 , { "set_evaluation",            PGA_set_evaluation,            METH_VARARGS
   , "Set evaluation"
   }
@@ -3342,6 +6702,27 @@ static PyMethodDef PGA_methods [] =
 , { "set_gene",                  PGA_set_gene,                  METH_VARARGS
   , "Set gene for user defined datatype"
   }
+, { "set_random_state",          PGA_set_random_state,          METH_VARARGS
+  , "Restore state of the random number generator from get_random_state"
+  }
+, { "_get_chromosome",           PGA_get_chromosome,            METH_VARARGS
+  , "Get chromosome for transfer to worker process"
+  }
+, { "_set_chromosome",           PGA_set_chromosome,            METH_VARARGS
+  , "Set chromosome transferred from parent process"
+  }
+, { "_set_loopback_rank",        PGA_set_loopback_rank,         METH_VARARGS
+  , "Set emulated MPI rank of loopback process"
+  }
+, { "_set_shared_evaluation",    PGA_set_shared_evaluation,     METH_VARARGS
+  , "Store evaluation into shared results"
+  }
+, { "_storage_individual",       PGA_storage_individual,        METH_VARARGS
+  , "Get individual for row of shared population"
+  }
+, { "_storage_row",              PGA_storage_row,               METH_VARARGS
+  , "Get row of individual in shared population"
+  }
 , { NULL } /* EMPTY VALUE AS END-MARKER */
 };
 
@@ -3500,6 +6881,9 @@ static PyObject *PGA_mpi_rank (PyObject *self, void *closure)
     if (!(ctx = get_context (self))) {
         return NULL;
     }
+    if (CUSTOM (ctx)->loopback_size) {
+        return Py_BuildValue ("i", CUSTOM (ctx)->loopback_rank);
+    }
     return Py_BuildValue ("i", PGAGetRank (ctx, MPI_COMM_WORLD));
 }
 
@@ -3510,9 +6894,22 @@ static PyObject *PGA_mpi_n_proc (PyObject *self, void *closure)
     if (!(ctx = get_context (self))) {
         return NULL;
     }
+    if (CUSTOM (ctx)->loopback_size) {
+        return Py_BuildValue ("i", CUSTOM (ctx)->loopback_size);
+    }
     return Py_BuildValue ("i", PGAGetNumProcs (ctx, MPI_COMM_WORLD));
 }
 
+/* Not a PGApack setting: population allocated in shared memory */
+static PyObject *PGA_shared_population (PyObject *self, void *closure)
+{
+    PGAContext *ctx;
+    if (!(ctx = get_context (self))) {
+        return NULL;
+    }
+    return Py_BuildValue ("i", CUSTOM (ctx)->results != NULL);
+}
+
 
 #define GETTER_ENTRY(name) \
     { XSTR(name), PGA_ ## name }
@@ -3573,6 +6970,7 @@ static PyGetSetDef PGA_getset [] =
 , GETTER_ENTRY (restart)
 , GETTER_ENTRY (restart_frequency)
 , GETTER_ENTRY (rtr_window_size)
+, GETTER_ENTRY (shared_population)
 , GETTER_ENTRY (string_length)
 , GETTER_ENTRY (sum_constraints)
 , GETTER_ENTRY (tournament_size)
@@ -3594,44 +6992,40 @@ typedef struct {
 
 static void PGA_dealloc (PyObject *self)
 {
-    PGAContext *ctx;
-    PyObject *Py_MPI_i = NULL;
+    PGAObject *obj = (PGAObject *)self;
     PyObject *PGA_ctx = NULL;
-    int mpi_initialized = 0;
+    PyObject *exc_type, *exc_value, *exc_tb;
+    long long llctx;
 
-    /* If we're called during creation we may not access ctx */
-    if (self->ob_refcnt == 0) {
-        return;
+    /* Freeing user data may call into python, keep a pending error */
+    PyErr_Fetch (&exc_type, &exc_value, &exc_tb);
+    /* This also removes the object from contexts */
+    if (obj->weakreflist != NULL) {
+        PyObject_ClearWeakRefs (self);
     }
-    ctx = get_context (self);
-    #if 0
-    fprintf (stderr, "After ctx in PGA_dealloc: %p\n", ctx);
-    fflush  (stderr);
-    #endif
-    if (ctx != NULL) {
-        PGA_ctx = PyObject_GetAttrString (self, "context");
-        if (PGA_ctx != NULL) {
-            /* Ignore return code here, can't do anything if this fails */
-            PyObject_DelItem (contexts, PGA_ctx);
-            Py_DECREF (PGA_ctx);
+    /* The object is already dead, so we do not use get_context. There
+     * is no context if the constructor failed before creating it.
+     */
+    if (obj->inst_dict != NULL) {
+        PGA_ctx = PyDict_GetItemString (obj->inst_dict, "context");
+    }
+    if (PGA_ctx != NULL && PyArg_Parse (PGA_ctx, "L", &llctx)) {
+        PGAContext *ctx = (PGAContext *)llctx;
+        PGACustomData *cd = CUSTOM (ctx);
+        if (cd != NULL) {
+            release_chromosomes (ctx);
         }
         PGADestroy (ctx);
+        if (cd != NULL) {
+            free_custom_data (cd);
+        }
     }
-
-    Py_MPI_i = PyObject_GetAttrString (self, "mpi_initialized");
-    if (!Py_MPI_i) {
-        return;
-    }
-    if (!PyArg_Parse (Py_MPI_i, "i", &mpi_initialized)) {
-        Py_DECREF   (Py_MPI_i);
-        return;
-    }
-    Py_DECREF (Py_MPI_i);
-    /* Only call exitfunc if MPI wasn't initialized externally */
-    if (!mpi_initialized) {
-        exitfunc ();
-    }
-    self->ob_type->tp_free (self);
+    /* MPI is finalized by exitfunc when exiting: Other PGA objects may
+     * still use it.
+     */
+    Py_CLEAR (obj->inst_dict);
+    PyErr_Restore (exc_type, exc_value, exc_tb);
+    Py_TYPE (self)->tp_free (self);
 }
 
 static PyObject *PGA_new (PyTypeObject *type, PyObject *args, PyObject *kwds)
@@ -3664,6 +7058,31 @@ static PyTypeObject PGA_Type = {
     .tp_methods        = PGA_methods,
 };
 
+/*
+ * Modules used by methods and callbacks are imported once when loading
+ * the module and not on first use: Importing may release the GIL and
+ * several PGA objects may run concurrently in different threads.
+ * Numpy is optional and imported on first use in wrap_buffer.
+ */
+static int import_modules (void)
+{
+    PyObject *copy = NULL;
+    if (!init_pickle ()) {
+        return 0;
+    }
+    module_os = PyImport_ImportModule ("os");
+    if (module_os == NULL) {
+        return 0;
+    }
+    copy = PyImport_ImportModule ("copy");
+    if (copy == NULL) {
+        return 0;
+    }
+    deepcopy = PyObject_GetAttrString (copy, "deepcopy");
+    Py_DECREF (copy);
+    return deepcopy != NULL;
+}
+
 /*****************
  * Module creation
  *****************/
@@ -3702,9 +7121,15 @@ PyMODINIT_FUNC initpga (void)
     }
     Py_DECREF (weakref);
 
+    if (!import_modules ()) {
+        return FAIL;
+    }
     if (PyType_Ready (&PGA_Type) < 0) {
         return FAIL;
     }
+    if (PyType_Ready (&PGABuffer_Type) < 0) {
+        return FAIL;
+    }
 #if IS_PY3
     module = PyModule_Create (&module_definition);
 #else
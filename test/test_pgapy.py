@@ -29,6 +29,11 @@
 import pytest
 import pga
 import sys
+import json
+import multiprocessing
+import threading
+import time
+import weakref
 import numpy as np
 from pga.testsupport import PGA_Test_Instrumentation
 
@@ -609,6 +614,985 @@ class Test_PGA_Fast (PGA_Test_Instrumentation):
             t.run ()
     # end def test_eval_misuse
 
+    def test_evaluate_batch (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        d = dict (random_seed = 42, max_GA_iter = 10, num_eval = 2)
+        class T (pga.PGA):
+            def __init__ (self):
+                super ().__init__ (int, 10, maximize = False, **d)
+            def evaluate (self, p, pop):
+                a = [self.get_allele (p, pop, i) for i in range (10)]
+                return sum (a), max (a)
+        class B (T):
+            def evaluate (self, p, pop):
+                raise NotImplementedError ("evaluate must not be called")
+            def evaluate_batch (self, pop, indeces):
+                self.batches.append (len (indeces))
+                return [T.evaluate (self, p, pop) for p in indeces]
+        t = T ()
+        t.run ()
+        b = B ()
+        b.batches = []
+        b.run ()
+        assert len (b.batches) == b.GA_iter + 1
+        assert sum (b.batches) == b.eval_count == t.eval_count
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        pb = b.get_best_index (pga.PGA_OLDPOP)
+        assert pt == pb
+        assert b.get_evaluation (pb, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        class B (T):
+            def evaluate_batch (self, pop, indeces):
+                return [1.0]
+        b = B ()
+        with pytest.raises (ValueError):
+            b.run ()
+    # end def test_evaluate_batch
+
+    def test_population_array (self):
+        if pytest.mpi_rank != 0:
+            return
+        pop = pga.PGA_OLDPOP
+        for typ, dtype in \
+            ((float, np.float64), (int, np.int_), (bytes, np.dtype ('S1'))):
+            class T (pga.PGA):
+                def __init__ (self):
+                    super ().__init__ (typ, 7, pop_size = 6)
+            t = T ()
+            a = t.population_array (pop)
+            assert a.dtype == dtype
+            assert a.shape == (6, 7)
+            for p in range (6):
+                for i in range (7):
+                    assert a [p, i] == t.get_allele (p, pop, i)
+            a [3, 4] = a [0, 0]
+            assert t.get_allele (3, pop, 4) == t.get_allele (0, pop, 0)
+        class T (pga.PGA):
+            def __init__ (self):
+                super ().__init__ (bool, 70, pop_size = 6)
+        t = T ()
+        t.set_allele (2, pop, 0, 1)
+        a = t.population_array (pop)
+        assert a.shape == (6, 2)
+        assert a [2, 0] & (1 << 63)
+        # View keeps the storage alive
+        del t
+        assert a [2, 0] & (1 << 63)
+        class T (pga.PGA):
+            def initstring (self, p, pop):
+                pass
+            def __init__ (self):
+                super ().__init__ (tuple, 10)
+        t = T ()
+        with pytest.raises (ValueError):
+            t.population_array (pop)
+    # end def test_population_array
+
+    def test_instance_methods (self):
+        """ User methods may be set on the instance before calling the
+            constructor, these are looked up only once.
+        """
+        if pytest.mpi_n_proc > 1:
+            return
+        calls = []
+        class T (pga.PGA):
+            def __init__ (self):
+                self.endofgen = lambda: calls.append (self.GA_iter)
+                self.mutation = self.mutation_
+                super ().__init__ (int, 10, max_GA_iter = 5, random_seed = 2)
+            def mutation_ (self, p, pop, pm):
+                calls.append ('m')
+                return 0
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        t = T ()
+        t.run ()
+        assert 'm' in calls
+        assert [c for c in calls if c != 'm'] == [1, 2, 3, 4, 5]
+    # end def test_instance_methods
+
+    def test_num_threads (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        d = dict (random_seed = 42, max_GA_iter = 10)
+        class T (pga.PGA):
+            def __init__ (self, **kw):
+                kw.update (d)
+                super ().__init__ (float, 10, **kw)
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        t = T ()
+        t.run ()
+        tt = T (num_threads = 4)
+        tt.run ()
+        assert tt.eval_count == t.eval_count
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        assert tt.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        class Executor:
+            calls = 0
+            def map (self, fn, *iterables):
+                self.calls += 1
+                return map (fn, *iterables)
+        ex = Executor ()
+        te = T (executor = ex)
+        te.run ()
+        assert ex.calls == te.GA_iter + 1
+        assert te.eval_count == t.eval_count
+        # Worker threads end when the object is deleted
+        nthreads = threading.active_count ()
+        tx = T (num_threads = 4)
+        tx.run ()
+        assert threading.active_count () > nthreads
+        del tx
+        assert threading.active_count () == nthreads
+        with pytest.raises (ValueError):
+            T (num_threads = -1)
+        with pytest.raises (ValueError):
+            T (num_threads = 2, executor = ex)
+    # end def test_num_threads
+
+    def test_num_processes (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        d = dict (random_seed = 42, max_GA_iter = 10)
+        class T (pga.PGA):
+            def __init__ (self, typ, **kw):
+                kw.update (d)
+                super ().__init__ (typ, 10, **kw)
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        t  = T (float)
+        t.run ()
+        tp = T (float, num_processes = 3)
+        tp.run ()
+        assert tp.eval_count == t.eval_count
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        assert tp.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        tb = T (bool, num_processes = 2)
+        tb.run ()
+        ev = [tb.get_evaluation (p, pga.PGA_OLDPOP) for p in range (10)]
+        assert ev == \
+            [ sum (tb.get_allele (p, pga.PGA_OLDPOP, i) for i in range (10))
+              for p in range (10)
+            ]
+        ts = T (float, num_processes = 2, shared_population = True)
+        assert ts.shared_population
+        ts.run ()
+        assert ts.eval_count == t.eval_count
+        assert ts.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        assert not t.shared_population
+        # Worker processes are reaped when the object is deleted
+        before = set (multiprocessing.active_children ())
+        tp = T (float, num_processes = 2)
+        tp.run ()
+        workers = set (multiprocessing.active_children ()) - before
+        assert workers
+        del tp
+        assert not any (w.is_alive () for w in workers)
+        with pytest.raises (ValueError):
+            T (float, num_processes = -1)
+        with pytest.raises (ValueError):
+            T (float, shared_population = True)
+        with pytest.raises (ValueError):
+            T (float, num_processes = 2, num_threads = 2)
+    # end def test_num_processes
+
+    def test_async_steady_state (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            def __init__ (self, **kw):
+                super ().__init__ \
+                    ( bool, 20
+                    , maximize    = True
+                    , random_seed = 42
+                    , max_GA_iter = 30
+                    , num_replace = 2
+                    , **kw
+                    )
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (20))
+        t = T (num_processes = 3, async_steady_state = True)
+        t.run ()
+        # Inserted genes must carry their own evaluation
+        pop = pga.PGA_OLDPOP
+        for p in range (t.pop_size):
+            assert t.get_evaluation (p, pop) == \
+                sum (t.get_allele (p, pop, i) for i in range (20))
+        assert t.pop_size < t.eval_count <= t.pop_size + 30 * 2
+        t.run ()
+        with pytest.raises (ValueError):
+            T (async_steady_state = True)
+        with pytest.raises (ValueError):
+            T (num_threads = 2, async_steady_state = True)
+        with pytest.raises (ValueError):
+            T \
+                ( num_processes      = 2
+                , async_steady_state = True
+                , shared_population  = True
+                )
+        with pytest.raises (ValueError):
+            T \
+                ( num_processes      = 2
+                , async_steady_state = True
+                , no_duplicates      = True
+                )
+    # end def test_async_steady_state
+
+    def test_loopback (self, monkeypatch):
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            abort = False
+            def __init__ (self, **kw):
+                super ().__init__ \
+                    (tuple, 6, random_seed = 5, max_GA_iter = 5, **kw)
+            def initstring (self, p, pop):
+                g = tuple (self.random_interval (0, 9) for i in range (6))
+                self.set_gene (p, pop, g)
+            def crossover (self, p1, p2, ppop, c1, c2, cpop):
+                g1 = self.get_gene (p1, ppop)
+                g2 = self.get_gene (p2, ppop)
+                self.set_gene (c1, cpop, g1 [:3] + g2 [3:])
+                self.set_gene (c2, cpop, g2 [:3] + g1 [3:])
+            def mutation (self, p, pop, pm):
+                if not self.random_flip (pm * 6):
+                    return 0
+                g = list (self.get_gene (p, pop))
+                g [self.random_interval (0, 5)] = self.random_interval (0, 9)
+                self.set_gene (p, pop, tuple (g))
+                return 1
+            def gene_distance (self, p1, pop1, p2, pop2):
+                return 0
+            def evaluate (self, p, pop):
+                if self.loopback:
+                    assert 0 < self.mpi_rank < self.mpi_n_proc == 3
+                    if self.abort:
+                        pga.MPI_Abort (7)
+                return sum (self.get_gene (p, pop))
+        T.loopback = False
+        t = T ()
+        t.run ()
+        T.loopback = True
+        tl = T (loopback_ranks = 3)
+        assert tl.mpi_rank == 0
+        tl.run ()
+        assert tl.eval_count == t.eval_count
+        pop = pga.PGA_OLDPOP
+        assert tl.get_best_index (pop) == t.get_best_index (pop)
+        assert tl.get_gene (t.get_best_index (pop), pop) \
+            == t.get_gene (t.get_best_index (pop), pop)
+        # Worker processes are reaped when the object is deleted
+        before = set (multiprocessing.active_children ())
+        tl = T (loopback_ranks = 3)
+        tl.run ()
+        workers = set (multiprocessing.active_children ()) - before
+        assert len (workers) == 2
+        del tl
+        assert not any (w.is_alive () for w in workers)
+        # The environment variable is only used when requested
+        class TH (T):
+            hillclimbs = 0
+            def hillclimb (self, p, pop):
+                TH.hillclimbs += 1
+        monkeypatch.setenv ('PGA_LOOPBACK_RANKS', '3')
+        T.loopback = False
+        TH ().run ()
+        assert TH.hillclimbs > 0
+        TH.hillclimbs = 0
+        T.loopback = True
+        TH (loopback_ranks = pga.PGA_LOOPBACK_ENV).run ()
+        assert TH.hillclimbs == 0
+        monkeypatch.delenv ('PGA_LOOPBACK_RANKS')
+        T.loopback = False
+        TH (loopback_ranks = pga.PGA_LOOPBACK_ENV).run ()
+        assert TH.hillclimbs > 0
+        T.abort = True
+        T.loopback = True
+        with pytest.raises (RuntimeError):
+            T (loopback_ranks = 3).run ()
+        with pytest.raises (ValueError):
+            T (loopback_ranks = -2)
+        with pytest.raises (ValueError):
+            T (loopback_ranks = 2, num_processes = 2)
+    # end def test_loopback
+
+    def test_release_gil (self):
+        """ The GIL is released during run, other threads (here running
+            another GA) make progress and get the same results as when
+            run one after the other.
+        """
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            recurse = False
+            def __init__ (self, seed):
+                super ().__init__ \
+                    (int, 30, random_seed = seed, max_GA_iter = 50)
+            def evaluate (self, p, pop):
+                if self.recurse:
+                    self.run ()
+                return sum (self.get_allele (p, pop, i) for i in range (30))
+        def best (t):
+            p = t.get_best_index (pga.PGA_OLDPOP)
+            return t.get_evaluation (p, pga.PGA_OLDPOP), t.eval_count
+        expected = []
+        for seed in 1, 2, 3:
+            t = T (seed)
+            t.run ()
+            expected.append (best (t))
+        ts = [T (seed) for seed in (1, 2, 3)]
+        threads = [threading.Thread (target = t.run) for t in ts]
+        for th in threads:
+            th.start ()
+        for th in threads:
+            th.join ()
+        assert [best (t) for t in ts] == expected
+        T.recurse = True
+        with pytest.raises (RuntimeError):
+            T (1).run ()
+    # end def test_release_gil
+
+    def test_run_many (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            fail = False
+            def __init__ (self, seed):
+                super ().__init__ \
+                    (int, 20, random_seed = seed, max_GA_iter = 20)
+            def evaluate (self, p, pop):
+                if self.fail:
+                    raise ValueError ("failed")
+                return sum (self.get_allele (p, pop, i) for i in range (20))
+        expected = []
+        for seed in range (1, 5):
+            t = T (seed)
+            t.run ()
+            p = t.get_best_index (pga.PGA_OLDPOP)
+            expected.append \
+                (( t.get_evaluation (p, pga.PGA_OLDPOP)
+                 , [t.get_allele (p, pga.PGA_OLDPOP, i) for i in range (20)]
+                ))
+        ts = [T (seed) for seed in range (1, 5)]
+        assert pga.run_many (ts) == expected
+        assert pga.run_many (ts [:2], num_threads = 1) == expected [:2]
+        ts = [T (seed) for seed in range (1, 5)]
+        assert pga.run_many (ts, num_processes = 2) == expected
+        # Not run in the calling process
+        assert ts [0].GA_iter == 0
+        # Objects are freed when no longer referenced
+        w = weakref.ref (ts [0])
+        del ts [0]
+        assert w () is None
+        t = T (1)
+        t.fail = True
+        with pytest.raises (ValueError):
+            pga.run_many ([T (2), t])
+        with pytest.raises (ValueError):
+            pga.run_many ([], num_threads = 1, num_processes = 1)
+    # end def test_run_many
+
+    def test_run_many_mpi (self):
+        """ MPI has no thread support: threads need a single rank
+        """
+        if pytest.mpi_n_proc < 2:
+            return
+        class T (pga.PGA):
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (3))
+        ts = [T (int, 3, max_GA_iter = 2) for i in range (2)]
+        with pytest.raises (ValueError):
+            pga.run_many (ts)
+        with pytest.raises (ValueError):
+            pga.run_many (ts, num_threads = 1)
+    # end def test_run_many_mpi
+
+    def test_print_string_file (self):
+        """ The file passed to print_string is reused for all calls
+        """
+        if pytest.mpi_n_proc > 1:
+            return
+        files = set ()
+        class T (pga.PGA):
+            def __init__ (self, out):
+                super ().__init__ \
+                    ( int, 3
+                    , max_GA_iter     = 4
+                    , print_frequency = 1
+                    , print_options   = [pga.PGA_REPORT_STRING]
+                    , output_file     = out
+                    , init            = [(1, 1)] * 3
+                    )
+            def evaluate (self, p, pop):
+                return 1
+            def print_string (self, file, p, pop):
+                files.add (id (file))
+                print ("before", file = file)
+                super ().print_string (file, p, pop)
+                print ("after", file = file)
+        out = self.out_name
+        T (out).run ()
+        assert len (files) == 1
+        with open (out) as f:
+            lines = f.read ().split ('\n')
+        assert lines.count ('before') == 5
+        assert lines.count ('after')  == 5
+        assert sum ('[       1]' in l for l in lines) == 5
+    # end def test_print_string_file
+
+    def test_log_file (self, tmp_path):
+        class T (pga.PGA):
+            def __init__ (self, fn, **kw):
+                super ().__init__ \
+                    ( int, 5
+                    , maximize    = True
+                    , max_GA_iter = 5
+                    , random_seed = 3
+                    , log_file    = fn
+                    , **kw
+                    )
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (5))
+        class C (pga.PGA):
+            def evaluate (self, p, pop):
+                x = self.get_allele (p, pop, 0)
+                return x, x - 0.5
+        class U (pga.PGA):
+            pass
+        def read_log (fn):
+            with open (fn) as f:
+                return [json.loads (line) for line in f]
+        fn = str (tmp_path / 'log.jsonl')
+        t = T (fn, log_genome = True)
+        t.run ()
+        # Only rank 0 writes the log
+        if pytest.mpi_rank == 0:
+            log = read_log (fn)
+            assert [r ['iter'] for r in log] == list (range (6))
+            last = log [-1]
+            assert last ['evals'] == t.eval_count
+            best = t.get_best_index (pga.PGA_OLDPOP)
+            assert last ['best'] == [t.get_evaluation (best, pga.PGA_OLDPOP)]
+            assert last ['genome'] \
+                == [t.get_allele (best, pga.PGA_OLDPOP, i) for i in range (5)]
+            for r in log:
+                assert r ['worst'][0] <= r ['mean'][0] <= r ['best'][0]
+        # The log is appended to
+        T (fn).run ()
+        if pytest.mpi_rank == 0:
+            log = read_log (fn)
+            assert len (log) == 12
+            assert 'genome' not in log [-1]
+        fn = str (tmp_path / 'constraint.jsonl')
+        C (float, 3, num_eval = 2, num_constraint = 1, max_GA_iter = 3
+          , log_file = fn
+          ).run ()
+        if pytest.mpi_rank == 0:
+            log = read_log (fn)
+            assert len (log [0]['best']) == 2
+            assert 0 < log [0]['infeasible'] < 100
+            assert log [0]['min_violation'] == 0
+        with pytest.raises (ValueError):
+            U (list, 3, log_genome = True)
+    # end def test_log_file
+
+    def test_save_state (self, tmp_path):
+        if pytest.mpi_n_proc > 1:
+            return
+        fn = str (tmp_path / 'state')
+        class T (pga.PGA):
+            def __init__ (self, length = 10, **kw):
+                super ().__init__ \
+                    ( int, length
+                    , maximize    = True
+                    , max_GA_iter = 10
+                    , random_seed = 42
+                    , init        = [(0, 9)] * length
+                    , **kw
+                    )
+            def evaluate (self, p, pop):
+                return sum \
+                    (self.get_allele (p, pop, i) for i in range (len (self)))
+            def endofgen (self):
+                if self.GA_iter == 5:
+                    self.save_state (fn)
+                    self.saved_evals = self.eval_count
+        def result (t):
+            best = t.get_best_index (pga.PGA_OLDPOP)
+            return \
+                ( t.get_evaluation (best, pga.PGA_OLDPOP)
+                , t.get_alleles (best, pga.PGA_OLDPOP)
+                , t.eval_count
+                )
+        t = T ()
+        t.run ()
+        t2 = T.from_state (fn)
+        assert t2.GA_iter == 5
+        assert t2.eval_count == t.saved_evals
+        t2.run ()
+        assert t2.GA_iter == 10
+        # Resuming gives the same result as the uninterrupted run
+        assert result (t2) == result (t)
+        # Each generation is logged once, also across the resume
+        def log_iters (fn):
+            with open (fn) as f:
+                return [json.loads (line) ['iter'] for line in f]
+        log1 = str (tmp_path / 'log1.jsonl')
+        log2 = str (tmp_path / 'log2.jsonl')
+        T (log_file = log1).run ()
+        T.from_state (fn, log_file = log2).run ()
+        iters = log_iters (log2)
+        assert iters [0] == 5
+        assert [i for i in log_iters (log1) if i < 5] + iters \
+            == log_iters (log1)
+        with pytest.raises (ValueError):
+            T.from_state (fn, 11)
+        with open (fn, 'wb') as f:
+            f.write (b'garbage')
+        with pytest.raises (ValueError):
+            T.from_state (fn)
+        with pytest.raises (OSError):
+            T.from_state (str (tmp_path / 'nonexisting'))
+    # end def test_save_state
+
+    def test_random_state (self):
+        class T (pga.PGA):
+            def evaluate (self, p, pop):
+                return 0
+        t = T (int, 5, random_seed = 1)
+        state = t.get_random_state ()
+        a = [t.random01 () for i in range (10)]
+        t.set_random_state (state)
+        assert list (t.random01_array (10)) == a
+        assert len (t.random01_array (0)) == 0
+        with pytest.raises (ValueError):
+            t.random01_array (-1)
+        with pytest.raises (ValueError):
+            t.random01_array (sys.maxsize // 4)
+        with pytest.raises (ValueError):
+            t.set_random_state (b'invalid')
+        for batch in 0, 4:
+            t.set_random_state (state)
+            r = pga.PGA_Random (t, batch = batch)
+            assert [r.random () for i in range (10)] == a
+            rstate = r.getstate ()
+            b = [r.randrange (100) for i in range (10)]
+            r.setstate (rstate)
+            assert [r.randrange (100) for i in range (10)] == b
+    # end def test_random_state
+
+    def test_timing (self):
+        class T (pga.PGA):
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        t = T \
+            ( bool, 10
+            , max_GA_iter   = 5
+            , random_seed   = 1
+            , print_options = []
+            , timing        = True
+            )
+        start = time.monotonic ()
+        t.run ()
+        elapsed = time.monotonic () - start
+        timing = t.get_timing ()
+        if pytest.mpi_rank == 0:
+            phases = timing ['phases']
+            assert phases ['breed'][0] == 5
+            assert phases ['endofgen'][0] == 5
+            assert phases ['stop_check'][0] == 6
+            assert 'stop_cond' in timing ['callbacks']
+            assert 0 < sum (v [1] for v in phases.values ()) <= elapsed
+        if pytest.mpi_n_proc == 1:
+            assert timing ['callbacks']['evaluate'][0] == t.eval_count
+        for kind in timing.values ():
+            for count, seconds in kind.values ():
+                assert seconds >= 0
+        t.reset_timing ()
+        timing = t.get_timing ()
+        assert timing ['callbacks'] == {}
+        assert set (timing ['phases'].values ()) == set (((0, 0.0),))
+        # A reset during the run does not account earlier time
+        class TR (T):
+            def endofgen (self):
+                if self.GA_iter == 5:
+                    time.sleep (0.2)
+                    self.reset_timing ()
+        t = TR \
+            ( bool, 10
+            , max_GA_iter   = 5
+            , random_seed   = 1
+            , print_options = []
+            , timing        = True
+            )
+        t.run ()
+        if pytest.mpi_rank == 0:
+            phases = t.get_timing () ['phases']
+            assert phases ['endofgen'][0] == 1
+            assert phases ['endofgen'][1] < 0.2
+        with pytest.raises (ValueError):
+            T (bool, 10).get_timing ()
+    # end def test_timing
+
+    def test_serialize_gene (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        import marshal
+        class T (pga.PGA):
+            def __init__ (self, **kw):
+                super ().__init__ \
+                    (tuple, 6, random_seed = 5, max_GA_iter = 5, **kw)
+            def initstring (self, p, pop):
+                g = tuple (self.random_interval (0, 9) for i in range (6))
+                self.set_gene (p, pop, g)
+            def crossover (self, p1, p2, ppop, c1, c2, cpop):
+                g1 = self.get_gene (p1, ppop)
+                g2 = self.get_gene (p2, ppop)
+                self.set_gene (c1, cpop, g1 [:3] + g2 [3:])
+                self.set_gene (c2, cpop, g2 [:3] + g1 [3:])
+            def mutation (self, p, pop, pm):
+                if not self.random_flip (pm * 6):
+                    return 0
+                g = list (self.get_gene (p, pop))
+                g [self.random_interval (0, 5)] = self.random_interval (0, 9)
+                self.set_gene (p, pop, tuple (g))
+                return 1
+            def gene_distance (self, p1, pop1, p2, pop2):
+                g1 = self.get_gene (p1, pop1)
+                g2 = self.get_gene (p2, pop2)
+                return sum (a != b for a, b in zip (g1, g2))
+            def evaluate (self, p, pop):
+                return sum (self.get_gene (p, pop))
+        class TS (T):
+            calls = 0
+            def serialize_gene (self, p, pop):
+                self.calls += 1
+                return marshal.dumps (self.get_gene (p, pop))
+            def deserialize_gene (self, data):
+                return marshal.loads (data)
+        t = T ()
+        t.run ()
+        # Genes are transferred to worker processes with the serializer
+        tp = T (num_processes = 2)
+        tp.run ()
+        ts = TS (num_processes = 2)
+        ts.run ()
+        assert ts.calls == ts.eval_count == tp.eval_count == t.eval_count
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        assert ts.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == tp.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation  (pt, pga.PGA_OLDPOP)
+    # end def test_serialize_gene
+
+    def test_serialize_outstanding (self):
+        """ Several serialized chromosomes of different objects may be
+            outstanding at the same time.
+        """
+        if pytest.mpi_n_proc > 1:
+            return
+        import marshal
+        class T (pga.PGA):
+            def __init__ (self, seed):
+                super ().__init__ (tuple, 4, random_seed = seed, pop_size = 6)
+            def initstring (self, p, pop):
+                g = tuple (self.random_interval (0, 99) for i in range (4))
+                self.set_gene (p, pop, g)
+            def evaluate (self, p, pop):
+                return sum (self.get_gene (p, pop))
+        class TS (T):
+            def serialize_gene (self, p, pop):
+                return marshal.dumps (self.get_gene (p, pop))
+            def deserialize_gene (self, data):
+                return marshal.loads (data)
+        class TB (TS):
+            # Any bytes-like object may be returned
+            def serialize_gene (self, p, pop):
+                data = super ().serialize_gene (p, pop)
+                return memoryview (bytearray (data))
+        objs = (T (1), TS (2), TB (3))
+        # Serialize everything before any deserialization
+        ser = []
+        for p in range (6):
+            for t in objs:
+                ser.append ((t, p, t._get_chromosome (p, pga.PGA_OLDPOP)))
+        for t, p, data in ser:
+            t._set_chromosome (p, pga.PGA_NEWPOP, data)
+        for t, p, data in ser:
+            assert t.get_gene (p, pga.PGA_NEWPOP) \
+                == t.get_gene (p, pga.PGA_OLDPOP)
+        genes = set (t.get_gene (p, pga.PGA_OLDPOP) for t, p, d in ser)
+        assert len (genes) > 1
+    # end def test_serialize_outstanding
+
+    def test_get_gene_mut (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            def __init__ (self):
+                super ().__init__ (list, 4, random_seed = 1, max_GA_iter = 3)
+            def initstring (self, p, pop):
+                g = [self.random_interval (0, 9) for i in range (4)]
+                self.set_gene (p, pop, g)
+            def crossover (self, p1, p2, ppop, c1, c2, cpop):
+                # Children share the genes of the parents
+                self.set_gene (c1, cpop, self.get_gene (p2, ppop))
+                self.set_gene (c2, cpop, self.get_gene (p1, ppop))
+            def gene_distance (self, p1, pop1, p2, pop2):
+                g1 = self.get_gene (p1, pop1)
+                g2 = self.get_gene (p2, pop2)
+                return sum (a != b for a, b in zip (g1, g2))
+            def mutation (self, p, pop, pm):
+                if not self.random_flip (pm * 4):
+                    return 0
+                g = self.get_gene_mut (p, pop)
+                g [self.random_interval (0, 3)] = self.random_interval (0, 9)
+                return 1
+            def evaluate (self, p, pop):
+                return sum (self.get_gene (p, pop))
+        class TC (T):
+            copies = 0
+            def copy_gene (self, gene):
+                self.copies += 1
+                return list (gene)
+        for cls in T, TC:
+            t = cls ()
+            t.run ()
+            # In-place mutation never modified a shared gene
+            for p in range (t.pop_size):
+                assert t.get_evaluation (p, pga.PGA_OLDPOP) \
+                    == sum (t.get_gene (p, pga.PGA_OLDPOP))
+            # Make gene of individual 1 shared with individual 0
+            t.set_gene (1, pga.PGA_OLDPOP, t.get_gene (0, pga.PGA_OLDPOP))
+            g = t.get_gene_mut (1, pga.PGA_OLDPOP)
+            assert g == t.get_gene (0, pga.PGA_OLDPOP)
+            assert g is not t.get_gene (0, pga.PGA_OLDPOP)
+            assert g is t.get_gene (1, pga.PGA_OLDPOP)
+            i = id (g)
+            del g
+            # Now unshared: No copy
+            assert id (t.get_gene_mut (1, pga.PGA_OLDPOP)) == i
+            if cls is TC:
+                assert t.copies > 1
+        with pytest.raises (ValueError):
+            pga.PGA (bool, 4).get_gene_mut (0, pga.PGA_OLDPOP)
+    # end def test_get_gene_mut
+
+    def test_eval_cache (self, tmp_path):
+        if pytest.mpi_n_proc > 1:
+            return
+        d = dict (random_seed = 42, max_GA_iter = 20)
+        class T (pga.PGA):
+            calls = 0
+            def __init__ (self, **kw):
+                kw.update (d)
+                super ().__init__ (bool, 6, **kw)
+            def evaluate (self, p, pop):
+                self.calls += 1
+                return sum (self.get_allele (p, pop, i) for i in range (6))
+        t = T ()
+        t.run ()
+        cache = pga.PGA_Evaluation_Cache (maxsize = 64)
+        tc = T (eval_cache = cache)
+        tc.run ()
+        assert tc.eval_count == t.eval_count
+        assert tc.calls == cache.misses < t.calls
+        assert cache.hits + cache.misses == t.calls
+        assert cache.evictions == 0
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        assert tc.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        fn = str (tmp_path / 'cache.pickle')
+        cache.save (fn)
+        cache = pga.PGA_Evaluation_Cache (maxsize = 5, filename = fn)
+        assert len (cache) == 5
+        assert cache.evictions > 0
+        # Cached evaluations are used with an executor, too
+        cache = pga.PGA_Evaluation_Cache (filename = fn)
+        tt = T (eval_cache = cache, num_threads = 2)
+        tt.run ()
+        assert tt.calls == 0
+        assert tt.eval_count == t.eval_count
+    # end def test_eval_cache
+
+    def test_eval_store (self, tmp_path):
+        if pytest.mpi_n_proc > 1:
+            return
+        d = dict (random_seed = 42, max_GA_iter = 20)
+        class T (pga.PGA):
+            calls = 0
+            gens  = 0
+            def __init__ (self, **kw):
+                kw.update (d)
+                super ().__init__ (bool, 6, num_eval = 2, **kw)
+            def evaluate (self, p, pop):
+                self.calls += 1
+                s = sum (self.get_allele (p, pop, i) for i in range (6))
+                return s, 0
+            def endofgen (self):
+                self.gens += 1
+        fn = str (tmp_path / 'evals.sqlite')
+        store = pga.PGA_Evaluation_Store (fn, fingerprint = 'one_max')
+        t = T (eval_cache = store)
+        t.run ()
+        assert t.gens == t.GA_iter
+        assert not store.pending
+        assert len (store) == t.calls == store.misses
+        store.close ()
+        store = pga.PGA_Evaluation_Store (fn, fingerprint = 'one_max')
+        d.update (random_seed = 43)
+        tt = T (eval_cache = store)
+        tt.run ()
+        assert tt.calls < t.calls
+        store = pga.PGA_Evaluation_Store (fn, fingerprint = 'other')
+        assert len (store) == 0
+    # end def test_eval_store
+
+    def test_evaluate_async (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        import asyncio
+        d = dict (random_seed = 42, max_GA_iter = 10)
+        class B (pga.PGA):
+            def __init__ (self, **kw):
+                kw.update (d)
+                super ().__init__ (float, 10, **kw)
+        class T (B):
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        class TA (B):
+            running = max_running = 0
+            async def evaluate_async (self, p, pop):
+                self.running += 1
+                self.max_running = max (self.running, self.max_running)
+                await asyncio.sleep (0.001)
+                self.running -= 1
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+        t = T ()
+        t.run ()
+        ta = TA (async_concurrency = 3)
+        ta.run ()
+        assert ta.max_running == 3
+        assert ta.eval_count == t.eval_count
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        assert ta.get_evaluation (pt, pga.PGA_OLDPOP) \
+            == t.get_evaluation (pt, pga.PGA_OLDPOP)
+        ta = TA ()
+        ta.run ()
+        assert ta.max_running == ta.pop_size
+        with pytest.raises (ValueError):
+            TA (num_threads = 2)
+        with pytest.raises (ValueError):
+            TA (async_concurrency = -1)
+    # end def test_evaluate_async
+
+    def test_mutation_evaluation (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            calls = 0
+            def __init__ (self):
+                super ().__init__ \
+                    ( bool, 20
+                    , random_seed   = 7
+                    , max_GA_iter   = 20
+                    , pop_size      = 30
+                    , mixing_type   = pga.PGA_MIX_TRADITIONAL
+                    , print_options = []
+                    )
+            def evaluate (self, p, pop):
+                self.calls += 1
+                return sum (self.get_allele (p, pop, i) for i in range (20))
+            def flip (self, p, pop, pm):
+                if not self.random_flip (pm * len (self)):
+                    return None
+                i = self.random_interval (0, len (self) - 1)
+                a = not self.get_allele (p, pop, i)
+                self.set_allele (p, pop, i, a)
+                return a
+            def mutation (self, p, pop, pm):
+                return int (self.flip (p, pop, pm) is not None)
+        class TD (T):
+            # Return evaluation, use delta if parent evaluation is known
+            def mutation (self, p, pop, pm):
+                ev = None
+                if self.get_evaluation_up_to_date (p, pop):
+                    ev = self.get_evaluation (p, pop)
+                a = self.flip (p, pop, pm)
+                if ev is None:
+                    ev = float \
+                        (sum (self.get_allele (p, pop, i) for i in range (20)))
+                elif a is not None:
+                    ev += 1 if a else -1
+                return int (a is not None), ev
+        class TH (T):
+            def hillclimb (self, p, pop):
+                return float \
+                    (sum (self.get_allele (p, pop, i) for i in range (20)))
+        t = T ()
+        t.run ()
+        pt = t.get_best_index (pga.PGA_OLDPOP)
+        # Only the initial population is evaluated
+        td = TD ()
+        td.run ()
+        assert td.calls == td.pop_size < t.calls
+        # hillclimb computes all evaluations
+        th = TH ()
+        th.run ()
+        assert th.calls == 0
+        for x in td, th:
+            assert x.get_best_index (pga.PGA_OLDPOP) == pt
+            assert x.get_alleles (pt, pga.PGA_OLDPOP) \
+                == t.get_alleles (pt, pga.PGA_OLDPOP)
+            assert x.get_evaluation (pt, pga.PGA_OLDPOP) \
+                == t.get_evaluation (pt, pga.PGA_OLDPOP)
+    # end def test_mutation_evaluation
+
+    def test_hillclimb_return_type (self):
+        """ A hillclimb return value that is not a float (or sequence
+            of floats) must not overwrite the evaluation.
+        """
+        if pytest.mpi_n_proc > 1:
+            return
+        class T (pga.PGA):
+            def __init__ (self, retval):
+                self.retval = retval
+                super ().__init__ \
+                    ( bool, 10
+                    , maximize      = True
+                    , random_seed   = 1
+                    , max_GA_iter   = 3
+                    , pop_size      = 10
+                    , mixing_type   = pga.PGA_MIX_TRADITIONAL
+                    , print_options = []
+                    )
+            def evaluate (self, p, pop):
+                return sum (self.get_allele (p, pop, i) for i in range (10))
+            def hillclimb (self, p, pop):
+                return self.retval
+        for retval in True, 1, 'x', [1.0, True]:
+            t = T (retval)
+            with pytest.raises (TypeError):
+                t.run ()
+        t = T ([1.0])
+        t.run ()
+        best = t.get_best_index (pga.PGA_OLDPOP)
+        assert t.get_evaluation (best, pga.PGA_OLDPOP) == 1.0
+        # The same check is done for evaluations returned by mutation
+        class TM (T):
+            hillclimb = None
+            def mutation (self, p, pop, pm):
+                return 1, self.retval
+        for retval in True, 1, 'x':
+            t = TM (retval)
+            with pytest.raises (TypeError):
+                t.run ()
+    # end def test_hillclimb_return_type
+
     def test_check_allele (self):
         class T (pga.PGA):
             def __init__ (self):
@@ -625,6 +1609,169 @@ class Test_PGA_Fast (PGA_Test_Instrumentation):
             t.get_allele (0, pga.PGA_OLDPOP, 10)
     # end def test_check_allele
 
+    def test_alleles (self):
+        import array
+        class T (pga.PGA):
+            def __init__ (self, typ):
+                super ().__init__ (typ, 5, pop_size = 4)
+        for typ, values in \
+            ( (bool,  [1, 0, 0, 1, 1])
+            , (int,   [3, -2, 7, 0, 1 << 20])
+            , (float, [0.5, -1.25, 3.0, 1e10, 0.0])
+            , (bytes, [b'a', b'b', b'z', b'Q', b'0'])
+            ):
+            t = T (typ)
+            t.set_alleles (1, pga.PGA_NEWPOP, values)
+            assert t.get_alleles (1, pga.PGA_NEWPOP) == values
+            assert t.get_alleles (1, pga.PGA_NEWPOP) \
+                == [t.get_allele (1, pga.PGA_NEWPOP, i) for i in range (5)]
+            with pytest.raises (ValueError):
+                t.set_alleles (1, pga.PGA_NEWPOP, values [:4])
+            with pytest.raises (ValueError):
+                t.get_alleles (5, pga.PGA_NEWPOP)
+        t = T (float)
+        t.set_alleles (0, pga.PGA_OLDPOP, np.arange (5.0))
+        assert t.get_alleles (0, pga.PGA_OLDPOP) == [0.0, 1.0, 2.0, 3.0, 4.0]
+        t.set_alleles (0, pga.PGA_OLDPOP, np.arange (5))
+        assert t.get_alleles (0, pga.PGA_OLDPOP) == [0.0, 1.0, 2.0, 3.0, 4.0]
+        with pytest.raises (ValueError):
+            t.set_alleles (0, pga.PGA_OLDPOP, np.arange (6.0))
+        t = T (int)
+        t.set_alleles (0, pga.PGA_OLDPOP, array.array ('l', range (5)))
+        assert t.get_alleles (0, pga.PGA_OLDPOP) == [0, 1, 2, 3, 4]
+        t = T (bytes)
+        t.set_alleles (0, pga.PGA_OLDPOP, b'hello')
+        assert b''.join (t.get_alleles (0, pga.PGA_OLDPOP)) == b'hello'
+    # end def test_alleles
+
+    def test_symmetry (self):
+        if pytest.mpi_n_proc > 1:
+            return
+        def tours (a):
+            n = len (a)
+            return \
+                [ [a [(i + d * j) % n] for j in range (n)]
+                  for i in range (n) for d in (1, -1)
+                ]
+        def squares (a, side = 3):
+            r  = []
+            sq = [a [i * side:(i + 1) * side] for i in range (side)]
+            for t in range (8):
+                m = sq
+                if t & 1:
+                    m = [list (x) for x in zip (*m)]
+                if t & 2:
+                    m = m [::-1]
+                if t & 4:
+                    m = [row [::-1] for row in m]
+                r.append ([x for row in m for x in row])
+            return r
+        class T (pga.PGA):
+            # The initial population consists of equivalent genes
+            def __init__ (self, variants, **kw):
+                self.variants = variants
+                super ().__init__ \
+                    ( int, len (variants [0])
+                    , pop_size         = len (variants)
+                    , random_seed      = 1
+                    , no_duplicates    = True
+                    , pop_replace_type = pga.PGA_POPREPL_PAIRWISE_BEST
+                    , mutation_type    = pga.PGA_MUTATION_PERMUTE
+                    , **kw
+                    )
+            def initstring (self, p, pop):
+                self.set_alleles (p, pop, self.variants [p])
+            def evaluate (self, p, pop):
+                return 0
+        for sym, variants_of, gene in \
+            ( (pga.PGA_SYMMETRY_TOUR,   tours,   [0, 3, 1, 4, 2, 5])
+            , (pga.PGA_SYMMETRY_SQUARE, squares, list (range (9)))
+            ):
+            for s in pga.PGA_SYMMETRY_NONE, sym:
+                t = T (variants_of (gene), symmetry = s)
+                genes = \
+                    [ t.get_alleles (p, pga.PGA_OLDPOP)
+                      for p in range (t.pop_size)
+                    ]
+                assert len (set (tuple (g) for g in genes)) == t.pop_size
+                n = len \
+                    (set (min (tuple (v) for v in variants_of (g))
+                     for g in genes
+                    ))
+                if s == pga.PGA_SYMMETRY_NONE:
+                    assert n == 1
+                else:
+                    assert n == t.pop_size
+        with pytest.raises (ValueError):
+            pga.PGA (float, 6, symmetry = pga.PGA_SYMMETRY_TOUR)
+        with pytest.raises (ValueError):
+            pga.PGA (int, 10, symmetry = pga.PGA_SYMMETRY_SQUARE)
+        with pytest.raises (ValueError):
+            pga.PGA (int, 9, symmetry = 42)
+        class D (pga.PGA):
+            def check_duplicate (self, p1, pop1, p2, pop2):
+                return False
+        with pytest.raises (ValueError):
+            D (int, 9, symmetry = pga.PGA_SYMMETRY_SQUARE)
+        # Disabling the method on the instance allows the symmetry
+        d = D.__new__ (D)
+        d.check_duplicate = None
+        d.__init__ (int, 9, symmetry = pga.PGA_SYMMETRY_SQUARE)
+    # end def test_symmetry
+
+    def test_islands (self):
+        """ Each rank is an island, with a single process there is
+            nothing to migrate. Island r starts with genes of value r,
+            so the best island must have reached all other islands.
+        """
+        class T (pga.PGA):
+            def initstring (self, p, pop):
+                self.set_gene (p, pop, [self.mpi_rank] * len (self))
+            def evaluate (self, p, pop):
+                return self.get_gene (p, pop) [0]
+            def mutation (self, p, pop, pm):
+                return 0
+            def crossover (self, p1, p2, pop1, c1, c2, pop2):
+                self.set_gene (c1, pop2, list (self.get_gene (p1, pop1)))
+                self.set_gene (c2, pop2, list (self.get_gene (p2, pop1)))
+            def gene_distance (self, p1, pop1, p2, pop2):
+                return 0
+            def print_string (self, file, p, pop):
+                print (self.get_gene (p, pop), file = file)
+        n = pytest.mpi_n_proc
+        for topology in \
+            ( pga.PGA_TOPOLOGY_RING
+            , pga.PGA_TOPOLOGY_TORUS
+            , pga.PGA_TOPOLOGY_COMPLETE
+            ):
+            t = T \
+                ( list, 4
+                , maximize           = True
+                , pop_size           = 2 * n + 2
+                , random_seed        = 1
+                , max_GA_iter        = 2 * n + 2
+                , print_options      = []
+                , migration_interval = 2
+                , migration_topology = topology
+                )
+            t.run ()
+            best = t.get_best_index (pga.PGA_OLDPOP)
+            assert t.get_evaluation (best, pga.PGA_OLDPOP) == n - 1
+        with pytest.raises (ValueError):
+            pga.PGA (int, 6, migration_interval = -1)
+        with pytest.raises (ValueError):
+            pga.PGA (int, 6, migration_interval = 1, migration_size = 0)
+        with pytest.raises (ValueError):
+            pga.PGA (int, 6, migration_interval = 1, migration_topology = 3)
+        with pytest.raises (ValueError):
+            pga.PGA \
+                ( int, 6
+                , pop_size           = 10
+                , migration_interval = 1
+                , migration_size     = 11
+                )
+    # end def test_islands
+
     def test_print_string (self):
         if pytest.mpi_rank != 0:
             return